@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+
+"""bench_cobolnum.py  -- Confronta i tempi di decodifica dei valori zoned Cobol
+
+Usage: bench_cobolnum.py [-n num_valori] [-w larghezza]
+
+Per diverse percentuali di valori negativi, misura:
+  check_numeric_values   la versione precedente (int() con eccezione sui negativi)
+  decode_zoned           cobolnum.decode_zoned, un valore per volta
+  decode_zoned_column    cobolnum.decode_zoned_column, tutta la colonna
+  decode_zoned_matrix    cobolnum.decode_zoned_matrix (solo se numpy e' disponibile)
+"""
+
+import os, sys, getopt, random, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cobolnum
+from cobolnum import cobol2num
+
+
+def check_numeric_values(number):
+    """versione precedente di count_totals.check_numeric_values"""
+    try:
+        return int(number)                   # se la stringa di input e' numerico, finisce qui
+    except:
+        if not number: return 0
+        lastchar=cobol2num[number[-1]]         # converte l'ultimo carattere in numerico
+        number='-' + number[:-1] + lastchar    # aggiunge il segno '-' all'inizio
+        return int(number)
+
+
+def make_column(num, width, neg_ratio, seed=1):
+    """colonna di num campi zoned, con neg_ratio valori negativi (tutte le convenzioni)"""
+    rnd = random.Random(seed)
+    neg = sorted(cobol2num)
+    fmt = '%%0%dd' % width
+    column = []
+    for i in xrange(num):
+        value = fmt % rnd.randint(0, 10**width - 1)
+        if rnd.random() < neg_ratio:
+            value = value[:-1] + rnd.choice(neg)
+        column.append(value)
+    return column
+
+def timeit(func, *args):
+    """miglior tempo su 3 esecuzioni"""
+    best = None
+    for i in range(3):
+        t = time.time()
+        result = func(*args)
+        t = time.time() - t
+        if best is None or t < best: best = t
+    return best, result
+
+
+def main():
+    num, width = 200000, 11
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:w:")
+    except getopt.error, err:
+        sys.stderr.write(err.msg + "\n")
+        sys.exit(1)
+    for opt, optarg in opts:
+        if opt == '-h':
+            sys.stderr.write(__doc__ + "\n")
+            sys.exit(0)
+        elif opt == '-n':
+            num = int(optarg)
+        elif opt == '-w':
+            width = int(optarg)
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    print "%d valori, larghezza %d (tempi in secondi)" % (num, width)
+    print "%8s %22s %14s %20s %20s" % ('negativi', 'check_numeric_values', 'decode_zoned',
+                                        'decode_zoned_column', 'decode_zoned_matrix')
+    for neg_ratio in (0.0, 0.1, 0.5, 1.0):
+        column = make_column(num, width, neg_ratio)
+        t_old, expected = timeit(lambda c: [check_numeric_values(n) for n in c], column)
+        t_one, result = timeit(lambda c: [cobolnum.decode_zoned(n) for n in c], column)
+        assert result == expected
+        t_col, result = timeit(cobolnum.decode_zoned_column, column)
+        assert result == expected
+        row = "%7d%% %22.3f %14.3f %20.3f" % (neg_ratio*100, t_old, t_one, t_col)
+        if numpy is not None:
+            matrix = numpy.frombuffer(''.join(column), dtype=numpy.uint8).reshape(num, width)
+            tables = cobolnum.zoned_tables(numpy)
+            t_mat, result = timeit(cobolnum.decode_zoned_matrix, numpy, matrix, tables)
+            assert result.tolist() == expected
+            row += " %20.3f" % t_mat
+        print row
+
+
+if __name__ == '__main__':
+    main()
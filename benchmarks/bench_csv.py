@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+
+"""bench_csv.py  -- Tempi della lettura dei file csv (--csv) con poche colonne usate su molte
+
+Usage: bench_csv.py [-r righe] [-c colonne[,colonne...]] [-q]
+
+Per ogni numero di colonne viene creato un file csv temporaneo di righe*colonne campi
+(chiave nella prima colonna, valore nella seconda) e misurato aggregate_csv con -k1 -f2,
+insieme alla versione precedente (csv.reader, che divide tutte le colonne di ogni riga).
+Con -q i campi della chiave sono tra virgolette, per misurare la lettura con il modulo csv.
+"""
+
+import os, sys, getopt, time, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import count_totals
+
+
+def make_file(rows, cols, quoted):
+    fd, filename = tempfile.mkstemp(prefix='bench_csv.', suffix='.csv')
+    out = os.fdopen(fd, 'w')
+    fmt = quoted and '"K%02d";%d' or 'K%02d;%d'
+    filler = ''.join([';x%06d' % c for c in range(cols - 2)])
+    for r in xrange(rows):
+        out.write(fmt % (r % 50, r % 1000) + filler + '\n')
+    out.close()
+    return filename
+
+def aggregate_reader(fileinp, totals):
+    """versione precedente: tutte le colonne di ogni riga divise da csv.reader"""
+    import csv
+    get_id = totals.ids.get
+    for row in csv.reader(fileinp, delimiter=count_totals.delim):
+        keys = tuple([row[i] for i in count_totals.param_keys])
+        values = [count_totals.check_numeric_values(row[i]) for i in count_totals.param_sums]
+        gid = get_id(keys)
+        if gid is None:
+            gid = totals.new_group(keys)
+        totals.add(gid, values)
+
+def timeit(func, filename):
+    totals = count_totals.new_totals()
+    fileinp = open(filename)
+    t = time.time()
+    func(fileinp, totals)
+    t = time.time() - t
+    fileinp.close()
+    return t, totals.items()
+
+
+def main():
+    rows, cols_list, quoted = 200000, [5, 20, 60], 0
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hr:c:q")
+    except getopt.error, err:
+        sys.stderr.write(err.msg + "\n")
+        sys.exit(1)
+    for opt, optarg in opts:
+        if opt == '-h':
+            sys.stderr.write(__doc__ + "\n")
+            sys.exit(0)
+        elif opt == '-r':
+            rows = int(optarg)
+        elif opt == '-c':
+            cols_list = map(int, optarg.split(","))
+        elif opt == '-q':
+            quoted = 1
+
+    count_totals.opt_input_csv = 1
+    count_totals.delim = ';'
+    count_totals.param_keys = [0]
+    count_totals.param_sums = [1]
+
+    print "%8s %10s %12s %12s %12s" % ('colonne', 'righe', 'csv s', 'csv.reader s', 'rapporto')
+    for cols in cols_list:
+        filename = make_file(rows, cols, quoted)
+        try:
+            t_new, new = timeit(count_totals.aggregate_csv, filename)
+            t_old, old = timeit(aggregate_reader, filename)
+        finally:
+            os.remove(filename)
+        if new != old:
+            sys.stderr.write("totali diversi con %d colonne\n" % cols)
+            sys.exit(1)
+        print "%8d %10d %12.3f %12.3f %12.2f" % (cols, rows, t_new, t_old, t_old / t_new)
+
+
+if __name__ == '__main__':
+    main()
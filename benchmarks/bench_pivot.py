@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+
+"""bench_pivot.py  -- Tempi di costruzione della tabella pivot (-P) e dei range (-R)
+
+Usage: bench_pivot.py [-r righe] [-c colonne[,colonne...]]
+
+Per ogni numero di colonne pivot vengono creati righe*colonne gruppi (chiave -k riga,colonna)
+e misurati massage_data_no_range e massage_data_with_range con -P2; i tempi per gruppo
+devono restare costanti al crescere delle colonne.
+Per confronto, fino a 1000 colonne, viene misurata anche la versione precedente
+(ricerca della colonna con xaxis.index).
+"""
+
+import os, sys, getopt, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import count_totals
+
+
+def make_totals(rows, cols):
+    totals = count_totals.Totals(2)
+    for r in xrange(rows):
+        for c in xrange(cols):
+            totals.add(totals.group(('R%06d' % r, 'C%06d' % c)), [r*c % 1000])
+    return totals
+
+def pivot_index(totals):
+    """versione precedente: colonna cercata con xaxis.index (lineare nel numero delle colonne)"""
+    ind_xaxis = count_totals.opt_pivot - 1
+    xaxis = sorted(set(key[ind_xaxis] for key in totals))
+    totals_new = {}
+    for (key, value) in totals.iteritems():
+        l = list(key)
+        new_col = l.pop(ind_xaxis)
+        new_key = tuple(l)
+        ind_col = xaxis.index(new_col)
+        row = totals_new.setdefault(new_key, [None]*len(xaxis)+[0])
+        row[ind_col] = (row[ind_col] or 0) + value[0]
+        row[-1] += value[-1]
+    return totals_new
+
+def timeit(func, *args):
+    t = time.time()
+    func(*args)
+    return time.time() - t
+
+
+def main():
+    rows, cols_list = 200, [10, 100, 1000, 5000]
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hr:c:")
+    except getopt.error, err:
+        sys.stderr.write(err.msg + "\n")
+        sys.exit(1)
+    for opt, optarg in opts:
+        if opt == '-h':
+            sys.stderr.write(__doc__ + "\n")
+            sys.exit(0)
+        elif opt == '-r':
+            rows = int(optarg)
+        elif opt == '-c':
+            cols_list = map(int, optarg.split(","))
+
+    count_totals.opt_pivot = 2
+    count_totals.param_sums = [[0, 1]]
+
+    print "%8s %10s %12s %12s %12s %14s" % ('colonne', 'gruppi', 'pivot s', 'us/gruppo', 'range s', 'xaxis.index s')
+    for cols in cols_list:
+        totals = make_totals(rows, cols)
+        groups = len(totals)
+        t_pivot = timeit(count_totals.massage_data_no_range, totals)
+        t_range = timeit(count_totals.massage_data_with_range, totals)
+        if cols <= 1000:
+            t_index = "%14.3f" % timeit(pivot_index, totals)
+        else:
+            t_index = "%14s" % '-'
+        print "%8d %10d %12.3f %12.2f %12.3f %s" % (cols, groups, t_pivot, t_pivot/groups*1e6, t_range, t_index)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+
+"""bench_suite.py  -- Tempi e memoria di count_totals.py su file generati, a diverse scale
+
+Usage: bench_suite.py [-s record[,record...]] [-k cardinalita'[,cardinalita'...]] [-f num_campi]
+                      [-w larghezza] [-N negativi] [-r ripetizioni] [-d directory] [-p python]
+                      [-o report.json] [scenario ...]
+
+Per ogni scala (numero dei record) vengono generati con gen_data.py un file a larghezza
+fissa e il file csv equivalente (con -d vengono tenuti nella directory e riusati), e per
+ogni scenario count_totals.py viene eseguito in un processo separato, con l'output letto
+da una pipe. Per ogni esecuzione vengono misurati il tempo, i record al secondo e il
+picco della memoria del processo (ru_maxrss); con -r viene tenuto il tempo migliore.
+
+  -s record[,...]     le scale (default 10000,100000,1000000)
+  -k, -f, -w, -N      i parametri dei file generati (vedi gen_data.py)
+  -r ripetizioni      esecuzioni di ogni scenario (default 1)
+  -d directory        directory dei file generati (default una directory temporanea,
+                      cancellata alla fine)
+  -p python           l'interprete con cui eseguire count_totals.py (default questo)
+  -o report.json      il report in formato JSON (default bench_suite.json)
+  scenario ...        solo gli scenari indicati (default tutti: vedi scenarios)
+
+Il report contiene i parametri e, per ogni esecuzione, lo scenario, le opzioni, i record,
+i secondi, i record al secondo, il picco della memoria in KB e l'md5 dell'output
+(per verificare che versioni diverse producano gli stessi totali).
+"""
+
+import os, sys, getopt, time, tempfile, shutil, subprocess, hashlib, platform
+
+benchmarks = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarks)
+import gen_data
+
+count_totals = os.path.join(os.path.dirname(benchmarks), 'count_totals.py')
+
+# (nome, formato del file di input, opzioni): %(keys)s, %(sums)s, %(key2)s e %(sum1)s
+# vengono sostituiti con i campi del file (key2: le prime due chiavi, sum1: il primo campo)
+scenarios = [
+    ('totali',          'fixed', ['-k%(keys)s', '-f%(sums)s']),
+    ('totali_csv_out',  'fixed', ['-k%(keys)s', '-f%(sums)s', '--output_csv']),
+    ('pivot',           'fixed', ['-k%(key2)s', '-f%(sum1)s', '-P2']),
+    ('pivot_csv_out',   'fixed', ['-k%(key2)s', '-f%(sum1)s', '-P2', '--output_csv']),
+    ('range',           'fixed', ['-k%(key2)s', '-P2', '-R']),
+    ('range_csv_out',   'fixed', ['-k%(key2)s', '-P2', '-R', '--output_csv']),
+    ('numpy',           'fixed', ['-k%(keys)s', '-f%(sums)s', '--numpy']),
+    ('csv',             'csv',   ['-d;', '-k%(keys)s', '-f%(sums)s']),
+    ('csv_pivot',       'csv',   ['-d;', '-k%(key2)s', '-f%(sum1)s', '-P2']),
+]
+
+
+def make_files(dirname, records, cards, num_sums, width, neg_ratio):
+    """i file di input (fixed, csv) di una scala: vengono generati solo se non esistono gia'"""
+    files = {}
+    for (format, delim) in (('fixed', None), ('csv', ';')):
+        name = 'gen_%d_%s_%d_%d_%g.%s' % (records, '-'.join(map(str, cards)), num_sums, width, neg_ratio,
+                                          format == 'csv' and 'csv' or 'dat')
+        filename = os.path.join(dirname, name)
+        if not os.path.exists(filename):
+            out = open(filename + '.tmp', 'w')
+            gen_data.generate(out, records, cards, num_sums, width, neg_ratio, 1, delim)
+            out.close()
+            os.rename(filename + '.tmp', filename)
+        files[format] = filename
+    return files
+
+def fields(cards, num_sums, width, format):
+    """i valori da sostituire nelle opzioni degli scenari"""
+    keys, sums = gen_data.layout(cards, num_sums, width, format == 'csv' and ';' or None)
+    return {'keys': keys, 'sums': sums, 'key2': ','.join(keys.split(',')[:2]), 'sum1': sums.split(',')[0]}
+
+def run(python, args):
+    """esegue count_totals.py: restituisce (secondi, picco della memoria in KB, exit status, md5 dell'output)"""
+    start = time.time()
+    proc = subprocess.Popen([python, count_totals] + args, stdout=subprocess.PIPE)
+    md5 = hashlib.md5()
+    while 1:
+        data = proc.stdout.read(64*1024)
+        if not data: break
+        md5.update(data)
+    pid, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.time() - start
+    proc.returncode = status            # il processo e' gia' stato atteso
+    maxrss = rusage.ru_maxrss
+    if sys.platform == 'darwin':        # in byte invece che in KB
+        maxrss //= 1024
+    return elapsed, maxrss, status, md5.hexdigest()
+
+
+def main():
+    scales, cards, num_sums, width, neg_ratio = [10000, 100000, 1000000], [50, 100], 2, 10, 0.1
+    repeat, dirname, python, report = 1, None, sys.executable, 'bench_suite.json'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hs:k:f:w:N:r:d:p:o:")
+    except getopt.error, err:
+        sys.stderr.write(err.msg + "\n")
+        sys.exit(1)
+    for opt, optarg in opts:
+        if opt == '-h':
+            sys.stderr.write(__doc__ + "\n")
+            sys.exit(0)
+        elif opt == '-s':
+            scales = map(int, optarg.split(","))
+        elif opt == '-k':
+            cards = map(int, optarg.split(","))
+        elif opt == '-f':
+            num_sums = int(optarg)
+        elif opt == '-w':
+            width = int(optarg)
+        elif opt == '-N':
+            neg_ratio = float(optarg)
+        elif opt == '-r':
+            repeat = int(optarg)
+        elif opt == '-d':
+            dirname = optarg
+        elif opt == '-p':
+            python = optarg
+        elif opt == '-o':
+            report = optarg
+
+    selected = [s for s in scenarios if not args or s[0] in args]
+    if len(cards) < 2:                  # pivot e range richiedono due chiavi
+        selected = [s for s in selected if '-P2' not in s[2]]
+    if not selected:
+        sys.stderr.write("nessuno scenario: %s\n" % ', '.join([s[0] for s in scenarios]))
+        sys.exit(1)
+
+    tmpdir = dirname is None
+    if tmpdir:
+        dirname = tempfile.mkdtemp(prefix='bench_suite.')
+    elif not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    import json
+    results = []
+    print "%-16s %10s %10s %12s %10s" % ('scenario', 'record', 'secondi', 'record/s', 'RSS MB')
+    try:
+        for records in scales:
+            files = make_files(dirname, records, cards, num_sums, width, neg_ratio)
+            for (name, format, options) in selected:
+                args = [opt % fields(cards, num_sums, width, format) for opt in options] + [files[format]]
+                times, maxrss = [], 0
+                for i in range(repeat):
+                    elapsed, rss, status, md5 = run(python, args)
+                    times.append(elapsed)
+                    maxrss = max(maxrss, rss)
+                elapsed = min(times)
+                result = {'scenario': name, 'format': format, 'options': args[:-1], 'records': records,
+                          'seconds': round(elapsed, 4), 'records_per_sec': int(records / max(elapsed, 1e-9)),
+                          'peak_rss_kb': maxrss, 'output_md5': md5}
+                if status:
+                    result['error'] = status
+                results.append(result)
+                print "%-16s %10d %10.3f %12d %10.1f%s" % (name, records, elapsed, result['records_per_sec'],
+                                                          maxrss / 1024.0, status and '  ERRORE' or '')
+                sys.stdout.flush()
+    finally:
+        if tmpdir:
+            shutil.rmtree(dirname)
+
+    out = open(report, 'w')
+    json.dump({'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': python, 'platform': platform.platform(),
+               'params': {'cards': cards, 'num_sums': num_sums, 'width': width, 'neg_ratio': neg_ratio,
+                          'repeat': repeat, 'seed': 1},
+               'results': results}, out, indent=1, sort_keys=True)
+    out.write('\n')
+    out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+
+"""gen_data.py  -- Genera file di prova (a larghezza fissa o csv) per count_totals.py
+
+Usage: gen_data.py [-n record] [-k cardinalita'[,cardinalita'...]] [-f num_campi] [-w larghezza]
+                   [-N negativi] [-s seed] [--csv] [-d delim] [-o file]
+
+  -n record           numero dei record (default 100000)
+  -k card[,card...]   i campi chiave, con il numero dei valori distinti di ognuno
+                      (default 50,100): i valori sono K0..., con la stessa larghezza
+  -f num_campi        numero dei campi zoned da sommare (default 2)
+  -w larghezza        larghezza dei campi da sommare (default 10)
+  -N negativi         frazione dei valori negativi (default 0.1): l'ultima cifra viene
+                      sostituita dal carattere negativo Cobol, scelto a caso tra le
+                      convenzioni di cobolnum.cobol2num (cobol, mainframe, MEF)
+  -s seed             seme dei numeri casuali (default 1): con gli stessi parametri
+                      il file generato e' sempre lo stesso
+      --csv           file csv (con -d, default ';') con gli stessi valori
+  -o file             file di output (default lo standard output)
+
+Le opzioni -k e -f di count_totals.py per il file generato vengono scritte sullo
+standard error (vedi layout()).
+"""
+
+import os, sys, getopt, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cobolnum import cobol2num
+
+
+def key_widths(cards):
+    """larghezza dei valori di ogni campo chiave: K seguito dal numero, con gli zeri"""
+    return [1 + len(str(max(card, 1) - 1)) for card in cards]
+
+def layout(cards, num_sums, width, delim=None):
+    """le opzioni (-k, -f) di count_totals.py per un file generato con questi parametri"""
+    if delim:
+        keys = [str(i + 1) for i in range(len(cards))]
+        sums = [str(len(cards) + i + 1) for i in range(num_sums)]
+    else:
+        keys, pos = [], 1
+        for w in key_widths(cards):
+            keys.append("%d.%d" % (pos, w))
+            pos += w
+        sums = ["%d.%d" % (pos + i*width, width) for i in range(num_sums)]
+    return ','.join(keys), ','.join(sums)
+
+def generate(out, records, cards, num_sums, width, neg_ratio, seed=1, delim=None):
+    """scrive in out records record casuali (deterministici, dato seed)"""
+    rnd = random.Random(seed)
+    random_ = rnd.random
+    keys = [['K%0*d' % (w - 1, i) for i in range(card)] for (card, w) in zip(cards, key_widths(cards))]
+    # i caratteri negativi di ogni cifra, in tutte le convenzioni
+    negative = dict([(d, sorted([c for c in cobol2num if cobol2num[c] == d])) for d in '0123456789'])
+    fmt = '%%0%dd' % width
+    top = 10**(width - 1) - 1               # valori fino a width-1 cifre: le somme restano in un int64
+    sep = delim or ''
+
+    lines = []
+    for r in xrange(records):
+        fields = [values[int(random_() * len(values))] for values in keys]
+        for i in range(num_sums):
+            value = fmt % int(random_() * top)
+            if random_() < neg_ratio:
+                value = value[:-1] + rnd.choice(negative[value[-1]])
+            fields.append(value)
+        lines.append(sep.join(fields))
+        if len(lines) >= 10000:
+            out.write('\n'.join(lines) + '\n')
+            del lines[:]
+    if lines:
+        out.write('\n'.join(lines) + '\n')
+
+
+def main():
+    records, cards, num_sums, width, neg_ratio, seed = 100000, [50, 100], 2, 10, 0.1, 1
+    csv, delim, output = 0, ';', None
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:k:f:w:N:s:d:o:", ["csv"])
+    except getopt.error, err:
+        sys.stderr.write(err.msg + "\n")
+        sys.exit(1)
+    for opt, optarg in opts:
+        if opt == '-h':
+            sys.stderr.write(__doc__ + "\n")
+            sys.exit(0)
+        elif opt == '-n':
+            records = int(optarg)
+        elif opt == '-k':
+            cards = map(int, optarg.split(","))
+        elif opt == '-f':
+            num_sums = int(optarg)
+        elif opt == '-w':
+            width = int(optarg)
+        elif opt == '-N':
+            neg_ratio = float(optarg)
+        elif opt == '-s':
+            seed = int(optarg)
+        elif opt == '--csv':
+            csv = 1
+        elif opt == '-d':
+            csv, delim = 1, optarg
+        elif opt == '-o':
+            output = optarg
+    if not csv: delim = None
+
+    out = output and open(output, 'w') or sys.stdout
+    generate(out, records, cards, num_sums, width, neg_ratio, seed, delim)
+    if out is not sys.stdout: out.close()
+    keys, sums = layout(cards, num_sums, width, delim)
+    sys.stderr.write("%s-k%s -f%s\n" % (delim and "-d'%s' " % delim or "", keys, sums))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""cobolnum.py  -- Decodifica dei valori numerici in formato Cobol
+
+Un valore zoned negativo ha l'ultima cifra sostituita da un carattere che ne indica
+anche il segno; sono gestite tre convenzioni:
+
+  cobol      pqrstuvwxy   (p=-0 ... y=-9)
+  mainframe  }JKLMNOPQR   (}=-0 ... R=-9)
+  MEF        AJKLMNOPQR   (A=-0 ... R=-9)
+
+La decodifica usa delle tabelle precalcolate, senza sollevare eccezioni: solo i valori
+irregolari (spazi, segni espliciti...) passano per la conversione con int().
+
+  decode_zoned(number)           un valore
+  decode_zoned_column(numbers)   una colonna di valori (lista di stringhe)
+  decode_zoned_matrix(...)       una colonna di valori come matrice numpy di byte
+
+Per i file che arrivano direttamente dal mainframe sono gestiti anche:
+
+  decode_zoned_ebcdic(number)    zoned EBCDIC (cifre F0-F9, segno nel semibyte alto dell'ultimo byte)
+  decode_packed(number)          packed decimal (COMP-3)
+  decode_binary(number)          binario big-endian con segno (COMP)
+
+ognuno con la corrispondente versione *_matrix per numpy.
+
+I tempi, confrontati con la versione precedente, sono misurati da benchmarks/bench_cobolnum.py.
+"""
+
+import string
+from binascii import hexlify
+
+
+# tabella di conversione da valori negativi Cobol a numerici
+# cobol
+chars = 'pqrstuvwxy'
+cobol2num = dict([(c, str(chars.index(c))) for c in chars])    # {'p':'0', 'q':'1', 'r':'2', 's':'3', 't':'4', 'u':'5', 'v':'6', 'w':'7', 'x':'8', 'y':'9'}
+# mainframe
+chars = '}JKLMNOPQR'
+cobol2num.update([(c, str(chars.index(c))) for c in chars])    # {'K': '2', 'J': '1', 'M': '4', 'L': '3', 'O': '6', 'N': '5', 'Q': '8', 'P': '7', 'R': '9', '}': '0'}
+# convenzione MEF
+chars = 'AJKLMNOPQR'
+cobol2num.update([(c, str(chars.index(c))) for c in chars])    # {'A': '0', 'K': '2', 'J': '1', 'M': '4', 'L': '3', 'O': '6', 'N': '5', 'Q': '8', 'P': '7', 'R': '9'}
+
+# l'ultimo carattere negativo viene tradotto nella cifra corrispondente
+negative_chars = ''.join(sorted(cobol2num))
+neg2digit = string.maketrans(negative_chars, ''.join([cobol2num[c] for c in negative_chars]))
+
+
+def decode_other(number):
+    """valori irregolari: stessa conversione di int(), con l'ultimo carattere negativo Cobol"""
+    try:
+        return int(number)
+    except ValueError:
+        if not number: return 0
+        lastchar=cobol2num[number[-1]]         # converte l'ultimo carattere in numerico
+        return int('-' + number[:-1] + lastchar)
+
+def decode_zoned(number):
+    """valore numerico di un campo zoned (stringa di cifre, con l'ultima eventualmente negativa)"""
+    if number.isdigit():
+        return int(number)
+    body = number[:-1]
+    if number[-1:] in cobol2num and (body.isdigit() or not body):
+        return -int(number.translate(neg2digit))
+    return decode_other(number)
+
+def decode_zoned_column(numbers):
+    """lista dei valori numerici di una colonna di campi zoned"""
+    decode = decode_zoned
+    return [int(n) if n.isdigit() else decode(n) for n in numbers]
+
+
+# EBCDIC (codepage 037)
+ebcdic2ascii = ''.join([chr(i).decode('cp037').encode('latin-1') for i in range(256)])
+ascii2ebcdic = string.maketrans(ebcdic2ascii, ''.join([chr(i) for i in range(256)]))
+ebcdic_digits = ''.join([chr(0xF0 + d) for d in range(10)])
+# cifra nel semibyte basso (per i byte con zona A-F), '?' per tutti gli altri
+ebcdic2digit = ''.join([(i >> 4) >= 0xA and (i & 0xF) <= 9 and str(i & 0xF) or '?' for i in range(256)])
+ebcdic_negative = frozenset([chr(z << 4 | d) for z in (0xB, 0xD) for d in range(10)])
+
+def decode_zoned_ebcdic(number):
+    """valore di un campo zoned EBCDIC: cifre F0-F9, l'ultima con il segno nella zona
+       (C, F, A, E positivo; D, B negativo)"""
+    digits = number.translate(ebcdic2digit)
+    if digits.isdigit() and not number[:-1].translate(None, ebcdic_digits):
+        if number[-1] in ebcdic_negative:
+            return -int(digits)
+        return int(digits)
+    return decode_other(number.translate(ebcdic2ascii))
+
+def decode_packed(number):
+    """valore di un campo packed decimal (COMP-3): due cifre per byte,
+       l'ultimo semibyte e' il segno (D o B negativo)"""
+    digits = hexlify(number)
+    if not digits: return 0
+    value = int(digits[:-1] or '0')
+    if digits[-1] in 'bd':
+        return -value
+    return value
+
+def decode_binary(number):
+    """valore di un campo binario (COMP): intero big-endian in complemento a due"""
+    if not number: return 0
+    value = int(hexlify(number), 16)
+    if ord(number[0]) & 0x80:
+        value -= 1 << (8*len(number))
+    return value
+
+
+def zoned_tables(numpy):
+    """tabelle per la decodifica con numpy dell'ultimo carattere di un campo zoned:
+       cifra (-1 se il carattere non e' valido) e segno"""
+    lastdig = numpy.empty(256, dtype=numpy.int64)
+    lastdig.fill(-1)
+    lastsign = numpy.ones(256, dtype=numpy.int64)
+    for d in range(10):
+        lastdig[ord(str(d))] = d
+    for (c, d) in cobol2num.items():
+        lastdig[ord(c)] = int(d)
+        lastsign[ord(c)] = -1
+    return lastdig, lastsign
+
+def decode_zoned_matrix(numpy, col, tables):
+    """valori di una colonna di campi zoned, data come matrice numpy di byte (un campo per riga).
+       Le righe che non sono nel formato [0-9]*[0-9 negativo Cobol] vengono decodificate
+       una per volta con decode_zoned(), per avere lo stesso risultato"""
+    n, width = col.shape
+    if not width:
+        return numpy.zeros(n, dtype=numpy.int64)         # decode_zoned('') == 0
+    if width > 18:                                       # non entra in un int64
+        return numpy.array([decode_zoned(r.tostring()) for r in col], dtype=object)
+
+    lastdig, lastsign = tables
+    last = col[:, -1]
+    values = lastdig[last]
+    ok = values >= 0
+    if width > 1:
+        # le cifre restano byte (i caratteri sotto '0' diventano > 9), e il valore viene
+        # accumulato una colonna per volta: niente matrice di int64
+        digits = col[:, :-1] - numpy.uint8(48)
+        ok &= digits.max(axis=1) <= 9
+        acc = digits[:, 0].astype(numpy.int64)
+        for i in range(1, width-1):
+            acc *= 10
+            acc += digits[:, i]
+        values = values + acc * 10
+    values *= lastsign[last]
+
+    for i in numpy.flatnonzero(~ok):
+        values[i] = decode_zoned(col[i].tostring())
+    return values
+
+def decode_zoned_ebcdic_matrix(numpy, col):
+    """come decode_zoned_matrix(), per i campi zoned EBCDIC"""
+    n, width = col.shape
+    if not width:
+        return numpy.zeros(n, dtype=numpy.int64)
+    if width > 18:
+        return numpy.array([decode_zoned_ebcdic(r.tostring()) for r in col], dtype=object)
+
+    zones, digits = col >> 4, (col & 0xF).astype(numpy.int64)
+    last = zones[:, -1]
+    ok = (digits <= 9).all(axis=1) & (last >= 0xA) & (zones[:, :-1] == 0xF).all(axis=1)
+    values = numpy.dot(digits, 10 ** numpy.arange(width-1, -1, -1, dtype=numpy.int64))
+    values[(last == 0xB) | (last == 0xD)] *= -1
+
+    for i in numpy.flatnonzero(~ok):
+        values[i] = decode_zoned_ebcdic(col[i].tostring())
+    return values
+
+def decode_packed_matrix(numpy, col):
+    """valori di una colonna di campi packed decimal (COMP-3), come matrice numpy di byte"""
+    n, width = col.shape
+    if not width:
+        return numpy.zeros(n, dtype=numpy.int64)
+    if width > 9:                                        # piu' di 17 cifre
+        return numpy.array([decode_packed(r.tostring()) for r in col], dtype=object)
+
+    # cifre: semibyte alto e basso di ogni byte, tranne l'ultimo semibyte (il segno)
+    digits = numpy.empty((n, 2*width), dtype=numpy.int64)
+    digits[:, 0::2] = col >> 4
+    digits[:, 1::2] = col & 0xF
+    sign = digits[:, -1]
+    digits = digits[:, :-1]
+    ok = (digits <= 9).all(axis=1)
+    values = numpy.dot(digits, 10 ** numpy.arange(2*width-2, -1, -1, dtype=numpy.int64))
+    values[(sign == 0xB) | (sign == 0xD)] *= -1
+
+    for i in numpy.flatnonzero(~ok):
+        values[i] = decode_packed(col[i].tostring())
+    return values
+
+def decode_binary_matrix(numpy, col):
+    """valori di una colonna di campi binari (COMP), come matrice numpy di byte"""
+    n, width = col.shape
+    if not width:
+        return numpy.zeros(n, dtype=numpy.int64)
+    if width > 8:
+        return numpy.array([decode_binary(r.tostring()) for r in col], dtype=object)
+
+    # estensione del segno fino a 8 byte, poi lettura come int64 big-endian
+    words = numpy.empty((n, 8), dtype=numpy.uint8)
+    words[:, :8-width] = numpy.where(col[:, :1] >= 0x80, 0xFF, 0)
+    words[:, 8-width:] = col
+    return words.view('>i8').ravel().astype(numpy.int64)
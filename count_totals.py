@@ -3,17 +3,37 @@
 """statis.py  -- Stampa le statistiche delle colonne di un file indicate come parametro 
                  nella riga di comando
 
-Usage 1: statis.py [-k pos.len[,pos.len...]]  [-s] [-c] [-H] [-f pos.len[,pos.len ...]] [file]
-Usage 2: statis.py [-k col[,col...]] -dchar   [-s] [-c] [-H] [-f col[,col...]]          [file]
-Usage 3: statis.py -T -k pos.len -f pos.len   [file]
+Usage 1: statis.py [-k pos.len[,pos.len...]]  [-s] [-c] [-H] [-f pos.len[,pos.len ...]] [-u pos.len[,...] [--topk N]] [file ...]
+Usage 2: statis.py [-k col[,col...]] -dchar   [-s] [-c] [-H] [-f col[,col...]]          [-u col[,...] [--topk N]]     [file ...]
+Usage 3: statis.py -T -k pos.len -f pos.len   [file ...]
+Usage 4: statis.py --report "OUTPUT -k... [-f...] [-P N] [-R]" [--report ...] [--reports=FILE] [file ...]
 
 Opzioni:
   -k pos.len          la posizione della chiave secondo la quale vengono calcolati i totali
   -f pos.len          la posizione del campo (o dei campi) da sommare:
                       se vengono richiesti piu' di un campo da sommare, viene visualizzato
                       sulla destra anche il loro totale, prima dell'ultimo  campo records.
+                      Il formato del campo puo' essere indicato con un suffisso (pos.len:tipo):
+                        z       zoned, con i negativi in formato Cobol (default)
+                        p, p3   packed decimal (COMP-3)
+                        b       binario big-endian con segno (COMP)
+  -u, --distinct=pos.len[,pos.len...]
+                      per ogni campo, una colonna (dist1...) con il numero stimato dei suoi valori
+                      distinti in ogni gruppo (HyperLogLog: memoria fissa per gruppo, errore
+                      tipico del 3%%), prima di recs; nella riga dei totali, i valori distinti
+                      di tutto il file
+      --topk=N        con -u, per ogni campo -u anche una colonna (top1...) con i suoi N valori
+                      di peso maggiore in ogni gruppo (valore=peso): il peso e' la somma del
+                      primo campo -f (oppure il numero dei record). Stima Space-Saving con
+                      M = max(N, 1/E) valori per gruppo: con i pesi non negativi, ogni peso
+                      stampato e' sovrastimato al massimo di W/M (W il peso totale del gruppo),
+                      mai sottostimato, e ogni valore con un peso maggiore di W/M e' tra quelli
+                      tenuti (quindi stampato, se e' tra gli N di peso maggiore)
+                      (-u e --topk sono incompatibili con -P, -R, --rollup, --numpy, --sorted,
+                      --max_mem, --state, --report, --build-cache e --cache)
+      --topk-error=E  l'errore E di --topk, come frazione del peso del gruppo (default %(topk_error)s)
       --csv           file di input in formato csv
-  -d, --delim=DELIM   separatore di campi del file. Sottindende True il parametro --csv
+  -d, --delim=DELIM   separatore di campi del file (un solo carattere). Sottindende True il parametro --csv
                       Le opzioni -f e -k devono essere nel formato: -k|-f col[,col...]
   -P, --pivot=N       crea una tabella pivot
                       N deve essere un numero e deve corrispondere alla Nma chiave di ragruppamento:
@@ -34,7 +54,115 @@ Opzioni:
   -H, --noheader      non viene visualizzato l'header nell'output (incompatibile con --pivot)
   -C, --nocents       visualizza i valori per intero (default divisione per 100)
   -T, --totals        visualizza l'ultima colonna (o le ultime due colonne) dei totali
+      --rollup        con piu' chiavi -k (es. -k a,b,c), aggiunge le righe dei subtotali di ogni
+                      prefisso della chiave (a b *, a * *), dopo le righe del prefisso: i subtotali
+                      vengono calcolati durante la stampa, senza rileggere il file.
+                      Con -P la chiave di pivot non fa parte dei prefissi (incompatibile con -R)
+      --numpy         usa il motore vettoriale NumPy per i file a larghezza fissa
+                      (record di lunghezza costante; richiede il modulo numpy)
+  -j, --jobs=N        divide il file in N parti, elaborate da N processi in parallelo
+                      (solo file regolari; con lo standard input e i file compressi viene ignorato).
+                      Con --csv il file viene diviso solo se non contiene virgolette (i campi tra
+                      virgolette possono contenere dei fine riga): altrimenti lo legge un solo processo.
+                      Con piu' file di input, N processi elaborano un file per volta ciascuno
+      --reclen=N      record di lunghezza fissa di N byte, senza fine riga
+      --ebcdic        file in codifica EBCDIC: le chiavi vengono convertite in ASCII,
+                      i campi zoned hanno le cifre F0-F9 e il segno nella zona dell'ultimo byte
+      --max_mem=MB    limite (indicativo) della memoria occupata dai totali: quando viene
+                      superato, i totali parziali vengono scaricati su disco in file ordinati
+                      (nella directory $TMPDIR, cancellati alla fine) e fusi durante la stampa.
+                      Incompatibile con -P e -R, che raggruppano di nuovo i totali senza la chiave
+                      di pivot (in un ordine diverso da quello dei file), e con -j, i cui processi
+                      restituiscono i totali parziali in memoria
+      --state=FILE    totali incrementali, per i file che crescono solo in coda (log...):
+                      in FILE vengono salvati i totali, i byte elaborati e un'impronta del file;
+                      all'esecuzione successiva viene letta solo la parte aggiunta.
+                      Se il file e' stato riscritto o troncato, viene riletto dall'inizio
+                      (l'impronta: inode, dimensione e data di modifica del file, e l'md5 del
+                      primo e dell'ultimo blocco della parte gia' elaborata; una modifica in
+                      mezzo che lascia uguali questi blocchi non viene riconosciuta). Un'ultima riga senza fine riga (o un record
+                      incompleto, con --csv anche con un campo tra virgolette non ancora
+                      chiuso) viene stampata nel report ma non salvata nello stato: e'
+                      considerata ancora in scrittura, e viene letta di nuovo alla prossima esecuzione.
+                      (solo file regolari; incompatibile con --max_mem)
+      --sorted        il file e' gia' ordinato per chiave (-k): i totali di ogni chiave vengono
+                      stampati appena la chiave cambia (rottura di codice), senza tenere in memoria
+                      i gruppi; una chiave fuori ordine interrompe l'elaborazione con un errore
+                      (dopo le righe gia' stampate). Le righe vengono stampate mentre il file viene
+                      letto, per cui la colonna delle chiavi ha la larghezza dei campi -k (con
+                      --csv quella della prima chiave), o quella di --key-width.
+                      Con --ebcdic l'ordine e' quello (EBCDIC) del file.
+                      (incompatibile con -P, -R, -j, --numpy, --max_mem, --state e --report)
+      --key-width=N   con --sorted, la larghezza della colonna delle chiavi (le chiavi piu' lunghe
+                      la allargano solo nella loro riga)
+      --report=SPEC   un report calcolato insieme agli altri, leggendo il file una sola volta
+                      (opzione ripetibile): SPEC e' "OUTPUT -k... [-f...] [-P N] [-R]", con il
+                      file di output (- per lo standard output) e le opzioni -k, -f, -P e -R
+                      del report; tutte le altre opzioni valgono per tutti i report.
+      --reports=FILE  i report indicati in FILE, uno per riga nel formato di --report
+                      (le righe vuote e quelle che iniziano con # vengono ignorate)
+                      (--report e --reports sono incompatibili con -k, -f, -P, -R, --numpy,
+                      --max_mem e --state)
+  -w, --where=COND    elabora solo i record che soddisfano la condizione COND (opzione ripetibile:
+                      devono essere soddisfatte tutte le condizioni). COND puo' essere:
+                        pos.len=VAL[,VAL...]      il campo e' uguale a uno dei valori
+                        pos.len^=PREF[,PREF...]   il campo inizia con uno dei prefissi
+                        pos.len[:tipo]=MIN..MAX   il valore numerico del campo (intero, senza la
+                                                  divisione per 100) e' compreso tra MIN e MAX;
+                                                  uno dei due estremi puo' mancare (es. 8.10=0..)
+                      (con --csv: col al posto di pos.len). Le condizioni vengono verificate sui
+                      byte del record, prima di estrarre le chiavi e di decodificare i valori.
+      --build-cache=DIR
+                      legge il file una volta e crea nella directory DIR una cache a colonne dei
+                      campi -k e -f: le chiavi codificate con un dizionario, i valori gia' decodificati
+                      come interi a 64 bit (un file per campo). Non stampa i totali.
+      --cache=DIR     calcola i totali dalla cache DIR creata con --build-cache (richiede il
+                      modulo numpy), leggendo solo le colonne dei campi richiesti: i campi -k
+                      devono essere chiavi della cache (o parti di una chiave), i campi -f valori
+                      della cache; --csv, --reclen, --ebcdic e -w devono essere quelli della cache.
+                      Il file puo' essere omesso; se e' cambiato dopo --build-cache (dimensione o
+                      data di modifica) viene letto il file.
+                      (--build-cache e --cache sono incompatibili con --report, --sorted, --state,
+                      --max_mem e --per-file; con --cache -j viene ignorato)
+      --stats         alla fine scrive sullo standard error un riepilogo in formato JSON: tempo
+                      reale e di CPU di ogni fase (aggregate: lettura, decodifica e raggruppamento
+                      dei record; massage: pivot, range e ordinamento; print: stampa), record e byte
+                      elaborati, record al secondo, gruppi, picco della memoria, numero dei valori
+                      decodificati, di quelli zoned negativi (ultimo carattere negativo Cobol) e di
+                      quelli vuoti, e una stima del tempo di CPU della decodifica
+      --stats-file=FILE
+                      come --stats, con il riepilogo scritto nel file FILE
+      --progress      durante la lettura scrive sullo standard error, ogni 5 secondi, una riga
+                      di avanzamento (MB letti, MB/s e, se noti, record letti e record al secondo)
+      --per-file      con piu' file di input, aggiunge il nome del file come prima chiave
+                      (prima colonna): i totali di ogni chiave vengono suddivisi per file.
+                      Per -P, N continua a indicare la Nma chiave -k
+                      (incompatibile con --max_mem)
+      --server=SOCKET aggrega il file (uno solo, regolare, anche compresso) con i campi -k e -f, e
+                      resta in attesa delle richieste sul socket Unix SOCKET, una per connessione:
+                      una riga con le opzioni -k, -f, -P, -R, -C, -H, --rollup, --output_csv e
+                      --output_delim, a cui risponde con OK e il report, oppure ERR e l'errore
+                      (STATUS: lo stato del server). I campi -k della richiesta devono essere
+                      chiavi del server (o parti di una chiave), i campi -f campi del server.
+                      Prima di ogni richiesta, se il file e' cambiato vengono aggiornati i totali
+                      (solo con la parte aggiunta, se il file e' cresciuto in coda) da un processo
+                      figlio: fino alla fine dell'aggiornamento, o se l'aggiornamento non riesce,
+                      le risposte usano i totali precedenti e iniziano con OK STALE e il motivo
+                      (--query lo scrive sullo standard error). Ogni richiesta viene servita da
+                      un processo figlio: le richieste contemporanee sono indipendenti. Le
+                      opzioni di stampa della riga di comando vengono ignorate.
+                      (incompatibile con -P, -R, --rollup, --report, --sorted, --max_mem, --state,
+                      --per-file, -u, --build-cache e --cache)
+      --query=SOCKET  invia al server di SOCKET le altre opzioni (-k, -f, -P...) e stampa il report
   -h, --help          stampa questo messaggio
+
+  file ...            i file di input (default: lo standard input); anche pattern glob
+                      ('dati/*.dat', espansi in ordine alfabetico). I totali di tutti i file
+                      vengono stampati in un unico report (incompatibile con --sorted e --state).
+                      I file compressi con gzip, bzip2 o xz (anche sullo standard input) vengono
+                      riconosciuti dai primi byte e decompressi da un processo separato, mentre i
+                      dati gia' decompressi vengono elaborati (per xz serve il modulo lzma oppure
+                      il comando xz)
 """
 
 """
@@ -76,9 +204,12 @@ __author__ = ["Ardian Vesho (ardian.vesho.uni@tesoro.it)",]
 __version__ = "$1, 0, 0 $"
 __date__ = "$Date: 2007/12/10 $"
 
-import sys, getopt
-from collections import defaultdict
-from copy import deepcopy
+import sys, os, re, getopt, heapq, time, struct, math
+from itertools import chain, islice, imap
+from hashlib import md5
+from array import array
+from cStringIO import StringIO
+import cobolnum
 
 
 ### impostazioni di default
@@ -91,21 +222,32 @@ opt_cents=1          # divisione per 100
 opt_input_csv=""     # non_csv
 opt_output_csv=""    # non_csv
 opt_output_delim=""  # non_csv
+opt_numpy=""         # motore standard (riga per riga)
+opt_jobs=""          # un solo processo
+opt_reclen=""        # record separati dal fine riga
+opt_ebcdic=""        # ASCII
+opt_max_mem=""       # totali interamente in memoria
+opt_state=""         # nessun file di stato (il file viene letto tutto)
+opt_sorted=""        # i gruppi vengono ordinati alla fine
+opt_key_width=""     # --sorted: la larghezza dei campi -k (o della prima chiave con --csv)
+opt_per_file=""      # i totali di tutti i file di input insieme
+opt_build_cache=""   # nessuna cache da creare
+opt_cache=""         # i campi vengono letti dal file (non dalla cache)
+opt_rollup=""        # solo i totali generali (nessun subtotale)
+opt_stats=""         # nessun riepilogo delle statistiche
+opt_progress=""      # nessuna riga di avanzamento
+opt_server=""        # nessun server: i totali vengono stampati e il programma termina
+opt_query=""         # non e' un client del server
+opt_where = []       # --where: le condizioni sui record
+where_fields = []    # (campo, tipo di condizione, valori, funzione di verifica) delle condizioni
+report_specs = []    # --report, --reports: le specifiche dei report
+reports = []         # i report (Report) da calcolare con una sola lettura del file
 param_keys, param_sums = "", ""
-
-# tabella di conversione da valori negativi Cobol a numerici
-# cobol
-chars = 'pqrstuvwxy'
-cobol2num = dict([(c, str(chars.index(c))) for c in chars])    # {'p':'0', 'q':'1', 'r':'2', 's':'3', 't':'4', 'u':'5', 'v':'6', 'w':'7', 'x':'8', 'y':'9'}
-# mainframe
-chars = '}JKLMNOPQR'
-cobol2num.update([(c, str(chars.index(c))) for c in chars])    # {'K': '2', 'J': '1', 'M': '4', 'L': '3', 'O': '6', 'N': '5', 'Q': '8', 'P': '7', 'R': '9', '}': '0'}
-# convenzione MEF
-chars = 'AJKLMNOPQR'
-cobol2num.update([(c, str(chars.index(c))) for c in chars])    # {'A': '0', 'K': '2', 'J': '1', 'M': '4', 'L': '3', 'O': '6', 'N': '5', 'Q': '8', 'P': '7', 'R': '9'}
-# oppure: 
-#cobol2num = dict([(chars[i], str(i)) for i in range(len(chars))])
-                                            
+param_distinct = ""  # -u: i campi di cui stimare il numero dei valori distinti
+opt_topk = ""        # --topk: nessuna stima dei valori piu' frequenti
+opt_topk_error = ""  # --topk-error: topk_error
+sum_types  = []      # tipo dei campi da sommare (z, p, b; u per i campi -u)
+sum_fields = []      # (pos1, pos2, funzione di decodifica) dei campi da sommare (e dei campi -u)
 
 def usage(code, msg=''):
     if msg:
@@ -122,6 +264,7 @@ def process_arg(arg="", delim=delim):
     if not arg: return []
     ret = []
     for elem in arg.split(","):
+        elem = elem.split(":")[0]               # l'eventuale tipo viene letto da process_types
         if delim:
             ret.append(int(elem)-1)
         else:
@@ -129,15 +272,120 @@ def process_arg(arg="", delim=delim):
             ret.append([pos-1, pos+length-1])    # pos1, pos2: 0-based index
     return ret
 
-def check_numeric_values(number):
-    """gestisce i valori numerici negativi formato Cobol"""
-    try:
-        return int(number)                   # se la stringa di input e' numerico, finisce qui
-    except:
-        if not number: return 0
-        lastchar=cobol2num[number[-1]]         # converte l'ultimo carattere in numerico
-        number='-' + number[:-1] + lastchar    # aggiunge il segno '-' all'inizio
-        return int(number)
+def process_types(arg=""):
+    """
+    -f pos.len[:tipo][,pos.len[:tipo]...] -> [tipo, ...]   (z, p, b)
+    """
+    if not arg: return []
+    ret = []
+    for elem in arg.split(","):
+        type = elem.partition(":")[2] or "z"
+        if type == "p3": type = "p"
+        if type not in ("z", "p", "b"):
+            raise ValueError("tipo di campo non valido: '%s'" % type)
+        ret.append(type)
+    return ret
+
+def field_decoder(type):
+    """funzione di decodifica di un campo da sommare"""
+    if type == "p": return cobolnum.decode_packed
+    if type == "b": return cobolnum.decode_binary
+    if opt_ebcdic:  return cobolnum.decode_zoned_ebcdic
+    return check_numeric_values
+
+def value_decoder(type):
+    """la funzione di decodifica dei valori sommati di un campo: field_decoder, oppure con
+       --stats quella di stats_decoder, che conta i valori (una sola per tipo)"""
+    if not stats: return field_decoder(type)
+    if type not in stats.decoders:
+        stats.decoders[type] = stats_decoder(field_decoder(type), type)
+    return stats.decoders[type]
+
+# gestisce i valori numerici negativi formato Cobol (vedi cobolnum.py)
+check_numeric_values = cobolnum.decode_zoned
+
+def process_where(conds):
+    """
+    -w campo=val[,val...] | campo^=pref[,pref...] | campo[:tipo]=min..max
+      -> [(campo, 'in'|'prefix'|'range', valori, funzione di verifica), ...]
+    dove campo e' [pos1, pos2] (oppure col, con --csv) come in process_arg
+    """
+    ret = []
+    for cond in conds:
+        m = re.match(r'^([0-9.]+(?::\w+)?)(\^?=)(.*)$', cond)
+        if not m:
+            raise ValueError("condizione non valida: '%s'" % cond)
+        spec, op, arg = m.groups()
+        field = process_arg(spec, delim)[0]
+        if not delim: field = tuple(field)
+        type = process_types(spec)[0]
+
+        limits = re.match(r'^(-?\d+)?\.\.(-?\d+)?$', arg)
+        if op == '=' and limits:
+            lo, hi = limits.groups()
+            lo = lo is None and float('-inf') or int(lo)
+            hi = hi is None and float('inf') or int(hi)
+            if delim:
+                decode = check_numeric_values
+            else:
+                decode = field_decoder(type)
+            ret.append((field, 'range', (lo, hi, type), range_test(decode, lo, hi)))
+            continue
+        if ":" in spec:
+            raise ValueError("il tipo del campo e' ammesso solo con MIN..MAX: '%s'" % cond)
+
+        values = arg.split(",")
+        if opt_ebcdic:                      # il confronto e' sui byte del record
+            values = [v.translate(cobolnum.ascii2ebcdic) for v in values]
+        if op == '^=':
+            lengths = set([len(v) for v in values])
+            if delim or len(lengths) > 1 or max(lengths) > field[1] - field[0]:
+                values = tuple(values)
+                ret.append((field, 'prefix', values, lambda v, values=values: v.startswith(values)))
+                continue
+            # prefissi della stessa lunghezza: confronto con un campo piu' corto
+            field = (field[0], field[0] + max(lengths))
+        values = frozenset(values)
+        ret.append((field, 'in', values, values.__contains__))
+    return ret
+
+def where_regex():
+    """espressioni regolari per le righe che possono soddisfare le condizioni di uguaglianza
+       e di prefisso: la prima verifica la riga che inizia in una posizione (match), la seconda
+       trova il fine riga che precede la prossima riga (search); le altre righe vengono saltate
+       senza esaminarle una per una. Trovano anche qualche riga in piu' (per es. le righe corte):
+       le condizioni vanno comunque verificate con where_filter.
+       None se non ci sono condizioni di questo tipo o se i record non sono separati dal fine riga"""
+    if opt_reclen or opt_input_csv: return None
+    lookaheads = []
+    for ((p1, p2), kind, values, test) in where_fields:
+        if kind == 'range': continue
+        alts = [re.escape(v) for v in values if len(v) <= p2 - p1]    # gli altri valori non sono mai uguali al campo
+        lookaheads.append('(?=.{%d}(?:%s))' % (p1, '|'.join(alts) or '(?!)'))
+    if not lookaheads: return None
+    return re.compile(''.join(lookaheads)), re.compile('\n' + ''.join(lookaheads))
+
+def range_test(decode, lo, hi):
+    return lambda v: lo <= decode(v) <= hi
+
+def where_filter():
+    """funzione che verifica le condizioni --where su un record: accept(buf, pos) per i record
+       a larghezza fissa (il record inizia al byte pos di buf), accept(row) per le righe csv;
+       None se non ci sono condizioni"""
+    if not where_fields: return None
+    if opt_input_csv:
+        conds = [(i, test) for (i, kind, values, test) in where_fields]
+        def accept(row):
+            for (i, test) in conds:
+                if not test(row[i]): return False
+            return True
+    else:
+        conds = [(p1, p2, test) for ((p1, p2), kind, values, test) in where_fields]
+        def accept(buf, pos):
+            for (p1, p2, test) in conds:
+                if not test(buf[pos+p1:pos+p2]): return False
+            return True
+    return accept
 
     
 #####################################
@@ -194,45 +442,42 @@ def rotatematrix(data):
 
 
 def massage_data_with_range(totals):
+    """raggruppa i totali senza la chiave di pivot, tenendone il minimo e il massimo:
+       restituisce l'header, le coppie (key, [min, max, recs]) ordinate per chiave
+       e la larghezza della prima colonna"""
     if not totals: return
 
     # nel caso di opt_range, si prospettano solo i valori min e max, e tot_rec
-    totals_new = defaultdict(lambda: [None,None,0])
+    totals_new = {}
+    key_width = 0                               # larghezza massima delle chiavi, calcolata man mano
 
-    # inizialmente, si contano le colonne nuove (opt_pivot contiene la chiave iniziale che viene trasformata in col)
+    # la chiave di pivot (opt_pivot) viene tolta dalla chiave, e ne vengono tenuti il minimo e il massimo
     ind_xaxis = opt_pivot - 1   # base-0
-    xaxis = sorted(set(key[ind_xaxis] for key in totals.keys()))
-
-    for (key, value) in totals.items():
-        l = list(key)
-        new_val = l.pop(ind_xaxis)
-        new_key = tuple(l)
-        if (totals_new[new_key][0] is None) or (new_val < totals_new[new_key][0]):
-            totals_new[new_key][0] = new_val
-        if (totals_new[new_key][1] is None) or (new_val > totals_new[new_key][1]):
-            totals_new[new_key][1] = new_val
-        totals_new[new_key][2] += value[-1]    # value = [sum1, sum2...sumn, tot_rec]  -> tot_rec
-
-    #  Adesso il dictionary viene trasformato in una matrice (una lista di liste), in cui 
-    #+ la prima riga contiene le diciture dei campi, e la prima colonna le chiavi del dictionary
-    list_totals = []
+
+    for (key, value) in totals.iteritems():
+        new_val = key[ind_xaxis]
+        new_key = key[:ind_xaxis] + key[ind_xaxis+1:]
+        row = totals_new.get(new_key)
+        if row is None:
+            totals_new[new_key] = [new_val, new_val, value[-1]]
+            key_width = max(key_width, len(' '.join(new_key)))
+            continue
+        if new_val < row[0]: row[0] = new_val
+        if new_val > row[1]: row[1] = new_val
+        row[2] += value[-1]                     # value = [sum1, sum2...sumn, tot_rec]  -> tot_rec
 
     header = ['key', 'min', 'max']
     if opt_totals:
         header +=['recs']
-    list_totals.append(header)
-    tot_gen = [0]*(len(header)-1)
-
-    for (key, value) in sorted(totals_new.iteritems()):
-        new_key   = ' '.join(key)
-        new_value = value[:2]                   # da [min, max, rec] -> [min, max]
-        list_totals.append([new_key]+value)     # inserisce in testa 'key'
 
-    # alla fine restituisce list_totals
-    return list_totals
+    # le righe non vengono copiate in una matrice: le coppie (key, value) vengono solo ordinate
+    return header, sorted(totals_new.iteritems()), max(key_width, len(header[0]))
 
 
 def massage_data_no_range(totals):
+    """raggruppa nuovamente i totali secondo la chiave di pivot (se richiesta):
+       restituisce l'header, le coppie (key, value) ordinate per chiave
+       e la larghezza della prima colonna"""
     if not totals: return
 
     # viene raggruppato nuovamente il dictionary secondo la chiave di pivot, 
@@ -240,51 +485,75 @@ def massage_data_no_range(totals):
         
         # inizialmente, si contano le colonne nuove (opt_pivot contiene la chiave iniziale che viene trasformata in col)
         ind_xaxis = opt_pivot - 1   # base-0
-        xaxis = sorted(set(key[ind_xaxis] for key in totals.keys()))
+        xaxis = sorted(set(key[ind_xaxis] for key in totals))
+        ind_cols = dict([(col, i) for (i, col) in enumerate(xaxis)])    # colonna -> indice, senza xaxis.index()
+        num_cols = len(xaxis)
 
-        # nel caso di una nuova chiave, il valore di default e' [None, None...,0]
-        totals_new = defaultdict(lambda: [None]*(len(xaxis))+[0])
+        # nel caso di una nuova chiave, il valore iniziale e' [None, None...,0]
+        totals_new = {}
+        key_width = 0                           # larghezza massima delle chiavi, calcolata man mano
     
-        for (key, value) in totals.items():
-            l = list(key)
-            new_col = l.pop(ind_xaxis)
-            new_key = tuple(l)
-            ind_col = xaxis.index(new_col)
-            if totals_new[new_key][ind_col] is None:
-                totals_new[new_key][ind_col]  = value[0]   # in modalita' pivot puo' esserci solo un campo da sommare, cioe' len(value)=1.
+        for (key, value) in totals.iteritems():
+            new_key = key[:ind_xaxis] + key[ind_xaxis+1:]
+            ind_col = ind_cols[key[ind_xaxis]]
+            row = totals_new.get(new_key)
+            if row is None:
+                row = totals_new[new_key] = [None]*num_cols + [0]
+                key_width = max(key_width, len(' '.join(new_key)))
+            if row[ind_col] is None:
+                row[ind_col]  = value[0]        # in modalita' pivot puo' esserci solo un campo da sommare, cioe' len(value)=1.
             else:
-                totals_new[new_key][ind_col] += value[0]
+                row[ind_col] += value[0]
             # aggiorna anche l'ultimo campo, 'recs'
-            totals_new[new_key][-1] += value[-1]
+            row[-1] += value[-1]
 
     else:
-        totals_new = deepcopy(totals)
+        totals_new = totals                         # i totali vengono letti, senza copiarli
+        key_width = totals.key_width                # calcolata durante l'aggregazione
 
+    # first_value contiene almeno il valore tot_rec ([...,tot_rec])
+    first_value = totals_new.itervalues().next()
+    if opt_pivot:
+        header = header_no_range(first_value, xaxis)
+        items = sorted(totals_new.iteritems())
+    else:
+        header = header_no_range(first_value)
+        items = totals_new.sorted_items()
 
-    #  Adesso il dictionary viene trasformato in una matrice (una lista di liste), in cui 
-    #+ la prima riga contiene le diciture dei campi, e la prima colonna le chiavi del dictionary
-    list_totals = []
+    # la prima colonna contiene anche 'key' (header) e 'total' (totali generali)
+    return header, items, max(key_width, len(header[0]), len('total'))
 
-    # first_value contiene almeno il valore tot_rec ([...,tot_rec])
-    first_value = totals_new.values()[0]
+
+def header_no_range(first_value, xaxis=None):
+    """le diciture dei campi: key, sum1...sumn (oppure le colonne pivot), total, dist1..., recs"""
     header = ['key']
-    if opt_pivot:
+    num_sums = len(first_value) - 1 - len(param_distinct)     # le stime (-u) non sono campi sum
+    if xaxis is not None:
         header += xaxis
     else:
-        header +=['sum%d'%(i+1) for i in range(len(first_value)-1)]  # considera solo i campi sum
+        header +=['sum%d'%(i+1) for i in range(num_sums)]  # considera solo i campi sum
     
+    if opt_totals and (param_sums) and num_sums > 1:   # i campi 'sums' senza l'ultimo campo 'recs'
+        header +=['total']        # se i campi 'sums' sono piu' di uno, si aggiunge il campo 'total', prima dell'ultimo campo 'recs'
+    header += distinct_header()
     if opt_totals:
-        if (param_sums) and len(first_value) > 2:   # i campi 'sums' senza l'ultimo campo 'recs'
-            header +=['total']        # se i campi 'sums' sono piu' di uno, si aggiunge il campo 'total', prima dell'ultimo campo 'recs'
         header +=['recs']
-    list_totals.append(header)
-
-    # in 'list_totals' vengono aggiunti i dati, con l'accortezza di impostare il penultimo
-    # campo 'total', con la somma dei campi precedenti; in piu' viene aggiunto alla 
-    # fine la riga dei totali generali
-    tot_gen = [0]*(len(header)-1)
-
-    for (key, value) in sorted(totals_new.iteritems()):
+    return header
+
+
+def rows_no_range(items, tot_gen):
+    """le righe di dettaglio, dalle coppie (key, value) ordinate per chiave;
+       i totali generali vengono sommati in tot_gen.
+       Con --rollup, dopo le righe di ogni prefisso della chiave viene prodotta anche
+       la riga dei suoi subtotali (rollup_rows)"""
+    levels = rollup_levels()
+    subtotals = []
+    num_distinct = len(param_distinct)
+    merged = [None]*num_distinct        # -u: le stime di tutti i gruppi, per i totali generali
+    for (key, value) in items:
+        if num_distinct:                # [sum1...sumn, stime, tot_rec] -> [sum1...sumn, tot_rec]
+            sketches = value[-1-num_distinct:-1]
+            value = value[:-1-num_distinct] + value[-1:]
         tot_value=0
         new_value=[]
 
@@ -301,184 +570,2635 @@ def massage_data_no_range(totals):
         # aggiunge il tot_sums (se ci sono almeno 2 campi sum)
         if opt_totals and param_sums and len(value)>2:
             new_value.append(tot_value)
-            tot_gen[-2] +=tot_value
+            tot_gen[len(new_value)-1] +=tot_value
+        # le stime dei campi -u
+        if num_distinct:
+            new_value += distinct_cells(sketches)
+            for i in range(num_distinct):
+                if merged[i] is None: merged[i] = sketches[i].copy()
+                else:                 merged[i].merge(sketches[i])
         # infine tot_rec
         new_value.append(value[-1])
         tot_gen[-1] +=value[-1]
 
+        if levels:
+            for row in rollup_rows(key, new_value, subtotals, levels):
+                yield row
         new_key = ' '.join(key)
-        list_totals.append([new_key]+new_value)     # inserisce in testa 'key'
-
-    # alla fine restituisce list_totals
-    list_totals.append(['total']+tot_gen)           # alla fine inserisce la riga dei totali generali
-    return list_totals
+        yield [new_key]+new_value                   # inserisce in testa 'key'
+    if levels:
+        for row in rollup_rows(None, None, subtotals, levels):
+            yield row
+    if num_distinct and merged[0] is not None:
+        cells = distinct_cells(merged)
+        tot_gen[-1-len(cells):-1] = cells
+
+
+def rollup_levels():
+    """--rollup: il numero dei livelli di subtotali, cioe' dei prefissi della chiave
+       stampata (senza la chiave di pivot, con il nome del file di --per-file)"""
+    if not opt_rollup: return 0
+    return len(param_keys) + (opt_per_file and 1 or 0) - (opt_pivot and 1 or 0) - 1
+
+def rollup_rows(key, value, subtotals, levels):
+    """--rollup: le righe dei subtotali dei prefissi che finiscono prima della chiave key
+       (alla fine, con key None, tutti), dal piu' lungo al piu' corto; poi value viene
+       sommato nei subtotali dei prefissi di key.
+       subtotals contiene, per ogni prefisso aperto, [prefisso, subtotali]"""
+    level = 0
+    if key is not None:
+        key = tuple(key)
+        while level < len(subtotals) and subtotals[level][0] == key[:level+1]:
+            level += 1
+    while len(subtotals) > level:
+        prefix, sums = subtotals.pop()
+        # i campi mancanti della chiave vengono stampati come '*'
+        yield [' '.join(prefix + ('*',)*(levels + 1 - len(prefix)))] + sums
+    if key is None: return
+
+    for (prefix, sums) in subtotals:
+        i=0
+        for v in value:
+            if v is not None:       # le celle vuote della tabella pivot
+                if sums[i] is None: sums[i] = v
+                else:               sums[i] += v
+            i+=1
+    for i in range(level, levels):
+        subtotals.append([key[:i+1], list(value)])
 
 
 def print_totals_with_range(totals):
     if not totals: return
 
     # all'inizio manipola i dati, raggruppando per la chiave
-    list_totals = massage_data_with_range(totals)
-    if not list_totals: return
+    if stats: stats.begin('massage')
+    header, items, len_first_col = massage_data_with_range(totals)
+    if stats: stats.begin('print')
+    if not items: return
+    rows = ([' '.join(key)]+value for (key, value) in items)    # inserisce in testa 'key'
 
     # se viene richiesta l'output in formato csv, non ci si preoccupa della formattazione:
+    write = sys.stdout.write
     if opt_output_csv:
         if opt_header:
-            print opt_output_delim.join(list_totals[0])
-        num_row = 1
-        for row in list_totals[1:]:
-            num_row+=1
-            print opt_output_delim.join([str(v) for v in row])
+            write(opt_output_delim.join(header) + '\n')
+        for row in rows:
+            write(opt_output_delim.join(map(str, row)) + '\n')
         return
     
-    # calcola la larghezza massima della prima colonna (key), e delle altre colonne (sums)
-    len_first_col = max([len(row[0]) for row in list_totals])       # verifica il primo campo di tutte le rige, overo 'key'          (['AL', 21.0, 60.0, 81.0, 2]  -> 'AL')
-    len_other_cols= max([len(str(n)) for n in list_totals[1]])      # verifica tutti i campi della SECONDA riga, ovvero della testata  (['key', 'AL', 'AR', 'total'] -> 'key')
+    # la larghezza delle altre colonne viene calcolata sulla prima riga di dettaglio
+    (key, value) = items[0]
+    len_other_cols= max([len(str(n)) for n in [' '.join(key)]+value])
     if len_first_col <5: len_first_col=5
 
+    # il formato di tutta la riga viene preparato una volta sola
+    fmt_row = "%%-%ss"%len_first_col + " %%%ss"%len_other_cols * (len(header)-1)
+
     # header
     if opt_header:
-        row=list_totals[0] 
-        s = []
-        fmt="%%-%ss"%len_first_col
-        s.append(fmt % row[0])
-        for value in row[1:]:
-            fmt=" %%%ss"%len_other_cols
-            s.append(fmt % value)
-        print ''.join(s)
+        write(fmt_row % tuple(header) + '\n')
 
     # ciclo sui dati
-    num_row = 1
-    for row in list_totals[1:]:
-        num_row+=1
-        s = []
-        fmt="%%-%ss"%len_first_col
-        s.append(fmt % row[0])
-        for value in row[1:]:
-            fmt=" %%%ss"%len_other_cols
-            s.append(fmt % value)
-        print ''.join(s)
+    for row in rows:
+        write(fmt_row % tuple(row) + '\n')
     # if opt_range, i totali generali mancano
 
 
 def print_totals_no_range(totals):
     if not totals: return
 
-    # all'inizio manipola i dati, raggruppando per la chiave
-    list_totals = massage_data_no_range(totals)
-    if not list_totals: return
+    # all'inizio manipola i dati, raggruppando per la chiave: le righe vengono prodotte
+    # man mano che vengono stampate, e i totali generali sommati in tot_gen
+    if stats: stats.begin('massage')
+    header, items, len_first_col = massage_data_no_range(totals)
+    if stats: stats.begin('print')
+    tot_gen = [0]*(len(header)-1)
+    write_totals_no_range(header, rows_no_range(items, tot_gen), tot_gen, len_first_col)
+
+
+def write_totals_no_range(header, rows, tot_gen, len_first_col):
+    """stampa l'header, le righe di dettaglio (anche da un iteratore) e infine la riga
+       dei totali generali, che viene letta da tot_gen dopo l'ultima riga di dettaglio"""
 
     # se viene richiesta l'output in formato csv, non ci si preoccupa della formattazione:
+    write = sys.stdout.write
     if opt_output_csv:
         if opt_header:
-            print opt_output_delim.join(list_totals[0])
-        num_row = 1
-        for row in list_totals[1:]:
-            num_row+=1
-            if num_row == len(list_totals): print  # aggiunge una riga vuota prima dei totali generali
-            print opt_output_delim.join([str(v) for v in row])
+            write(opt_output_delim.join(header) + '\n')
+        for row in rows:
+            write(opt_output_delim.join(map(str, row)) + '\n')
+        write('\n')  # aggiunge una riga vuota prima dei totali generali
+        write(opt_output_delim.join(map(str, ['total']+tot_gen)) + '\n')
         return
     
-    # calcola la larghezza massima della prima colonna (key), e delle altre colonne (sums)
-    len_first_col = max([len(row[0]) for row in list_totals])       # verifica il primo campo di tutte le rige, overo 'key'          (['AL', 21.0, 60.0, 81.0, 2]  -> 'AL')
-    len_other_cols= max([len(str(n)) for n in list_totals[0]])      # verifica tutti i campi della PRIMA   riga, ovvero della testata  (['key', 'AL', 'AR', 'total'] -> 'key')
+    # calcola la larghezza massima delle altre colonne (sums)
+    len_other_cols= max([len(str(n)) for n in header])              # verifica tutti i campi della PRIMA   riga, ovvero della testata  (['key', 'AL', 'AR', 'total'] -> 'key')
     if len_first_col <5: len_first_col=5
     if (param_sums) and len_other_cols <13:
         len_other_cols=13
 
+    # i formati delle colonne vengono preparati una volta sola: key, sums (anche il
+    # penultimo campo 'total') e tot_rec, e quello di tutta la riga
+    fmt_key = "%%-%ss"%len_first_col
+    fmt_str = " %%%ss"%len_other_cols
+    if opt_cents:
+        fmt_sum = " %%%s.2f"%len_other_cols
+    else:
+        fmt_sum = " %%%s.0f"%len_other_cols
+    num_cells = len(distinct_header())     # le stime (-u) sono numeri interi o stringhe
+    num_sums = len(header) - 1 - (opt_totals and 1 or 0) - num_cells
+    fmt_cols = [fmt_key] + [fmt_sum]*num_sums + [fmt_str]*num_cells + (opt_totals and [fmt_str] or [])
+    fmt_row = ''.join(fmt_cols)
+
     # header
     if opt_header:
-        row=list_totals[0] 
-        s = []
-        fmt="%%-%ss"%len_first_col
-        s.append(fmt % row[0])
-        for value in row[1:]:
-            fmt=" %%%ss"%len_other_cols
-            s.append(fmt % value)
-        print ''.join(s)
-
-    # le righe di dettaglio
-    num_row = 1
-    for row in list_totals[1:]:
-        num_row+=1
-        s = []
-        fmt="%%-%ss"%len_first_col
-        s.append(fmt % row[0])
-        # tutti i sums, eccetto l'ultimo campo: tot_rec
-        for value in row[1:-1]:
-            if value != None:
-                if opt_cents:
-                    fmt=" %%%s.2f"%len_other_cols
-                else:
-                    fmt=" %%%s.0f"%len_other_cols
+        write(fmt_key % header[0] + ''.join([fmt_str % value for value in header[1:]]) + '\n')
+
+    # le righe di dettaglio, e alla fine quella dei totali generali
+    for row in chain(rows, [None]):
+        if row is None:
+            write('\n')  # aggiunge una riga vuota prima dei totali generali
+            row = ['total']+tot_gen
+        if not opt_totals:
+            row = row[:-1]
+        if None in row:
+            # le celle vuote della tabella pivot vengono stampate come stringhe
+            write(''.join([(value is None and fmt_str or fmt) % value for (fmt, value) in zip(fmt_cols, row)]) + '\n')
+        else:
+            write(fmt_row % tuple(row) + '\n')
+
+
+#####################################
+# i totali per chiave
+#
+class Totals(object):
+    """I totali [sum1...sumn, tot_rec] di ogni chiave (tuple di valori).
+       Le chiavi vengono numerate nell'ordine in cui compaiono (id del gruppo), e i totali
+       tenuti in array di interi a 64 bit, uno per colonna: per ogni gruppo c'e' un
+       elemento di 8 byte per colonna, invece di una lista di interi.
+       Ogni chiave e' tenuta in forma compatta, come una sola stringa invece di una tuple
+       di stringhe (pack e unpack): con span_keys (i campi -k a larghezza fissa, se
+       occupano byte contigui) sono i byte dei campi, cosi' come si trovano nel record;
+       altrimenti le chiavi separate da \\0 (join_keys).
+       La larghezza massima delle chiavi (key_width) viene calcolata man mano che
+       vengono creati i gruppi, per la stampa.
+       Si legge come un dictionary (items, iteritems, keys...), senza copiarlo."""
+
+    def __init__(self, num_values, span_keys=None):
+        self.ids = {}                  # chiave compatta -> id del gruppo
+        self.group_keys = []           # id del gruppo -> chiave compatta
+        self.columns = [array('l') for i in range(num_values)]
+        self.key_width = 0             # larghezza massima di ' '.join(keys)
+        self.span_keys = span_keys and key_span(span_keys) and list(span_keys) or None
+        if self.span_keys:
+            k1 = key_span(span_keys)[0]
+            self.offsets = [(p1-k1, p2-k1) for (p1, p2) in span_keys]
+            self.order = sorted(range(len(span_keys)), key=span_keys.__getitem__)
+
+    def pack(self, keys):
+        """la chiave compatta della tuple keys"""
+        if self.span_keys is None: return join_keys(keys)
+        return ''.join([keys[i] for i in self.order])
+
+    def unpack(self, raw):
+        """la tuple delle chiavi della chiave compatta raw"""
+        if self.span_keys is None: return split_keys(raw)
+        return tuple([raw[p1:p2] for (p1, p2) in self.offsets])
+
+    def new_group(self, raw):
+        """un nuovo gruppo, con la chiave compatta raw"""
+        gid = self.ids[raw] = len(self.group_keys)
+        self.group_keys.append(raw)
+        width = len(' '.join(self.unpack(raw)))
+        if width > self.key_width: self.key_width = width
+        for col in self.columns:
+            col.append(0)
+        return gid
+
+    def group(self, keys):
+        raw = self.pack(keys)
+        gid = self.ids.get(raw)
+        if gid is None:
+            gid = self.new_group(raw)
+        return gid
+
+    def add(self, gid, values, recs=1):
+        """somma al gruppo i valori [sum1...sumn] e il numero dei record"""
+        columns = self.columns
+        try:
+            i = 0
+            for val in values:
+                columns[i][gid] += val
+                i += 1
+        except OverflowError:
+            self.add_wide(gid, values, i)
+        columns[-1][gid] += recs
+
+    def add_wide(self, gid, values, start):
+        """add dalla colonna start in poi, quando la colonna start supera i 64 bit:
+           la colonna diventa una lista di interi"""
+        columns = self.columns
+        for i in xrange(start, len(values)):
+            try:
+                columns[i][gid] += values[i]
+            except OverflowError:
+                columns[i] = list(columns[i])
+                columns[i][gid] += values[i]
+
+    def value(self, gid):
+        return [col[gid] for col in self.columns]
+
+    def merge(self, other, prefix=()):
+        """somma i totali parziali di un altro Totals (con le chiavi precedute da prefix)"""
+        same = not prefix and self.span_keys == other.span_keys
+        for gid in xrange(len(other)):
+            raw = other.group_keys[gid]
+            if same:
+                mine = self.ids.get(raw)
+                if mine is None: mine = self.new_group(raw)
             else:
-                fmt=" %%%ss"%len_other_cols
-            s.append(fmt % value)
-            # tot_rec
-        if opt_totals:
-            fmt=" %%%ss"%len_other_cols
-            s.append(fmt % row[-1])
+                mine = self.group(prefix + other.unpack(raw))
+            value = other.value(gid)
+            self.add(mine, value[:-1], value[-1])
+
+    def rename(self, func):
+        """sostituisce ogni chiave con func(chiave) (func deve essere biunivoca)"""
+        pack, unpack = self.pack, self.unpack
+        self.group_keys[:] = [pack(func(unpack(raw))) for raw in self.group_keys]
+        self.ids.clear()
+        self.ids.update([(raw, gid) for (gid, raw) in enumerate(self.group_keys)])
+
+    def clear(self):
+        """svuota i totali (key_width viene mantenuta: vale anche per i gruppi scaricati su disco)"""
+        self.ids.clear()
+        del self.group_keys[:]
+        self.columns = [array('l') for col in self.columns]
+
+    def __len__(self):
+        return len(self.group_keys)
+
+    def __contains__(self, keys):
+        return self.pack(keys) in self.ids
+
+    def __iter__(self):
+        return imap(self.unpack, self.group_keys)
+
+    def __getitem__(self, keys):
+        return self.value(self.ids[self.pack(keys)])
+
+    def keys(self):
+        return list(self)
+
+    def iteritems(self):
+        unpack = self.unpack
+        for gid in xrange(len(self.group_keys)):
+            yield unpack(self.group_keys[gid]), self.value(gid)
+
+    def itervalues(self):
+        for gid in xrange(len(self.group_keys)):
+            yield self.value(gid)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def sorted_items(self):
+        """le coppie (keys, value) ordinate per chiave: le chiavi compatte hanno lo stesso
+           ordine delle tuple, se i campi -k sono in ordine di posizione (e nessuna chiave
+           contiene \\0)"""
+        group_keys, unpack = self.group_keys, self.unpack
+        if self.span_keys is None:
+            ordered = tuple not in set(map(type, group_keys))
+        else:
+            ordered = self.order == range(len(self.order))
+        key = ordered and group_keys.__getitem__ or (lambda gid: unpack(group_keys[gid]))
+        order = sorted(xrange(len(group_keys)), key=key)
+        return ((unpack(group_keys[gid]), self.value(gid)) for gid in order)
+
+def join_keys(keys):
+    """la chiave compatta di una lista di chiavi: le chiavi separate da \\0 (una tuple,
+       se una delle chiavi contiene \\0)"""
+    raw = '\0'.join(keys)
+    if raw.count('\0') != len(keys) - 1: return tuple(keys)
+    return raw
+
+def split_keys(raw):
+    """la tuple delle chiavi di join_keys"""
+    if raw.__class__ is tuple: return raw
+    return tuple(raw.split('\0'))
+
+def new_totals(keyed=1):
+    """[0,0...max_sums,tot_rec] per ogni chiave; keyed: le chiavi sono i campi -k
+       (e non, per esempio, preceduti dal nome del file)"""
+    span_keys = keyed and not opt_input_csv and param_keys or None
+    if param_distinct:
+        return SketchTotals(len(param_sums) + 1, len(param_distinct), span_keys)
+    return Totals(len(param_sums) + 1, span_keys)
 
-        # aggiunge una riga vuota prima dei totali generali
-        if num_row == len(list_totals): print
-        print ''.join(s)
 
+#####################################
+# stime per gruppo (-u, --topk)
+#
+# Per ogni campo -u, ogni gruppo ha una stima (Distinct) di dimensione fissa, invece
+# dell'insieme dei valori: il numero dei valori distinti viene stimato con HyperLogLog
+# (2**hll_precision registri di un byte, errore standard 1.04/sqrt(2**hll_precision),
+# circa il 3%), e con --topk N i valori piu' frequenti con Space-Saving (topk_counters
+# valori per gruppo, ognuno con il suo peso: il primo campo -f, oppure il numero dei
+# record). Le stime di due gruppi si fondono (merge) con il massimo dei registri e, per
+# Space-Saving, la somma dei pesi, dove un valore che manca da una stima piena vale il suo
+# peso minore: cosi' la sovrastima resta al massimo W/topk_counters anche dopo la fusione,
+# e -j, i file multipli e la riga dei totali generali funzionano come per le somme.
+# Le stime sono colonne di SketchTotals dopo quelle dei campi da sommare; con i campi a
+# larghezza fissa i campi -u sono in sum_fields, con il tipo 'u' e il valore del campo
+# (senza decodifica).
+#
+hll_precision = 10                 # bit dell'indice dei registri HyperLogLog
+hll_unpack = struct.Struct('>HQ').unpack
+hll_powers = [2.0 ** -r for r in range(66)]
+topk_error = 0.01                  # l'errore di default di --topk, come frazione del peso del gruppo
+topk_counters = 0                  # valori tenuti da Space-Saving: max(N, 1/errore) (check_arguments)
+
+def topk_floor(top):
+    """il peso minore di una stima Space-Saving piena (0 se non e' piena): il peso massimo
+       di un valore che non vi e' tenuto"""
+    if len(top) < topk_counters: return 0
+    return max(min(top.itervalues()), 0)
+
+class Distinct(object):
+    """la stima dei valori distinti di un campo (HyperLogLog) e, con --topk, dei valori piu'
+       frequenti (Space-Saving): valore -> peso, per al massimo topk_counters valori"""
+
+    __slots__ = ('registers', 'top', 'low')
+
+    def __init__(self):
+        self.registers = bytearray(1 << hll_precision)
+        self.top = None
+        self.low = None                 # (peso, valori) dei valori con il peso minore (least)
+        if opt_topk: self.top = {}
+
+    def __getstate__(self):            # per i processi di -j (__slots__ senza __dict__)
+        return self.registers, self.top
+
+    def __setstate__(self, state):
+        self.registers, self.top = state
+        self.low = None
+
+    def add(self, item, weight=1):
+        """aggiunge un valore del campo, con il suo peso (oppure fonde un'altra stima)"""
+        if isinstance(item, Distinct):
+            self.merge(item)
+            return
+        # i primi 16 bit dell'md5 scelgono il registro, i 64 successivi il rango
+        # (la posizione del primo bit a 1)
+        index, bits = hll_unpack(md5(item).digest()[:10])
+        index >>= 16 - hll_precision
+        rank = 65 - bits.bit_length()
+        registers = self.registers
+        if rank > registers[index]:
+            registers[index] = rank
+
+        top = self.top
+        if top is None: return
+        count = top.get(item)
+        if count is not None:
+            top[item] = count + weight
+        elif weight <= 0:               # un valore non tenuto non puo' salire con un peso negativo
+            return
+        elif len(top) < topk_counters:
+            top[item] = weight
+        else:                           # prende il posto del valore con il peso minore
+            top[item] = top.pop(self.least()) + weight
+
+    def least(self):
+        """il valore con il peso minore. I valori con il peso minore vengono cercati tutti
+           insieme, e restano candidati finche' il loro peso non cambia (con i pesi non
+           negativi il peso minore puo' solo crescere)"""
+        top = self.top
+        if self.low:
+            count, items = self.low
+            while items:
+                item = items.pop()
+                if top.get(item) == count: return item
+        count = min(top.itervalues())
+        items = [item for (item, c) in top.iteritems() if c == count]
+        self.low = (count, items)
+        return items.pop()
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        if self.top is None: return
+        top, other = self.top, other.top
+        # il peso di un valore che manca da una stima piena e' al massimo il suo peso minore
+        mine, theirs = topk_floor(top), topk_floor(other)
+        for item in top:
+            if item not in other: top[item] += theirs
+        for (item, count) in other.iteritems():
+            top[item] = top.get(item, mine) + count
+        if len(top) > topk_counters:
+            kept = sorted(top.iteritems(), key=lambda (item, count): -count)[:topk_counters]
+            top.clear()
+            top.update(kept)
+        self.low = None
+
+    def copy(self):
+        new = Distinct()
+        new.registers = bytearray(self.registers)
+        if self.top is not None:
+            new.top = dict(self.top)
+        return new
+
+    def estimate(self):
+        """il numero stimato dei valori distinti"""
+        registers = self.registers
+        m = len(registers)
+        e = 0.7213 / (1 + 1.079 / m) * m * m / sum([hll_powers[r] for r in registers])
+        zeros = registers.count('\0')
+        if e <= 2.5 * m and zeros:      # pochi valori: conteggio dei registri vuoti
+            e = m * math.log(float(m) / zeros)
+        return int(round(e))
+
+    def top_items(self):
+        """i opt_topk valori con il peso maggiore: [(valore, peso)...], dal maggiore"""
+        return sorted(self.top.iteritems(), key=lambda (item, count): (-count, item))[:opt_topk]
+
+class SketchTotals(Totals):
+    """Totals con le colonne delle stime (Distinct) dei campi -u, dopo quelle dei campi da
+       sommare: in add, dopo i valori da sommare ci sono i valori dei campi -u (oppure, da
+       merge, le stime di un altro Totals)"""
+
+    def __init__(self, num_values, num_distinct, span_keys=None):
+        Totals.__init__(self, num_values, span_keys)
+        self.num_sums = num_values - 1
+        self.columns[-1:-1] = [[] for i in range(num_distinct)]
+
+    def new_group(self, raw):
+        gid = Totals.new_group(self, raw)
+        for col in self.columns[self.num_sums:-1]:
+            col[gid] = Distinct()
+        return gid
+
+    def add(self, gid, values, recs=1):
+        num_sums = self.num_sums
+        Totals.add(self, gid, values[:num_sums], recs)
+        weight = recs                   # il peso di --topk: il primo campo -f, o i record
+        if num_sums: weight = values[0]
+        columns = self.columns
+        for i in xrange(num_sums, len(values)):
+            columns[i][gid].add(values[i], weight)
+
+def distinct_header():
+    """le diciture delle colonne delle stime: dist1 (e top1, con --topk)..."""
+    header = []
+    for i in range(len(param_distinct)):
+        header += ['dist%d' % (i+1)] + (opt_topk and ['top%d' % (i+1)] or [])
+    return header
+
+def distinct_cells(sketches):
+    """le celle stampate delle stime: il numero dei valori distinti e, con --topk, i valori
+       piu' frequenti (valore=peso, separati da spazi)"""
+    cells = []
+    for sketch in sketches:
+        cells.append(sketch.estimate())
+        if not opt_topk: continue
+        top = []
+        for (item, count) in sketch.top_items():
+            if opt_ebcdic: item = item.translate(cobolnum.ebcdic2ascii)
+            if param_sums and opt_cents:
+                top.append('%s=%.2f' % (item.strip(), count / 100.0))
+            else:
+                top.append('%s=%d' % (item.strip(), count))
+        cells.append(' '.join(top))
+    return cells
+
+
+def aggregate_lines(fileinp, totals):
+    """carica in totals i record a larghezza fissa letti riga per riga"""
+    get_id = totals.ids.get
+    span = totals.span_keys and key_span()
+    if span: k1, k2 = span
+    accept = where_filter()
+    for line in fileinp:
+        if accept and not accept(line, 0): continue
+        # la chiave compatta del gruppo (Totals.pack)
+        if span:
+            raw=line[k1:k2]
+        else:
+            raw=join_keys([line[p1:p2] for (p1,p2) in param_keys])
+        values=[decode(line[p1:p2]) for (p1,p2,decode) in sum_fields]
+        gid=get_id(raw)
+        if gid is None:             # nuovo gruppo
+            if len(totals) >= max_groups: spill_totals(totals)
+            gid=totals.new_group(raw)
+        totals.add(gid, values)     # caricamento dei totali e di tot_rec
+
+def iter_records(fileinp):
+    """record di opt_reclen byte (senza fine riga), letti a blocchi"""
+    size = max(1, numpy_block_size // opt_reclen) * opt_reclen
+    while 1:
+        data = fileinp.read(size)
+        if not data: return
+        for pos in xrange(0, len(data), opt_reclen):
+            yield data[pos:pos+opt_reclen]
 
-def runfile(fileinp):
 
-    # crea un dictionary con valore di default [0,0...max_sums,tot_rec]
-    num_values = len(param_sums) + 1
-    totals = defaultdict(lambda: [0]*num_values)
+#####################################
+# motore vettoriale (--numpy)
+#
+# I record a larghezza fissa vengono letti a blocchi e visti come una matrice
+# numpy (un record per riga); i campi -k e -f sono colonne della matrice.
+# I valori zoned vengono decodificati in blocco (cobolnum.decode_zoned_matrix), le chiavi
+# numerate senza ordinare i record (numpy_group_keys) e le somme ridotte con numpy.bincount:
+# in Python resta solo un passo per gruppo di ogni blocco.
+#
+numpy_block_size = 8*1024*1024     # dimensione (in byte) dei blocchi letti
+numpy_max_codes = 1 << 22          # combinazioni dei byte delle chiavi numerate senza ordinare
+
+def numpy_group_keys(numpy, block, reclen):
+    """raggruppa i record per chiave: restituisce i byte delle chiavi dei gruppi (una riga
+       per gruppo, i campi -k uno dopo l'altro) e per ogni record l'indice del suo gruppo"""
+    n = block.shape[0]
+    keycols = [block[:, p1:p2] for (p1, p2) in param_keys if p1 < min(p2, reclen)]
+    if not keycols:
+        return numpy.zeros((1, 0), dtype=numpy.uint8), numpy.zeros(n, dtype=numpy.intp)
+    keys = numpy.hstack(keycols)
+
+    # ogni colonna di byte viene numerata con i soli byte presenti (bincount sui 256 valori)
+    # e i numeri combinati in un unico codice: se le combinazioni sono poche, i gruppi sono
+    # i codici presenti, senza ordinare i record
+    code, card, alphabets = numpy.zeros(n, dtype=numpy.intp), 1, []
+    for c in range(keys.shape[1]):
+        col = keys[:, c]
+        present = numpy.bincount(col, minlength=256) > 0
+        alphabet = numpy.flatnonzero(present)
+        card *= len(alphabet)
+        if card > max(n, numpy_max_codes):
+            return numpy_sort_keys(numpy, keys)
+        code = code * len(alphabet) + (numpy.cumsum(present) - 1)[col]
+        alphabets.append(alphabet)
+    used = numpy.flatnonzero(numpy.bincount(code, minlength=card))
+    lookup = numpy.empty(card, dtype=numpy.intp)
+    lookup[used] = numpy.arange(len(used))
+
+    # i byte delle chiavi dei gruppi, dai codici
+    group_keys = numpy.empty((len(used), keys.shape[1]), dtype=numpy.uint8)
+    rest = used.copy()
+    for c in range(keys.shape[1] - 1, -1, -1):
+        group_keys[:, c] = alphabets[c][rest % len(alphabets[c])]
+        rest //= len(alphabets[c])
+    return group_keys, lookup[code]
+
+def numpy_sort_keys(numpy, keys):
+    """numpy_group_keys con molte combinazioni: i gruppi vengono trovati ordinando le chiavi
+       (numpy.unique sui byte letti come interi a 64 bit)"""
+    n = keys.shape[0]
+    width = keys.shape[1]
+    words = numpy.zeros((n, (width+7)//8*8), dtype=numpy.uint8)
+    words[:, :width] = keys
+    words = words.view('>u8')
+    if words.shape[1] == 1:
+        uniq, first, inv = numpy.unique(words[:, 0], return_index=True, return_inverse=True)
+        return keys[first], inv
+
+    code, card = numpy.zeros(n, dtype=numpy.int64), 1
+    for w in range(words.shape[1]):
+        uniq, inv = numpy.unique(words[:, w], return_inverse=True)
+        card *= len(uniq)
+        if card >= 2**63:
+            # troppe combinazioni per un int64: si confrontano direttamente i byte
+            keyarr = numpy.ascontiguousarray(words).view(numpy.dtype((numpy.void, words.shape[1]*8))).ravel()
+            uniq, first, inv = numpy.unique(keyarr, return_index=True, return_inverse=True)
+            return keys[first], inv
+        code = code * len(uniq) + inv
+    uniq, first, inv = numpy.unique(code, return_index=True, return_inverse=True)
+    return keys[first], inv
+
+def numpy_decode(numpy, col, type, tables):
+    """valori di una colonna di campi del tipo indicato (z, p, b)"""
+    if type == "p":
+        return cobolnum.decode_packed_matrix(numpy, col)
+    elif type == "b":
+        return cobolnum.decode_binary_matrix(numpy, col)
+    elif opt_ebcdic:
+        return cobolnum.decode_zoned_ebcdic_matrix(numpy, col)
+    else:
+        return cobolnum.decode_zoned_matrix(numpy, col, tables)
+
+def numpy_where_mask(numpy, block, reclen, tables):
+    """i record del blocco che soddisfano le condizioni --where (array di bool)"""
+    mask = numpy.ones(block.shape[0], dtype=bool)
+    for ((p1, p2), kind, values, test) in where_fields:
+        col = block[:, p1:min(p2, reclen)]
+        if kind == 'range':
+            (lo, hi, type) = values
+            decoded = numpy_decode(numpy, col, type, tables)
+            mask &= (decoded >= lo) & (decoded <= hi)
+            continue
+        match = numpy.zeros(block.shape[0], dtype=bool)
+        for val in values:
+            if kind == 'prefix' and len(val) <= col.shape[1]:
+                match |= (col[:, :len(val)] == numpy.frombuffer(val, dtype=numpy.uint8)).all(axis=1)
+            elif len(val) == col.shape[1]:
+                match |= (col == numpy.frombuffer(val, dtype=numpy.uint8)).all(axis=1)
+        mask &= match
+    return mask
+
+def numpy_group_sums(numpy, inv, counts, columns):
+    """le somme per gruppo delle colonne di valori (inv: per ogni record, l'indice del suo
+       gruppo; counts: il numero dei record di ogni gruppo)"""
+    sums, order = [], None
+    n = len(inv)
+    for values in columns:
+        if values.dtype != object and (not len(values) or int(numpy.abs(values).max()) * n < 2**53):
+            # somme esatte anche in virgola mobile (interi sotto 2**53)
+            sums.append(numpy.bincount(inv, weights=values, minlength=len(counts)).astype(numpy.int64))
+        else:
+            if order is None:
+                order = numpy.argsort(inv, kind='mergesort')
+            sums.append(numpy.add.reduceat(values.astype(object)[order], numpy.cumsum(counts) - counts))
+    return sums
+
+def numpy_aggregate_block(numpy, data, reclen, totals, tables):
+    """aggrega in totals i record completi contenuti in data"""
+    n = len(data) // reclen
+    block = numpy.frombuffer(data, dtype=numpy.uint8, count=n*reclen).reshape(n, reclen)
+    rows = None                        # con --where, gli indici dei record scelti
+    if where_fields:
+        rows = numpy.flatnonzero(numpy_where_mask(numpy, block, reclen, tables))
+        if not len(rows): return
+        block = block[rows]
+    group_keys, inv = numpy_group_keys(numpy, block, reclen)
+    counts = numpy.bincount(inv, minlength=len(group_keys))
+    decode = stats and stats_numpy_decode or numpy_decode
+    sums = numpy_group_sums(numpy, inv, counts, (decode(numpy, block[:, p1:min(p2, reclen)], type, tables)
+                                                 for ((p1, p2), type) in zip(param_sums, sum_types)))
+
+    # i campi -k nelle righe di group_keys
+    spans, pos = [], 0
+    for (p1, p2) in param_keys:
+        width = max(0, min(p2, reclen) - p1)
+        spans.append((pos, pos + width))
+        pos += width
+    raw = group_keys.tostring()
+    for g in range(len(group_keys)):
+        off = g * pos
+        keys = tuple([raw[off+k1:off+k2] for (k1, k2) in spans])
+        totals.add(totals.group(keys), [int(s[g]) for s in sums], int(counts[g]))
+
+def aggregate_numpy(fileinp, totals):
+    """carica in totals i record a larghezza fissa, a blocchi, con numpy.
+       La lunghezza del record e' opt_reclen oppure, se i record sono separati dal fine riga,
+       quella della prima riga (compreso il fine riga): se il file ha righe di lunghezza
+       diversa si prosegue riga per riga"""
+    try:
+        import numpy
+    except ImportError:
+        usage(1, "usage: --numpy: il modulo numpy non e' disponibile.")
+
+    if opt_reclen:
+        first = ''
+        reclen = opt_reclen
+    else:
+        first = fileinp.readline()
+        if not first.endswith('\n'):                   # file vuoto o con una sola riga
+            aggregate_lines(StringIO(first), totals)
+            return
+        reclen = len(first)
+    block_size = max(1, numpy_block_size // reclen) * reclen
+    tables = cobolnum.zoned_tables(numpy)
+
+    data = first + fileinp.read(block_size - len(first))
+    while len(data) >= reclen:
+        n = len(data) // reclen
+        ends = numpy.frombuffer(data, dtype=numpy.uint8, count=n*reclen)[reclen-1::reclen]
+        if not opt_reclen and not (ends == 10).all():
+            # record di lunghezza variabile: il resto del file viene letto riga per riga
+            aggregate_lines(StringIO(data + fileinp.readline()), totals)
+            aggregate_lines(fileinp, totals)
+            return
+        numpy_aggregate_block(numpy, data, reclen, totals, tables)
+        if len(totals) > max_groups: spill_totals(totals)
+        data = data[n*reclen:] + fileinp.read(block_size)
+
+    # l'eventuale ultimo record incompleto (o senza fine riga)
+    if data:
+        aggregate_lines([data], totals)
+
+
+#####################################
+# lettura dei file regolari tramite mmap
+#
+# Le righe non vengono copiate: i campi -k e -f vengono letti direttamente dal file
+# mappato in memoria. Quando i campi -k sono contigui, la ricerca del gruppo usa un'unica
+# stringa con tutti i byte della chiave, e la tuple delle chiavi viene creata solo
+# alla prima occorrenza del gruppo.
+#
+def key_span(keys=None):
+    """(pos1, pos2) dei byte occupati dalle chiavi, se i campi -k (o keys) sono contigui,
+       altrimenti None"""
+    if keys is None: keys = param_keys
+    if not keys: return None
+    fields = sorted(keys)
+    for i in range(1, len(fields)):
+        if fields[i][0] != fields[i-1][1]: return None
+    return fields[0][0], fields[-1][1]
+
+def aggregate_mmap(mm, start, end, totals):
+    """carica in totals le righe a larghezza fissa comprese tra i byte start ed end"""
+    get_id = totals.ids.get
+    find = mm.find
+    span = totals.span_keys and key_span()
+    if span: k1, k2 = span
+    min_len = max([p2 for (p1, p2) in param_keys + [(p1, p2) for (p1, p2, decode) in sum_fields] + [field for (field, kind, values, test) in where_fields]] + [0])
+    accept = where_filter()
+    prefilter = where_regex()
+    if prefilter:
+        match_line, search_next = prefilter[0].match, prefilter[1].search
+
+    pos = start
+    while pos < end:
+        if prefilter and not match_line(mm, pos, end):
+            # la prossima riga che puo' soddisfare le condizioni --where
+            match = search_next(mm, pos, end)
+            if match is None: break
+            pos = match.start() + 1
+        if opt_reclen:
+            next = min(pos + opt_reclen, end)
+        else:
+            next = find('\n', pos, end) + 1
+            if not next: next = end
+        if next - pos < min_len:
+            # riga corta: i campi vengono troncati al fine riga, come in aggregate_lines
+            aggregate_lines([mm[pos:next]], totals)
+            pos = next
+            continue
+        if accept and not accept(mm, pos):
+            pos = next
+            continue
+
+        # la chiave compatta del gruppo (Totals.pack), come in aggregate_lines
+        if span:
+            raw = mm[pos+k1:pos+k2]
+        else:
+            raw = join_keys([mm[pos+p1:pos+p2] for (p1,p2) in param_keys])
+        gid = get_id(raw)
+        if gid is None:
+            if len(totals) >= max_groups: spill_totals(totals)
+            gid = totals.new_group(raw)
+        # caricamento dei totali e di tot_rec
+        totals.add(gid, [decode(mm[pos+p1:pos+p2]) for (p1,p2,decode) in sum_fields])
+        pos = next
+
+mmap_window = 32*1024*1024         # byte mappati in memoria per volta
+
+def aggregate_file(filename, start, end, totals):
+    """carica in totals i byte [start, end) di un file regolare.
+       Il file viene mappato a finestre di mmap_window byte, che terminano su un fine riga
+       (o su un fine record, con --reclen)"""
+    if opt_numpy or opt_input_csv or end <= start:
+        aggregate(FileRange(filename, start, end), totals)
+        return
+    import mmap
+    fileinp = open(filename, 'rb')
+    size = os.fstat(fileinp.fileno()).st_size
+    window = mmap_window
+    progress = opt_progress and Progress(filename, end - start)
+    pos = start
+    while pos < end:
+        offset = pos - pos % mmap.ALLOCATIONGRANULARITY
+        length = min(window, size - offset)
+        mm = mmap.mmap(fileinp.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+        if offset + length >= end:
+            stop = end - offset
+        elif opt_reclen:
+            stop = pos - offset + (offset + length - pos) // opt_reclen * opt_reclen
+        else:
+            stop = mm.rfind('\n', pos - offset, length) + 1
+        if stop > pos - offset:
+            aggregate_mmap(mm, pos - offset, stop, totals)
+            pos = offset + stop
+        else:
+            window *= 2                 # la riga non entra nella finestra
+        mm.close()
+        if progress: progress.update(pos - start)
+    fileinp.close()
+    if stats: stats.bytes += end - start
+
+
+#####################################
+# file compressi (gzip, bzip2, xz)
+#
+# Il formato viene riconosciuto dai primi byte del file (anche dello standard input, di cui
+# i primi byte letti vengono poi restituiti da PeekedInput). Il file viene decompresso in
+# un processo figlio, che scrive i dati in una pipe; il processo principale legge la
+# pipe come un file normale e intanto elabora i blocchi gia' decompressi, per cui i due
+# lavori si sovrappongono invece di sommarsi. La pipe fa da coda limitata: quando e'
+# piena (decompress_pipe_size byte) il figlio si ferma.
+# (un thread non basta: con Python 2 il thread di decompressione e il ciclo di
+# elaborazione si contendono il GIL, e il totale e' piu' lento della lettura sequenziale)
+#
+compressed_formats = [('\x1f\x8b', 'gz'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz')]
+decompress_read_size = 1024*1024
+decompress_pipe_size = 1024*1024
+
+def new_decompressor(format):
+    """il decompressore di un flusso del formato indicato (None: xz senza il modulo lzma)"""
+    if format == 'gz':
+        import zlib
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)     # con l'header gzip
+    if format == 'bz2':
+        import bz2
+        return bz2.BZ2Decompressor()
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            return None
+    return lzma.LZMADecompressor()
+
+def stream_ended(decompressor):
+    """il flusso compresso e' arrivato alla fine (il file non e' troncato)"""
+    if hasattr(decompressor, 'eof'):
+        return decompressor.eof
+    # zlib e bz2 (Python 2): dopo la fine del flusso un altro byte finisce in unused_data
+    # (bz2: EOFError), altrimenti viene consumato come parte del flusso
+    try:
+        decompressor.decompress('\x00')
+    except EOFError:
+        return True
+    except Exception:
+        return False
+    return decompressor.unused_data != ''
+
+def decompress_file(fileinp, format, out, data=''):
+    """decomprime il file aperto fileinp, dopo i byte data gia' letti (anche piu' flussi
+       concatenati, come gzip -c a b > ab.gz), in out"""
+    decompressor = new_decompressor(format)
+    while 1:
+        data = data or fileinp.read(decompress_read_size)
+        if not data: break
+        while data:
+            out.write(decompressor.decompress(data))
+            data = decompressor.unused_data
+            if data:
+                decompressor = new_decompressor(format)
+    if not stream_ended(decompressor):
+        raise EOFError("il file compresso e' incompleto")
+
+class DecompressedFile(object):
+    """file compresso, in lettura: read, readline e le righe (for line in ...), come un file.
+       I dati arrivano da un processo figlio che decomprime il file (lo standard input, se
+       ne sono indicati i primi byte head, gia' letti)"""
+
+    compressed = 1
+
+    def __init__(self, filename, format, head=None):
+        self.name = filename
+        r, w = os.pipe()
+        try:                            # una pipe piu' grande (Linux: F_SETPIPE_SZ)
+            import fcntl
+            fcntl.fcntl(w, 1031, decompress_pipe_size)
+        except (ImportError, IOError):
+            pass
+        self.pid = os.fork()
+        if self.pid == 0:
+            os.close(r)
+            self.child(filename, format, w, head)
+        os.close(w)
+        self.pipe = os.fdopen(r, 'rb', decompress_read_size)
+
+    def child(self, filename, format, fd, head):
+        """eseguita nel processo figlio: scrive il file decompresso nella pipe fd"""
+        try:
+            if format == 'xz' and new_decompressor(format) is None:
+                os.dup2(fd, 1)          # xz senza il modulo lzma: il comando xz
+                try:
+                    if head is None:
+                        os.execvp('xz', ['xz', '-dc', filename])
+                    xz_stdin(head)
+                except OSError, err:
+                    raise IOError("per i file xz serve il modulo lzma oppure il comando xz (%s)" % err)
+            out = os.fdopen(fd, 'wb', decompress_read_size)
+            if head is None:
+                decompress_file(open(filename, 'rb'), format, out)
+            else:
+                decompress_file(sys.stdin, format, out, head)
+            out.close()
+        except Exception, err:
+            if getattr(err, 'errno', None) != 32:       # EPIPE: il processo principale e' gia' terminato
+                sys.stderr.write("%s: %s\n" % (filename, err))
+            os._exit(1)
+        os._exit(0)
+
+    def check(self):
+        """alla fine dei dati: verifica che la decompressione sia terminata senza errori"""
+        if self.pid and os.waitpid(self.pid, 0)[1]:
+            usage(1, "usage: %s: errore nella decompressione." % self.name)
+        self.pid = 0
+
+    def read(self, size=-1):
+        data = self.pipe.read(size)
+        if size < 0 or len(data) < size:
+            self.check()
+        return data
+
+    def readline(self):
+        line = self.pipe.readline()
+        if not line.endswith('\n'):
+            self.check()
+        return line
+
+    def __iter__(self):
+        for line in self.pipe:
+            yield line
+        self.check()
+
+    def close(self):
+        self.pipe.close()
+        if self.pid:                    # dati non letti fino alla fine: il figlio termina (EPIPE)
+            os.waitpid(self.pid, 0)
+            self.pid = 0
+
+def xz_stdin(head):
+    """nel processo figlio, senza il modulo lzma: lo standard input (dopo i byte head, gia'
+       letti) viene passato al comando xz, che lo decomprime nello standard output"""
+    import subprocess
+    proc = subprocess.Popen(['xz', '-dc'], stdin=subprocess.PIPE)
+    data = head
+    while data:
+        proc.stdin.write(data)
+        data = sys.stdin.read(decompress_read_size)
+    proc.stdin.close()
+    os._exit(proc.wait() and 1 or 0)
+
+class PeekedInput(object):
+    """lo standard input, di cui sono gia' stati letti i primi byte (head): read, readline e le
+       righe (for line in ...) restituiscono prima quelli"""
+
+    name = '-'
+
+    def __init__(self, head):
+        self.head = head
+
+    def read(self, size=-1):
+        head = self.head
+        if size < 0:
+            self.head = ''
+            return head + sys.stdin.read()
+        self.head = head[size:]
+        return head[:size] + sys.stdin.read(max(0, size - len(head)))
+
+    def readline(self):
+        head = self.head
+        end = head.find('\n') + 1
+        if end:
+            self.head = head[end:]
+            return head[:end]
+        self.head = ''
+        return head + sys.stdin.readline()
+
+    def __iter__(self):
+        lines = []                      # le righe che iniziano nei byte gia' letti
+        while self.head:
+            lines.append(self.readline())
+        return chain(lines, sys.stdin)
+
+    def close(self):
+        pass
+
+def open_stdin():
+    """lo standard input: se i primi byte sono quelli di un file compresso, viene decompresso
+       da un processo figlio (DecompressedFile), come i file"""
+    head = sys.stdin.read(6)
+    for (prefix, format) in compressed_formats:
+        if head.startswith(prefix):
+            return DecompressedFile('-', format, head)
+    return PeekedInput(head)
+
+def open_input(filename):
+    """apre il file di input: i file compressi vengono decompressi da un processo figlio (DecompressedFile)"""
+    fileinp = open(filename)
+    if os.path.isfile(filename):
+        magic = fileinp.read(6)
+        for (prefix, format) in compressed_formats:
+            if magic.startswith(prefix):
+                fileinp.close()
+                return DecompressedFile(filename, format)
+        fileinp.seek(0)
+    return fileinp
+
+def regular_file(fileinp):
+    """il file di input e' un file regolare, non compresso (si puo' leggere a intervalli di byte)"""
+    return (fileinp is not sys.stdin and not isinstance(fileinp, PeekedInput) and not getattr(fileinp, 'compressed', 0)
+            and os.path.isfile(fileinp.name))
+
+
+#####################################
+# elaborazione parallela (--jobs)
+#
+# Il file viene diviso in intervalli di byte che iniziano e finiscono su un fine riga;
+# ogni intervallo viene aggregato da un processo in un dictionary parziale, e i
+# parziali vengono sommati dal processo principale.
+# Un file csv viene diviso solo se non contiene virgolette (csv_quoted, una ricerca
+# veloce sui byte): un campo tra virgolette puo' contenere dei fine riga, e dove inizia
+# un record dipende da tutte le righe precedenti; altrimenti viene letto da un solo processo.
+#
+class FileRange(object):
+    """file aperto in lettura, limitato ai byte [start, end)"""
+
+    def __init__(self, filename, start, end):
+        self.fileinp = open(filename, 'rb')
+        self.fileinp.seek(start)
+        self.name = filename
+        self.size = self.left = end - start
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left: size = self.left
+        data = self.fileinp.read(size)
+        self.left -= len(data)
+        return data
+
+    def readline(self):
+        if self.left <= 0: return ''
+        line = self.fileinp.readline(self.left)
+        self.left -= len(line)
+        return line
+
+    def __iter__(self):
+        while 1:
+            data = self.read(numpy_block_size)
+            if not data: return
+            if not data.endswith('\n'):
+                data += self.readline()
+            for line in StringIO(data):
+                yield line
+
+def csv_quoted(filename, start, end):
+    """i byte [start, end) del file csv contengono delle virgolette: un fine riga potrebbe
+       essere dentro un campo tra virgolette, invece che alla fine di un record"""
+    fileinp = open(filename, 'rb')
+    fileinp.seek(start)
+    left = end - start
+    while left > 0:
+        data = fileinp.read(min(left, numpy_block_size))
+        if not data: break
+        if '"' in data:
+            fileinp.close()
+            return True
+        left -= len(data)
+    fileinp.close()
+    return False
+
+def split_file(filename, start, end, parts):
+    """divide i byte [start, end) del file in (al massimo) parts intervalli, allineati
+       ai fine riga (o ai record, con --reclen). Un file csv con le virgolette non viene
+       diviso: solo leggendolo dall'inizio si sa quali fine riga chiudono un record"""
+    if opt_input_csv and csv_quoted(filename, start, end):
+        return [(start, end)]
+    fileinp = open(filename, 'rb')
+    bounds = [start]
+    for i in range(1, parts):
+        pos = start + (end - start) * i // parts
+        if opt_reclen:
+            pos -= (pos - start) % opt_reclen
+        if pos <= bounds[-1]: continue
+        if not opt_reclen:
+            fileinp.seek(pos - 1)
+            fileinp.readline()          # l'intervallo inizia sulla riga successiva
+            pos = fileinp.tell()
+        if pos >= end: break
+        if pos > bounds[-1]: bounds.append(pos)
+    fileinp.close()
+    bounds.append(end)
+    return zip(bounds[:-1], bounds[1:])
+
+def aggregate_range(args):
+    """eseguita nei processi figli: restituisce i totali parziali di un intervallo
+       (con --report, la lista dei totali parziali di ogni report)"""
+    filename, start, end = args
+    if reports:
+        totals = new_report_totals()
+        aggregate_reports(FileRange(filename, start, end), totals)
+        return totals
+    totals = new_totals()
+    aggregate_file(filename, start, end, totals)
+    return totals
+
+def merge_partial(totals, partial, prefix=()):
+    """somma in totals i totali parziali di un processo (con --report, report per report)"""
+    if reports:
+        for (report_totals, report_partial) in zip(totals, partial):
+            report_totals.merge(report_partial, prefix)
+    else:
+        totals.merge(partial, prefix)
+
+def aggregate_parallel(filename, start, end, totals):
+    import multiprocessing
+    pool = multiprocessing.Pool(opt_jobs, pool_init)
+    ranges = [(filename, p1, p2) for (p1, p2) in split_file(filename, start, end, opt_jobs)]
+    progress = opt_progress and Progress(filename, end - start)
+    for ((filename, p1, p2), partial, counts) in pool.imap_unordered(pool_task, [(aggregate_range, r) for r in ranges]):
+        merge_partial(totals, partial)
+        part_done(progress, p2 - p1, partial, counts)
+    pool.close()
+    pool.join()
+    # nel caso di opt_range, i valori min e max vengono calcolati da massage_data_with_range
+    # sui totali complessivi, per cui non c'e' altro da combinare
+
 
+#####################################
+# piu' file di input (file ..., pattern glob)
+#
+# I totali di tutti i file vengono stampati in un unico report. Con -j N i file vengono
+# distribuiti a un pool di N processi, un file per volta: ogni processo restituisce i
+# totali parziali del suo file, che vengono sommati dal processo principale.
+# Con --per-file il nome del file diventa la prima chiave dei gruppi (una colonna in piu').
+#
+def expand_args(args):
+    """i file di input della riga di comando, con i pattern glob espansi (in ordine alfabetico)"""
+    import glob
+    filenames = []
+    for arg in args:
+        if glob.has_magic(arg):
+            matches = sorted(glob.glob(arg))
+            if not matches:
+                usage(1, "usage: nessun file corrisponde a '%s'." % arg)
+            filenames.extend(matches)
+        else:
+            filenames.append(arg)
+    return filenames
+
+def aggregate_path(filename, totals=None):
+    """i totali di un file (con --report, la lista dei totali di ogni report), anche compresso.
+       Eseguita nei processi del pool: un errore (usage) restituisce None al posto dei totali"""
+    if totals is None:
+        totals = reports and new_report_totals() or new_totals()
+    try:
+        fileinp = open_input(filename)
+        if reports:
+            aggregate_reports(fileinp, totals)
+        elif regular_file(fileinp):
+            aggregate_file(filename, 0, os.path.getsize(filename), totals)
+        else:
+            aggregate(fileinp, totals)
+        fileinp.close()
+    except SystemExit:              # il messaggio e' gia' stato scritto da usage
+        return filename, None
+    return filename, totals
+
+def aggregate_files(filenames, totals):
+    """carica in totals (con --report, la lista dei totali dei report) i totali di tutti i file"""
+    if opt_jobs == 1 and not opt_per_file:
+        for filename in filenames:  # direttamente nei totali complessivi (anche con --max_mem)
+            if aggregate_path(filename, totals)[1] is None: sys.exit(1)
+        return
+
+    pool, progress = None, None
+    if opt_jobs > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(opt_jobs, len(filenames)), pool_init)
+        partials = pool.imap_unordered(pool_task, [(aggregate_path, filename) for filename in filenames])
+        if opt_progress:
+            progress = Progress("%d file" % len(filenames), sum(map(os.path.getsize, filenames)))
+    else:
+        partials = ((filename, aggregate_path(filename), None) for filename in filenames)
+    for (arg, (filename, partial), counts) in partials:
+        if partial is None:
+            if pool: pool.terminate()
+            sys.exit(1)
+        prefix = ()
+        if opt_per_file:            # le chiavi restano come sono lette dal file (EBCDIC)
+            prefix = (opt_ebcdic and filename.translate(cobolnum.ascii2ebcdic) or filename,)
+        merge_partial(totals, partial, prefix)
+        part_done(progress, progress and os.path.getsize(filename), partial, counts)
+    if pool:
+        pool.close()
+        pool.join()
+
+def runfiles(filenames):
+    """elabora piu' file di input (o uno solo, con --per-file) e ne stampa i totali complessivi"""
+    if not filenames:
+        usage(1, "usage: --per-file: mancano i file di input.")
+    if opt_sorted or opt_state:
+        usage(1, "usage: --sorted e --state ammettono un solo file di input.")
+    if opt_max_mem and opt_per_file:
+        usage(1, "usage: --max_mem e --per-file incompatibili.")
+    for filename in filenames:
+        if not os.path.exists(filename):
+            usage(1, "usage: il file '%s' non esiste." % filename)
+
+    if stats: stats.begin('aggregate')
+    if reports:
+        open_reports()
+        totals_list = new_report_totals()
+        aggregate_files(filenames, totals_list)
+        print_reports(totals_list)
+        return
+    totals = new_totals(keyed=not opt_per_file)
+    aggregate_files(filenames, totals)
+    if opt_ebcdic:
+        ebcdic_keys(totals)
+    if stats: stats.add_totals(totals)
+    print_totals(totals)
+
+
+#####################################
+# aggregazione a memoria limitata (--max_mem)
+#
+# Quando i gruppi in memoria raggiungono max_groups, vengono ordinati e scaricati su disco
+# in un file temporaneo (run). Alla fine i run e i gruppi rimasti in memoria vengono fusi
+# con heapq.merge, sommando i gruppi con la stessa chiave, e le righe vengono stampate
+# man mano: la memoria occupata non dipende dal numero delle chiavi.
+# (solo tabelle non pivot, ordinate come in massage_data_no_range: -P e -R raggruppano di
+# nuovo i gruppi senza la chiave di pivot, in un ordine diverso da quello dei run; e con
+# -j i processi restituiscono i loro totali parziali in memoria al processo principale)
+# I run vengono cancellati alla fine dell'esecuzione (remove_spilled, chiamata da main),
+# anche quando termina con un errore o con Ctrl-C.
+#
+max_groups = sys.maxint            # numero massimo di gruppi in memoria
+spill_files = []                   # i run scaricati su disco
+
+def group_size():
+    """stima dell'occupazione in memoria (in byte) di un gruppo di totals"""
     if opt_input_csv:
-        import csv
-        reader = csv.reader(fileinp, delimiter=delim)
-        for row in reader:
-            # keys e' una tuple di valori
-            keys=tuple([row[i] for i in param_keys])
-            values=[check_numeric_values(row[i]) for i in param_sums]
-            i=0
-            for i, val in values:          # caricamento dei totali 
-                totals[keys][i]+=val
-                i+=1
-            # tot_rec
-            totals[keys][-1]+=1
+        keys = [' '*16 for i in param_keys]
     else:
-        for line in fileinp:
-            # keys e' una tuple di valori
-            keys=tuple([line[p1:p2] for (p1,p2) in param_keys])
-            values=[check_numeric_values(line[p1:p2]) for (p1,p2) in param_sums]
-            i=0
-            for val in values:          # caricamento dei totali 
-                totals[keys][i]+=val
-                i+=1
-            # tot_rec
-            totals[keys][-1]+=1
+        keys = [' '*(p2-p1) for (p1,p2) in param_keys]
+    value = [0]*(len(param_sums)+1)
+    size = sys.getsizeof(join_keys(keys))  # la chiave compatta
+    size += 8*len(value) + 8       # un elemento per colonna, e la chiave in Totals.group_keys
+    size += 72 + 24                # la voce in Totals.ids (compreso lo spazio libero) e l'id
+    return size
+
+def spill_totals(totals):
+    """scarica su disco i totali, ordinati per chiave, e svuota totals"""
+    import marshal, tempfile
+    if opt_ebcdic:                 # l'ordinamento e' quello delle chiavi convertite
+        ebcdic_keys(totals)
+    items = list(totals.sorted_items())
+    fd, filename = tempfile.mkstemp(prefix='count_totals.', suffix='.run')
+    spill_files.append(filename)
+    out = os.fdopen(fd, 'wb', 1024*1024)
+    for item in items:
+        marshal.dump(item, out)
+    out.close()
+    totals.clear()
+
+def read_run(filename):
+    import marshal
+    fileinp = open(filename, 'rb', 64*1024)
+    while 1:
+        try:
+            yield marshal.load(fileinp)
+        except EOFError:
+            break
+    fileinp.close()
+
+def merge_spilled(totals):
+    """fonde i run scaricati su disco con i totali rimasti in memoria:
+       restituisce le coppie (key, value) ordinate per chiave"""
+    runs = [read_run(filename) for filename in spill_files]
+    runs.append(totals.sorted_items())
+    keys, value = None, None
+    for (k, v) in heapq.merge(*runs):
+        if k == keys:
+            for i in range(len(v)):
+                value[i] += v[i]
+        else:
+            if value is not None:
+                yield keys, value
+            keys, value = k, list(v)
+    if value is not None:
+        yield keys, value
+
+def print_totals_spilled(totals):
+    len_first_col = max(totals.key_width, len('total'))
+    header = header_no_range([0]*(len(param_sums)+1))
+    tot_gen = [0]*(len(header)-1)
+    items = merge_spilled(totals)
+    if stats:
+        stats.begin('merge_print')
+        items = stats.count_groups(items)
+    write_totals_no_range(header, rows_no_range(items, tot_gen), tot_gen, len_first_col)
 
-    if not totals: return
-    if opt_range:
-        print_totals_with_range(totals)
+def remove_spilled():
+    """cancella i run scaricati su disco (la lista resta, per --stats)"""
+    for filename in spill_files:
+        try:
+            os.remove(filename)
+        except OSError:            # gia' cancellato
+            pass
+
+
+#####################################
+# totali incrementali (--state)
+#
+# Nel file di stato vengono salvati (con marshal) i totali, il numero dei byte del file
+# gia' elaborati e un'impronta del file. Se il file e' cresciuto solo in coda, all'esecuzione
+# successiva i totali salvati vengono ricaricati e viene aggregata solo la parte nuova;
+# altrimenti il file viene riletto dall'inizio.
+# L'impronta costa poco anche per un file molto grande: dispositivo e inode, dimensione e
+# data di modifica del file, e l'md5 del primo blocco (fingerprint_block byte) e dell'ultimo
+# blocco della parte elaborata. Vengono riconosciuti un file sostituito da un altro (anche
+# con gli stessi byte iniziali: inode diverso), troncato, o riscritto all'inizio o alla fine
+# della parte elaborata; non lo e' invece una modifica in mezzo, che lascia uguali
+# dimensione e blocchi verificati (i log, a cui e' destinato --state, crescono solo in coda).
+# Un'ultima riga senza fine riga (o un record incompleto) viene aggregata nel report, ma
+# non nello stato: alla prossima esecuzione viene letta di nuovo, completa.
+# Le chiavi vengono salvate come sono lette dal file (prima della conversione EBCDIC).
+#
+state_version = 2
+fingerprint_block = 64*1024
+
+def state_params():
+    """i parametri da cui dipendono i totali: lo stato puo' essere riusato solo con gli stessi"""
+    return [param_keys, param_sums, sum_types, opt_input_csv and delim, opt_reclen, opt_ebcdic, opt_where]
+
+def file_fingerprint(filename, end):
+    """l'impronta dei byte [0, end) del file: (dispositivo, inode, dimensione, data di
+       modifica, end, md5 del primo e dell'ultimo blocco di [0, end))"""
+    stat = os.stat(filename)
+    fileinp = open(filename, 'rb')
+    head = md5(fileinp.read(min(end, fingerprint_block))).hexdigest()
+    fileinp.seek(max(0, end - fingerprint_block))
+    tail = md5(fileinp.read(end - max(0, end - fingerprint_block))).hexdigest()
+    fileinp.close()
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime, end, head, tail)
+
+def same_prefix(filename, fingerprint):
+    """vero se i byte dell'impronta sono ancora quelli del file: lo stesso file, non
+       troncato e non riportato indietro nel tempo, con gli stessi blocchi verificati"""
+    dev, ino, size, mtime, end, head, tail = fingerprint
+    stat = os.stat(filename)
+    if (stat.st_dev, stat.st_ino) != (dev, ino) or stat.st_size < size or stat.st_mtime < mtime:
+        return False
+    return file_fingerprint(filename, end)[-2:] == (head, tail)
+
+def records_end(filename, start):
+    """fine dell'ultimo record completo dopo start: gli eventuali byte successivi
+       (una riga senza fine riga) sono ancora in scrittura"""
+    size = os.path.getsize(filename)
+    if opt_reclen:
+        return start + (size - start) // opt_reclen * opt_reclen
+    if opt_input_csv and csv_quoted(filename, start, size):
+        return csv_records_end(filename, start, size)
+    fileinp = open(filename, 'rb')
+    end = size
+    while end > start:
+        pos = max(start, end - 64*1024)
+        fileinp.seek(pos)
+        i = fileinp.read(end - pos).rfind('\n')
+        if i >= 0:
+            end = pos + i + 1
+            break
+        end = pos
+    fileinp.close()
+    return end
+
+def csv_records_end(filename, start, end):
+    """records_end per un file csv con le virgolette, che viene letto dal modulo csv: un
+       fine riga dentro le virgolette non chiude il record. Un record che arriva alla fine
+       del file (senza fine riga, o con le virgolette ancora aperte) e' incompleto"""
+    import csv
+    pos, line, done = [start], [''], []
+    def lines():
+        for line[0] in FileRange(filename, start, end):
+            pos[0] += len(line[0])
+            yield line[0]
+        done.append(1)
+    last = start
+    for row in csv.reader(lines(), delimiter=delim):
+        if done or not line[0].endswith('\n'): break
+        last = pos[0]
+    return last
+
+def load_state(filename, totals):
+    """carica in totals i totali salvati in opt_state, se sono ancora validi per il file,
+       e restituisce il numero dei byte gia' elaborati (0 se il file va letto dall'inizio)"""
+    import marshal
+    if not os.path.exists(opt_state): return 0
+    try:
+        fileinp = open(opt_state, 'rb')
+        state = marshal.load(fileinp)
+        fileinp.close()
+    except (IOError, EOFError, ValueError, TypeError), err:
+        usage(1, "usage: --state: file di stato '%s' non leggibile (%s)." % (opt_state, err))
+    if isinstance(state, dict) and state.get('version') == 1:
+        # l'impronta era l'md5 di tutta la parte elaborata
+        sys.stderr.write("--state: file di stato di una versione precedente: il file viene riletto dall'inizio.\n")
+        return 0
+    if not isinstance(state, dict) or state.get('version') != state_version:
+        usage(1, "usage: --state: '%s' non e' un file di stato." % opt_state)
+    if state['params'] != state_params():
+        usage(1, "usage: --state: il file di stato e' stato creato con parametri diversi (-k, -f, --csv...).")
+
+    if not same_prefix(filename, state['fingerprint']):
+        sys.stderr.write("--state: il file e' stato riscritto o troncato: viene riletto dall'inizio.\n")
+        return 0
+    for (keys, value) in state['totals']:
+        totals.add(totals.group(keys), value[:-1], value[-1])
+    return state['offset']
+
+def save_state(filename, offset, totals):
+    """salva in opt_state i totali dei byte [0, offset) del file (scrittura atomica, con rename)"""
+    import marshal, tempfile
+    state = {'version': state_version, 'params': state_params(), 'offset': offset,
+             'fingerprint': file_fingerprint(filename, offset),
+             'totals': totals.items()}
+    fd, tmpname = tempfile.mkstemp(prefix='.count_totals.', dir=os.path.dirname(os.path.abspath(opt_state)))
+    out = os.fdopen(fd, 'wb')
+    marshal.dump(state, out)
+    out.close()
+    os.rename(tmpname, opt_state)
+
+
+#####################################
+# cache a colonne (--build-cache, --cache)
+#
+# --build-cache legge il file una volta e scrive nella directory della cache un file
+# binario (una colonna) per ogni campo -k e -f: le chiavi codificate con un dizionario
+# (i valori distinti vengono salvati in meta, e per ogni record un intero a 32 bit), i
+# valori gia' decodificati come interi a 64 bit. Con --cache vengono mappate in memoria
+# (numpy.memmap) solo le colonne dei campi richiesti, e i totali calcolati con numpy,
+# senza rileggere ne' decodificare il file.
+# Un campo -k puo' essere anche una parte di una chiave della cache (es. -k1.2 dalla
+# chiave 1.5): i valori del dizionario vengono tagliati e ricodificati.
+# La cache vale finche' il file non cambia (dimensione e data di modifica).
+#
+cache_version = 1
+cache_flush = 1024*1024            # record tenuti in memoria prima di essere scritti nelle colonne
+
+def cache_params():
+    """i parametri (oltre ai campi) da cui dipendono i record della cache"""
+    return [opt_input_csv and delim, opt_reclen, opt_ebcdic, opt_where]
+
+def cache_file(dirname, name):
+    return os.path.join(dirname, name)
+
+def cache_field(field):
+    """il campo come viene salvato in meta: (pos1, pos2), oppure col con --csv"""
+    if opt_input_csv:
+        return field
+    return tuple(field)
+
+def field_name(field, type=None):
+    """il campo come sulla riga di comando: pos.len[:tipo] (col con --csv)"""
+    if opt_input_csv:
+        return str(field + 1)
+    name = "%d.%d" % (field[0] + 1, field[1] - field[0])
+    if type and type != "z":
+        name += ":" + type
+    return name
+
+def build_cache(filename):
+    """--build-cache: scrive nella directory opt_build_cache le colonne dei campi -k e -f del file"""
+    import marshal
+    dirname = opt_build_cache
+    try:
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        if os.path.exists(cache_file(dirname, 'meta')):
+            os.remove(cache_file(dirname, 'meta'))  # la cache precedente non vale piu'
+        stat = os.stat(filename)        # prima della lettura: se il file cambia, la cache non vale
+        key_cols = [({}, array('i'), open(cache_file(dirname, 'key%d' % i), 'wb')) for i in range(len(param_keys))]
+        sum_cols = [(array('l'), open(cache_file(dirname, 'sum%d' % i), 'wb')) for i in range(len(param_sums))]
+    except (IOError, OSError), err:
+        usage(1, "usage: --build-cache: %s" % err)
+
+    records = 0
+    if stats: stats.begin('build_cache')
+    try:
+        for (keys, values) in record_fields(open_input(filename)):
+            for (key, (ids, codes, out)) in zip(keys, key_cols):
+                code = ids.get(key)
+                if code is None:
+                    code = ids[key] = len(ids)
+                codes.append(code)
+            for (value, (col, out)) in zip(values, sum_cols):
+                col.append(value)
+            records += 1
+            if not records % cache_flush:
+                for (col, out) in [c[1:] for c in key_cols] + sum_cols:
+                    col.tofile(out)
+                    del col[:]
+    except OverflowError:
+        usage(1, "usage: --build-cache: il record %d ha un valore oltre i 64 bit." % (records + 1))
+    for (col, out) in [c[1:] for c in key_cols] + sum_cols:
+        col.tofile(out)
+        out.close()
+
+    # meta viene scritto per ultimo: la cache e' valida solo se e' completa
+    if stats: stats.records = records
+    meta = {'version': cache_version, 'params': cache_params(), 'records': records,
+            'source': os.path.abspath(filename), 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'keys': [(cache_field(field), sorted(ids, key=ids.get))
+                     for (field, (ids, codes, out)) in zip(param_keys, key_cols)],
+            'sums': [(cache_field(field), type) for (field, type) in zip(param_sums, sum_types)]}
+    out = open(cache_file(dirname, 'meta'), 'wb')
+    marshal.dump(meta, out)
+    out.close()
+
+def load_cache():
+    """il contenuto del file meta della cache opt_cache"""
+    import marshal
+    try:
+        fileinp = open(cache_file(opt_cache, 'meta'), 'rb')
+        meta = marshal.load(fileinp)
+        fileinp.close()
+    except (IOError, EOFError, ValueError, TypeError), err:
+        usage(1, "usage: --cache: '%s' non e' una cache completa (%s)." % (opt_cache, err))
+    if not isinstance(meta, dict) or meta.get('version') != cache_version:
+        usage(1, "usage: --cache: '%s' non e' una cache." % opt_cache)
+    return meta
+
+def cache_key_column(meta, field):
+    """(indice, inizio del campo nella colonna) della colonna della cache che contiene
+       il campo -k field, oppure None"""
+    for (i, (cached, values)) in enumerate(meta['keys']):
+        if opt_input_csv:
+            if cached == field: return i, 0
+        elif cached[0] <= field[0] and field[1] <= cached[1]:
+            return i, field[0] - cached[0]
+    return None
+
+def aggregate_cache(meta, totals):
+    """carica in totals i totali calcolati con numpy dalle colonne della cache"""
+    try:
+        import numpy
+    except ImportError:
+        usage(1, "usage: --cache: il modulo numpy non e' disponibile.")
+    n = meta['records']
+    if not n: return
+
+    # i codici e i valori distinti di ogni campo -k
+    keycols = []
+    for field in param_keys:
+        i, offset = cache_key_column(meta, field)
+        cached, values = meta['keys'][i]
+        codes = numpy.memmap(cache_file(opt_cache, 'key%d' % i), dtype=numpy.int32, mode='r', shape=(n,))
+        if cache_field(field) != cached:
+            # una parte della chiave della cache: i valori vengono tagliati e ricodificati
+            part = [v[offset:offset + field[1] - field[0]] for v in values]
+            values = sorted(set(part))
+            index = dict([(v, j) for (j, v) in enumerate(values)])
+            codes = numpy.array([index[v] for v in part], dtype=numpy.int32)[codes]
+        keycols.append((codes, values))
+
+    # i codici dei campi vengono combinati in un unico codice per record
+    card = 1
+    for (codes, values) in keycols:
+        card *= len(values)
+    if card >= 2**63:
+        # troppe combinazioni per un int64: si confrontano direttamente i codici
+        keyarr = numpy.column_stack([codes for (codes, values) in keycols]).astype('>i4')
+        keyarr = numpy.ascontiguousarray(keyarr).view(numpy.dtype((numpy.void, 4*len(keycols)))).ravel()
+        uniq, first, inv = numpy.unique(keyarr, return_index=True, return_inverse=True)
+        counts = numpy.bincount(inv)
+        group_codes = [codes[first] for (codes, values) in keycols]
     else:
-        print_totals_no_range(totals)
+        code = numpy.zeros(n, dtype=numpy.int64)
+        for (codes, values) in keycols:
+            code = code * len(values) + codes
+        if card <= 2*n + 1024:
+            # codici densi: i gruppi vengono contati con bincount, senza ordinare i record
+            counts = numpy.bincount(code, minlength=card)
+            groups = numpy.flatnonzero(counts)
+            inv = numpy.zeros(card, dtype=numpy.intp)
+            inv[groups] = numpy.arange(len(groups))
+            inv, counts = inv[code], counts[groups]
+        else:
+            groups, inv = numpy.unique(code, return_inverse=True)
+            counts = numpy.bincount(inv)
+        # i codici dei campi, dal codice del gruppo
+        group_codes = []
+        for (codes, values) in reversed(keycols):
+            group_codes.insert(0, groups % len(values))
+            groups = groups // len(values)
+
+    columns = (numpy.memmap(cache_file(opt_cache, 'sum%d' % meta['sums'].index((cache_field(field), type))),
+                            dtype=numpy.int64, mode='r', shape=(n,)) for (field, type) in zip(param_sums, sum_types))
+    sums = [s.tolist() for s in numpy_group_sums(numpy, inv, counts, columns)]
+    group_codes = [c.tolist() for c in group_codes]
+    counts = counts.tolist()
+    for g in xrange(len(counts)):
+        keys = tuple([values[c[g]] for (c, (codes, values)) in zip(group_codes, keycols)])
+        totals.add(totals.group(keys), [s[g] for s in sums], counts[g])
+
+def run_cache(filenames):
+    """--cache: i totali calcolati dalla cache (dal file, se e' cambiato dopo --build-cache)"""
+    meta = load_cache()
+    if len(filenames) > 1:
+        usage(1, "usage: --cache: ci deve essere un solo file di input.")
+    filename = filenames and filenames[0] or meta['source']
+    if os.path.abspath(filename) != meta['source']:
+        usage(1, "usage: --cache: la cache e' stata creata dal file '%s'." % meta['source'])
+    if not os.path.exists(filename):
+        usage(1, "usage: il file '%s' non esiste." % filename)
+
+    stat = os.stat(filename)
+    if (stat.st_size, stat.st_mtime) != (meta['size'], meta['mtime']):
+        sys.stderr.write("--cache: il file e' cambiato dopo --build-cache: viene letto il file.\n")
+        runfile(open_input(filename))
+        return
+    if meta['params'] != cache_params():
+        usage(1, "usage: --cache: la cache e' stata creata con parametri diversi (--csv, --reclen, --ebcdic, -w...).")
+    missing = [field_name(field) for field in param_keys if cache_key_column(meta, field) is None]
+    missing += [field_name(field, type) for (field, type) in zip(param_sums, sum_types)
+                if (cache_field(field), type) not in meta['sums']]
+    if missing:
+        usage(1, "usage: --cache: campi non presenti nella cache: %s (-k %s -f %s)." % (','.join(missing),
+              ','.join([field_name(field) for (field, values) in meta['keys']]),
+              ','.join([field_name(field, type) for (field, type) in meta['sums']])))
+
+    if stats: stats.begin('aggregate')
+    totals = new_totals()
+    aggregate_cache(meta, totals)
+    if opt_ebcdic:
+        ebcdic_keys(totals)
+    if stats: stats.add_totals(totals)
+    print_totals(totals)
 
 
-def check_arguments():
-    global param_keys, param_sums, delim, opt_pivot, opt_input_csv, opt_output_csv, opt_output_delim, opt_cents
+#####################################
+# file csv (--csv, -d)
+#
+# Le righe vengono divise solo fino all'ultima colonna usata (-k, -f, -w, e quelle dei
+# report): le colonne successive restano, non divise, nell'ultimo elemento della lista.
+# Le righe senza virgolette vengono divise con str.split; quelle con le virgolette
+# vengono lette con il modulo csv, che segue le regole del formato (delimitatori e fine
+# riga all'interno dei campi tra virgolette, virgolette raddoppiate...).
+#
+csv_sample = 100                   # righe lette per decidere come dividere il file
+
+class PushbackLines(object):
+    """le righe di un iteratore, con la possibilita' di rimettere in testa una riga gia' letta"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.line = None
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.line
+        if line is None:
+            return self.lines.next()
+        self.line = None
+        return line
+
+def csv_columns():
+    """il numero delle colonne da dividere: fino all'ultima usata"""
+    cols = list(param_keys) + list(param_sums) + list(param_distinct) + [field for (field, kind, values, test) in where_fields]
+    for report in reports:
+        cols += report.values['param_keys'] + report.values['param_sums']
+    return max(cols + [-1]) + 1
+
+def csv_rows(fileinp):
+    """le righe del file csv, come liste dei campi fino all'ultima colonna usata
+       (le righe vuote vengono saltate)"""
+    import csv
+    maxsplit = max(csv_columns(), 1)
+    lines = iter(fileinp)
+    sample = list(islice(lines, csv_sample))
+    lines = chain(sample, lines)
+    if len([line for line in sample if '"' in line])*2 > len(sample):
+        # quasi tutte le righe hanno le virgolette: il file viene letto tutto dal modulo csv
+        for row in csv.reader(lines, delimiter=delim):
+            if row: yield row
+        return
 
-    # se viene passato il parametro --opt_output_delim, significa che l'output deve essere in formato .csv
+    # il modulo csv legge dallo stesso iteratore, solo quando viene rimessa una riga
+    pushback = PushbackLines(lines)
+    reader = csv.reader(pushback, delimiter=delim)
+    for line in lines:
+        if '"' in line:
+            # campi tra virgolette: la riga viene letta dal modulo csv (anche con le righe
+            # successive, se un campo contiene un fine riga)
+            pushback.line = line
+            row = reader.next()
+            if row: yield row
+            continue
+        row = line.split(delim, maxsplit)
+        if len(row) <= maxsplit:    # l'ultimo campo arriva al fine riga: toglie un solo fine riga
+            last = row[-1]
+            if last[-2:] == '\r\n':    last = last[:-2]
+            elif last[-1:] in '\r\n': last = last[:-1]
+            if not last and len(row) == 1: continue
+            row[-1] = last
+        yield row
+
+def aggregate_csv(fileinp, totals):
+    get_id = totals.ids.get
+    accept = where_filter()
+    decode = value_decoder("z")
+    distinct = param_distinct
+    for row in csv_rows(fileinp):
+        if accept and not accept(row): continue
+        # la chiave compatta del gruppo (Totals.pack)
+        raw=join_keys([row[i] for i in param_keys])
+        values=[decode(row[i]) for i in param_sums]
+        if distinct: values += [row[i] for i in distinct]   # i valori dei campi -u (SketchTotals)
+        gid=get_id(raw)
+        if gid is None:             # nuovo gruppo
+            if len(totals) >= max_groups: spill_totals(totals)
+            gid=totals.new_group(raw)
+        totals.add(gid, values)     # caricamento dei totali e di tot_rec
+
+def aggregate(fileinp, totals):
+    fileinp = metered(fileinp)
+    if opt_numpy:
+        aggregate_numpy(fileinp, totals)
+    elif opt_input_csv:
+        aggregate_csv(fileinp, totals)
+    elif opt_reclen:
+        aggregate_lines(iter_records(fileinp), totals)
+    else:
+        aggregate_lines(fileinp, totals)
+
+def ebcdic_keys(totals):
+    """converte in ASCII le chiavi lette da un file EBCDIC"""
+    totals.rename(lambda keys: tuple([k.translate(cobolnum.ebcdic2ascii) for k in keys]))
+
+
+#####################################
+# piu' report con una sola lettura del file (--report, --reports)
+#
+# Ogni report ha le sue opzioni -k, -f, -P e -R, che vengono controllate da check_params
+# come quelle della riga di comando, e i suoi totali. Ogni record viene letto una sola
+# volta: i campi usati dai report vengono estratti (e i valori decodificati) una volta
+# sola, e poi sommati nei totali di tutti i report. Per la stampa, i parametri del
+# report vengono reimpostati nelle variabili globali (Report.activate).
+#
+class Report(object):
+    """un report di --report: il file di output e i parametri da cui dipendono i totali"""
+
+    params = ('param_keys', 'param_sums', 'sum_types', 'sum_fields', 'opt_pivot', 'opt_range', 'opt_cents')
+
+    def __init__(self, spec, output):
+        self.spec = spec
+        self.output = output
+        self.values = dict([(name, globals()[name]) for name in self.params])
+        self.out = None
+
+    def activate(self):
+        """imposta i parametri del report nelle variabili globali"""
+        globals().update(self.values)
+
+    def open(self):
+        if self.output == '-':
+            self.out = sys.stdout
+        else:
+            self.out = open(self.output, 'w')
+
+def parse_report(spec, cents):
+    """--report: 'OUTPUT -k... -f... -P N -R' -> Report (cents e' il valore di -C)"""
+    global param_keys, param_sums, opt_pivot, opt_range, opt_cents
+    import shlex
+    try:
+        opts, args = getopt.gnu_getopt(shlex.split(spec), "RP:k:f:", ["pivot=", "range"])
+    except (getopt.error, ValueError), err:
+        usage(1, "usage: --report '%s': %s" % (spec, err))
+    if len(args) != 1:
+        usage(1, "usage: --report '%s': ci deve essere un solo file di output." % spec)
+    param_keys, param_sums, opt_pivot, opt_range, opt_cents = "", "", "", "", cents
+    for opt, optarg in opts:
+        if opt in ('-k'):
+            param_keys = optarg
+        elif opt in ('-f'):
+            param_sums = optarg
+        elif opt in ('-P', '--pivot',):
+            opt_pivot = optarg
+        elif opt in ('-R', '--range'):
+            opt_range = 1
+    try:
+        check_params()
+    except SystemExit:
+        sys.stderr.write("--report '%s'\n" % spec)
+        raise
+    return Report(spec, args[0])
+
+def read_reports(filename):
+    """--reports: le specifiche dei report contenute nel file, una per riga"""
+    try:
+        lines = open(filename).read().splitlines()
+    except IOError, err:
+        usage(1, "usage: --reports: %s" % err)
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def new_report_totals():
+    return [Totals(len(report.values['param_sums']) + 1) for report in reports]
+
+def aggregate_reports(fileinp, totals_list):
+    """carica i totali di tutti i report (totals_list, uno per report) leggendo ogni record
+       una sola volta"""
+    # i campi distinti di tutti i report, e per ogni report gli indici dei suoi campi
+    key_cols, sum_cols, accs = [], [], []
+    for (report, totals) in zip(reports, totals_list):
+        if opt_input_csv:
+            keys, sums = report.values['param_keys'], report.values['param_sums']
+        else:
+            keys, sums = [tuple(k) for k in report.values['param_keys']], report.values['sum_fields']
+        for col in keys:
+            if col not in key_cols: key_cols.append(col)
+        for col in sums:
+            if col not in sum_cols: sum_cols.append(col)
+        accs.append((totals, totals.ids.get, [key_cols.index(col) for col in keys], [sum_cols.index(col) for col in sums]))
+
+    fileinp = metered(fileinp)
     if opt_input_csv:
-        if not delim: delim=";"
-    elif delim:
-        opt_input_csv=1
+        records, decode = csv_rows(fileinp), value_decoder("z")
+    elif opt_reclen:
+        records = iter_records(fileinp)
+    else:
+        records = fileinp
+    accept = where_filter()
+    for record in records:
+        if opt_input_csv:
+            if accept and not accept(record): continue
+            fields = [record[i] for i in key_cols]
+            values = [decode(record[i]) for i in sum_cols]
+        else:
+            if accept and not accept(record, 0): continue
+            fields = [record[p1:p2] for (p1,p2) in key_cols]
+            values = [decode(record[p1:p2]) for (p1,p2,decode) in sum_cols]
+        for (totals, get_id, key_ind, sum_ind) in accs:
+            raw = join_keys([fields[i] for i in key_ind])
+            gid = get_id(raw)
+            if gid is None:         # nuovo gruppo
+                gid = totals.new_group(raw)
+            totals.add(gid, [values[i] for i in sum_ind])
+
+def open_reports():
+    """apre i file di output dei report (subito, prima della lettura del file)"""
+    for report in reports:
+        try:
+            report.open()
+        except IOError, err:
+            usage(1, "usage: --report '%s': %s" % (report.spec, err))
+
+def run_reports(fileinp):
+    """calcola tutti i report con una sola lettura del file, e stampa ognuno nel suo file di output"""
+    open_reports()
+    if stats: stats.begin('aggregate')
+    totals_list = new_report_totals()
+    if opt_jobs > 1 and regular_file(fileinp):
+        aggregate_parallel(fileinp.name, 0, os.path.getsize(fileinp.name), totals_list)
+    else:
+        aggregate_reports(fileinp, totals_list)
+    print_reports(totals_list)
+
+def print_reports(totals_list):
+    """stampa i totali di ogni report nel suo file di output"""
+    if stats:                       # i record sono quelli letti una volta, i gruppi di tutti i report
+        stats.add_totals(totals_list[0])
+        stats.groups += sum(map(len, totals_list[1:]))
+    stdout = sys.stdout
+    for (report, totals) in zip(reports, totals_list):
+        if opt_ebcdic:
+            ebcdic_keys(totals)
+        report.activate()
+        sys.stdout = report.out         # le funzioni di stampa scrivono su sys.stdout
+        try:
+            print_totals(totals)
+        finally:
+            sys.stdout = stdout
+        if report.out is not stdout:
+            report.out.close()
 
-    # se viene passato il parametro --opt_output_delim, significa che l'output deve essere in formato .csv
+
+#####################################
+# file gia' ordinati per chiave (--sorted)
+#
+# Rottura di codice: i record di una chiave sono consecutivi, per cui i totali di una
+# chiave vengono stampati appena la chiave cambia, e i totali generali sommati man mano
+# (rows_no_range). In memoria c'e' un solo gruppo per volta. La prima riga viene stampata
+# prima di aver letto il file: la larghezza della colonna delle chiavi non e' quella della
+# chiave piu' lunga, ma quella di sorted_key_width.
+#
+def record_fields(fileinp):
+    """le coppie (keys, [sum1...sumn]) dei record del file, nell'ordine del file
+       (solo i record che soddisfano le condizioni --where)"""
+    fileinp = metered(fileinp)
+    accept = where_filter()
+    if opt_input_csv:
+        decode = value_decoder("z")
+        return ((tuple([row[i] for i in param_keys]), [decode(row[i]) for i in param_sums])
+                for row in csv_rows(fileinp) if not accept or accept(row))
+    if opt_reclen:
+        fileinp = iter_records(fileinp)
+    return ((tuple([line[p1:p2] for (p1,p2) in param_keys]), [decode(line[p1:p2]) for (p1,p2,decode) in sum_fields])
+            for line in fileinp if not accept or accept(line, 0))
+
+def sorted_groups(fileinp):
+    """le coppie (key, value) dei gruppi di un file ordinato per chiave, nell'ordine del file"""
+    current, value = None, None
+    for (num_rec, (keys, values)) in enumerate(record_fields(fileinp)):
+        if keys == current:
+            i=0
+            for v in values:
+                value[i] += v
+                i+=1
+            value[-1] += 1
+            continue
+        # rottura di codice
+        if value is not None:
+            if keys < current:
+                sys.stdout.flush()
+                usage(1, "usage: --sorted: il file non e' ordinato per chiave: record %d, chiave %r dopo %r."
+                         % (num_rec+1, ' '.join(sorted_key(keys)), ' '.join(sorted_key(current))))
+            yield sorted_key(current), value
+        current, value = keys, values + [1]
+    if value is not None:
+        yield sorted_key(current), value
+
+def sorted_key(keys):
+    if opt_ebcdic:
+        return tuple([k.translate(cobolnum.ebcdic2ascii) for k in keys])
+    return keys
+
+def print_totals_sorted(fileinp):
+    groups = sorted_groups(fileinp)
+    if stats:                       # lettura e stampa sono un'unica fase
+        stats.begin('aggregate_print')
+        groups = stats.count_groups(groups)
+    try:
+        first = groups.next()
+    except StopIteration:
+        return                      # file vuoto
+    header = header_no_range(first[1])
+    tot_gen = [0]*(len(header)-1)
+    write_totals_no_range(header, rows_no_range(chain([first], groups), tot_gen), tot_gen,
+                          max(sorted_key_width(first[0]), len(header[0]), len('total')))
+
+def sorted_key_width(first_keys):
+    """la larghezza della colonna delle chiavi con --sorted: --key-width, oppure la somma
+       delle larghezze dei campi -k (la prima chiave con --csv, dove i campi non ne hanno una)"""
+    if opt_key_width:
+        return opt_key_width
+    if opt_input_csv:
+        return len(' '.join(first_keys))
+    return sum([p2-p1 for (p1,p2) in param_keys]) + max(len(param_keys)-1, 0)
+
+
+#####################################
+# statistiche dell'esecuzione (--stats, --progress)
+#
+# Con --stats alla fine viene scritto un riepilogo in JSON (write_stats): tempo reale e di
+# CPU di ogni fase, record, byte e gruppi, picco della memoria e contatori dei valori.
+# I punti di aggancio sono espliciti, e senza le opzioni non fanno niente: value_decoder
+# (i valori da sommare, contati da stats_decoder, che misura anche la CPU della decodifica
+# di un valore ogni stats_sample), metered (i file letti in sequenza) e Stats.begin (le fasi).
+# Con --progress la lettura scrive una riga di avanzamento al massimo ogni progress_interval
+# secondi; con -j la scrive il processo principale, per ogni parte completata (part_done).
+#
+stats = None                       # con --stats, le statistiche (Stats)
+stats_sample = 1024                # il tempo di decodifica viene misurato su un valore ogni stats_sample
+progress_interval = 5              # secondi tra due righe di --progress
+
+def cpu_time():
+    """secondi di CPU (utente e sistema) del processo"""
+    t = os.times()
+    return t[0] + t[1]
+
+class Stats(object):
+    """le statistiche di --stats: le fasi (nome, secondi, secondi di CPU) e i contatori"""
+
+    # contatori che i processi del pool restituiscono al processo principale
+    counters = ('bytes', 'values', 'negatives', 'empty', 'decode_time', 'scalar_values', 'sampled_values', 'sampled_time')
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = []               # [nome, secondi, secondi di CPU], nell'ordine di inizio
+        self.current = None            # (nome, inizio, inizio CPU) della fase in corso
+        self.records = self.groups = 0
+        self.out = None                # il file di --stats-file
+        self.decoders = {}             # tipo -> funzione di decodifica (value_decoder)
+        self.reset()
+
+    def reset(self):
+        """azzera i contatori (nei processi del pool, all'inizio di ogni parte)"""
+        for name in self.counters:
+            setattr(self, name, 0)
+        self.inputs = []               # i MeteredFile, che contano i byte letti
+
+    def counts(self):
+        self.bytes += sum([fileinp.bytes for fileinp in self.inputs])
+        self.inputs = []
+        return tuple([getattr(self, name) for name in self.counters])
+
+    def add_counts(self, counts):
+        """somma i contatori restituiti da un processo del pool"""
+        for (name, value) in zip(self.counters, counts):
+            setattr(self, name, getattr(self, name) + value)
+
+    def begin(self, name):
+        """inizia la fase name, terminando quella in corso (il tempo delle fasi ripetute si somma)"""
+        self.end()
+        self.current = (name, time.time(), cpu_time())
+
+    def end(self):
+        if self.current is None: return
+        name, wall, cpu = self.current
+        self.current = None
+        for phase in self.phases:
+            if phase[0] == name: break
+        else:
+            phase = [name, 0.0, 0.0]
+            self.phases.append(phase)
+        phase[1] += time.time() - wall
+        phase[2] += cpu_time() - cpu
+
+    def add_totals(self, totals):
+        """i record e i gruppi dei totali (con --max_mem, vengono contati durante la fusione)"""
+        if spill_files: return
+        self.groups += len(totals)
+        self.records += sum(totals.columns[-1])
+
+    def count_groups(self, items):
+        """le coppie (key, value) di items, contando i gruppi e i record"""
+        for item in items:
+            self.groups += 1
+            self.records += item[1][-1]
+            yield item
+
+def stats_decoder(decode, type):
+    """con --stats, la funzione di decodifica che conta i valori (per i campi zoned anche quelli
+       negativi e quelli vuoti) e misura il tempo della decodifica di un valore ogni stats_sample"""
+    s = stats
+    zoned = type == "z"
+    if opt_ebcdic:
+        negative, space = cobolnum.ebcdic_negative, '\x40'
+    else:
+        negative, space = frozenset(cobolnum.cobol2num), None
+    def counted(number):
+        s.values += 1
+        s.scalar_values += 1
+        if zoned:
+            if number[-1:] in negative: s.negatives += 1
+            elif not number.strip(space): s.empty += 1
+        if s.scalar_values % stats_sample:
+            return decode(number)
+        start = time.clock()
+        value = decode(number)
+        s.sampled_time += time.clock() - start
+        s.sampled_values += 1
+        return value
+    return counted
+
+def stats_numpy_decode(numpy, col, type, tables):
+    """con --stats, numpy_decode con i contatori e il tempo della decodifica (di tutto il blocco)"""
+    start = time.clock()
+    values = numpy_decode(numpy, col, type, tables)
+    stats.decode_time += time.clock() - start
+    n, width = col.shape
+    stats.values += n
+    if type == "z" and width:
+        if opt_ebcdic:
+            stats.negatives += int(numpy.in1d(col[:, -1] >> 4, (0xB, 0xD)).sum())
+        else:
+            stats.negatives += int((tables[1][col[:, -1]] < 0).sum())
+        stats.empty += int((col == (opt_ebcdic and 0x40 or 32)).all(axis=1).sum())
+    elif type == "z":
+        stats.empty += n
+    return values
+
+def stats_setup():
+    """--stats: crea le statistiche, prima di check_arguments (value_decoder)"""
+    global stats
+    stats = Stats()
+    if opt_stats != '-':            # subito, prima della lettura del file
+        try:
+            stats.out = open(opt_stats, 'w')
+        except IOError, err:
+            usage(1, "usage: --stats-file: %s" % err)
+
+def write_stats(filenames):
+    """scrive il riepilogo di --stats in JSON (sullo standard error, o nel file di --stats-file)"""
+    import json, resource
+    stats.end()
+    counts = stats.counts()
+    wall = time.time() - stats.start
+    t = os.times()
+    phases = dict([(name, w) for (name, w, c) in stats.phases])
+    elapsed = max(phases.get('aggregate', wall), 1e-9)
+    decode = stats.decode_time
+    if stats.sampled_values:       # la stima dei valori misurati a campione
+        decode += stats.sampled_time / stats.sampled_values * stats.scalar_values
+    kb = sys.platform == 'darwin' and 1024 or 1   # ru_maxrss in byte invece che in KB
+    summary = {
+        'input': filenames or ['-'],
+        'wall_s': round(wall, 3),
+        'cpu_s': round(t[0] + t[1], 3),
+        'children_cpu_s': round(t[2] + t[3], 3),
+        'phases': [{'phase': name, 'wall_s': round(w, 3), 'cpu_s': round(c, 3)} for (name, w, c) in stats.phases],
+        'records': stats.records,
+        'bytes': stats.bytes,
+        'records_per_sec': int(stats.records / elapsed),
+        'bytes_per_sec': int(stats.bytes / elapsed),
+        'groups': stats.groups,
+        'spilled_runs': len(spill_files),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // kb,
+        'children_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // kb,
+        'numeric_fields': {'values': stats.values, 'negative': stats.negatives, 'empty': stats.empty,
+                           'decode_cpu_s_estimate': round(decode, 3)},
+    }
+    text = json.dumps(summary, indent=1, sort_keys=True, separators=(',', ': ')) + '\n'
+    if opt_stats == '-':
+        sys.stdout.flush()
+        sys.stderr.write(text)
+    else:
+        stats.out.write(text)
+        stats.out.close()
+
+class Progress(object):
+    """--progress: l'avanzamento della lettura di un file (o di piu' file), sullo standard error"""
+
+    def __init__(self, name, total=0):
+        self.name = name
+        self.total = total
+        self.done = self.records = 0       # le parti completate dai processi del pool (part_done)
+        self.start = self.last = time.time()
+
+    def update(self, done, records=None, force=0):
+        """scrive la riga di avanzamento, se sono passati progress_interval secondi (o con force)"""
+        now = time.time()
+        if now - self.last < progress_interval and not force: return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        line = "--progress: %s: %.1f MB" % (self.name, done / 1048576.0)
+        if self.total:
+            line += " di %.1f (%d%%)" % (self.total / 1048576.0, 100 * done // self.total)
+        line += ", %.1f MB/s" % (done / 1048576.0 / elapsed)
+        if records is not None:
+            line += ", %d record, %d record/s" % (records, records / elapsed)
+        sys.stderr.write(line + '\n')
+
+class MeteredFile(object):
+    """file in lettura che conta i byte (--stats) e scrive l'avanzamento (--progress)"""
+
+    def __init__(self, fileinp, name, total=0):
+        self.fileinp = fileinp
+        self.bytes = 0
+        self.progress = opt_progress and Progress(name, total)
+        if stats: stats.inputs.append(self)
+
+    def read(self, size=-1):
+        data = self.fileinp.read(size)
+        self.bytes += len(data)
+        if self.progress: self.progress.update(self.bytes)
+        return data
+
+    def readline(self):
+        line = self.fileinp.readline()
+        self.bytes += len(line)
+        return line
+
+    def __iter__(self):
+        progress = self.progress
+        n = 0
+        for line in self.fileinp:
+            self.bytes += len(line)
+            n += 1
+            if progress and not n % 8192: progress.update(self.bytes, n)
+            yield line
+
+def metered(fileinp):
+    """il file di input letto in sequenza (aggregate, aggregate_reports, record_fields), con il
+       conteggio dei byte letti e l'avanzamento: solo con --stats o --progress"""
+    if not (stats or opt_progress): return fileinp
+    name = fileinp is sys.stdin and '-' or getattr(fileinp, 'name', '-')
+    total = getattr(fileinp, 'size', 0) or regular_file(fileinp) and os.path.getsize(name) or 0
+    return MeteredFile(fileinp, name, total)
+
+def pool_init():
+    """eseguita all'avvio dei processi del pool: l'avanzamento viene scritto dal processo principale"""
+    global opt_progress
+    opt_progress = ""
+
+def pool_task(args):
+    """eseguita nei processi del pool: (arg, func(arg), contatori di --stats della parte)"""
+    func, arg = args
+    if stats: stats.reset()
+    result = func(arg)
+    return arg, result, stats and stats.counts()
+
+def part_done(progress, size, partial, counts):
+    """una parte (o un file) di size byte completata da un processo del pool: somma i contatori
+       di --stats e scrive l'avanzamento (i record di partial, con --report del primo report)"""
+    if counts: stats.add_counts(counts)
+    if progress:
+        if reports: partial = partial[0]
+        progress.done += size
+        progress.records += sum(partial.columns[-1])
+        progress.update(progress.done, progress.records, force=1)
+
+
+#####################################
+# server (--server, --query)
+#
+# Con --server il file viene aggregato una volta, con i campi -k e -f della riga di
+# comando, e i totali restano in memoria. Le richieste arrivano su un socket Unix, una
+# per connessione: una riga con le opzioni della richiesta (-k, -f, -P, -R, -C, -H,
+# --rollup, --output_csv, --output_delim), a cui il server risponde con una riga OK
+# seguita dal report (oppure ERR seguita dal messaggio di errore), e chiude la connessione.
+# I campi -k della richiesta devono essere chiavi del server (o parti di una chiave) e i
+# campi -f campi del server: i totali della richiesta vengono calcolati dai totali in
+# memoria, senza rileggere il file.
+# Ogni richiesta viene servita da un processo figlio (fork), con la sua copia dei totali
+# e delle variabili globali dei parametri, che vengono reimpostate per la richiesta
+# (come per i report di --report): le richieste contemporanee non si disturbano, e non
+# devono aspettare una la fine dell'altra.
+# Prima di ogni richiesta, se il file e' cambiato (dimensione o data di modifica), il
+# processo principale avvia l'aggiornamento dei totali in un processo figlio: se il file
+# e' cresciuto solo in coda viene aggregata solo la parte nuova, come con --state;
+# altrimenti viene riletto tutto. Il processo figlio restituisce i totali nuovi (o
+# l'errore) su una pipe, che il processo principale legge insieme alle connessioni
+# (select): le richieste, anche STATUS, non aspettano la fine della lettura. Fino ad
+# allora, o se la lettura non riesce, le risposte usano i totali precedenti e iniziano
+# con "OK STALE" e il motivo; STATUS lo riporta nella riga stale.
+# --query=SOCKET invia al server le altre opzioni della riga di comando e ne stampa la
+# risposta; in alternativa: echo "-k1.2 -f8.10" | socat - UNIX-CONNECT:SOCKET
+# (la riga STATUS restituisce lo stato del server).
+#
+class ServedFile(object):
+    """il file di --server: i totali in memoria e la parte del file gia' aggregata"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.keys = list(param_keys)   # i campi del server, a cui si riferiscono le richieste
+        self.sums = zip(param_sums, sum_types)
+        self.totals = None
+        self.offset = 0                # byte gia' aggregati (file regolari non compressi)
+        self.fingerprint = None
+        self.stat = None
+        self.loaded = None             # data dell'ultimo aggiornamento
+        self.pid = 0                   # il processo figlio dell'aggiornamento in corso
+        self.pipe = None
+        self.data = []                 # la risposta del processo figlio, letta finora
+        self.started = None
+        self.reading = None            # (dimensione, data di modifica) del file in lettura
+        self.failed = None             # e del file dell'ultimo aggiornamento non riuscito
+        self.error = ""                # l'errore dell'ultimo aggiornamento
+        self.install(self.read(os.stat(filename)))
+
+    def read(self, stat):
+        """legge il file (solo la parte aggiunta, se il file e' cresciuto in coda): il nuovo
+           stato, da passare a install"""
+        fileinp = open_input(self.filename)
+        start = 0
+        totals = new_totals()
+        if not regular_file(fileinp):
+            aggregate(fileinp, totals)
+            end, fingerprint = 0, None
+        else:
+            if self.fingerprint and same_prefix(self.filename, self.fingerprint):
+                start = self.offset     # il file e' cresciuto solo in coda
+            end = records_end(self.filename, start)
+            if opt_jobs > 1:
+                aggregate_parallel(self.filename, start, end, totals)
+            else:
+                aggregate_file(self.filename, start, end, totals)
+            fingerprint = file_fingerprint(self.filename, end)
+        fileinp.close()
+        # la data di modifica e' quella di prima della lettura: una scrittura durante la
+        # lettura viene aggregata all'aggiornamento successivo
+        return start, totals, end, fingerprint, stat, time.time()
+
+    def install(self, state):
+        """i nuovi totali: sommati ai precedenti, se e' stata letta solo la parte aggiunta"""
+        start, totals, self.offset, self.fingerprint, self.stat, self.loaded = state
+        if start:
+            self.totals.merge(totals)
+        else:
+            self.totals = totals
+        self.error = ""
+
+    def refresh(self):
+        """nel processo principale, prima di ogni richiesta: se il file e' cambiato avvia
+           l'aggiornamento in un processo figlio, senza aspettarne la fine"""
+        if self.pid:                    # c'e' gia' un aggiornamento in corso
+            return
+        try:
+            stat = os.stat(self.filename)
+        except OSError, err:
+            self.error = str(err)
+            return
+        if (stat.st_size, stat.st_mtime) == (self.stat.st_size, self.stat.st_mtime):
+            self.error = ""             # i totali corrispondono di nuovo al file
+            return
+        if (stat.st_size, stat.st_mtime) == self.failed:
+            return                      # non viene riletto finche' non cambia di nuovo
+        r, w = os.pipe()
+        self.pid = os.fork()
+        if self.pid == 0:
+            os.close(r)
+            self.child(stat, w)
+        os.close(w)
+        self.pipe = os.fdopen(r, 'rb')
+        self.data = []
+        self.started, self.reading = time.time(), (stat.st_size, stat.st_mtime)
+
+    def child(self, stat, fd):
+        """eseguita nel processo figlio: scrive nella pipe fd il nuovo stato, oppure l'errore"""
+        import cPickle, signal
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.stderr = errors = StringIO()   # i messaggi di usage()
+        try:
+            try:
+                reply = self.read(stat)
+            except SystemExit:
+                reply = errors.getvalue().strip() or "errore nella lettura"
+            except Exception, err:      # anche i dati non validi (KeyError di cobolnum...)
+                reply = "%s: %s" % (err.__class__.__name__, err)
+            out = os.fdopen(fd, 'wb')
+            cPickle.dump(reply, out, 2)
+            out.close()
+        finally:
+            os._exit(0)
+
+    def receive(self):
+        """nel processo principale, quando la pipe e' pronta: legge la risposta del processo
+           figlio e, alla fine, installa i nuovi totali (oppure ne registra l'errore)"""
+        import cPickle
+        data = os.read(self.pipe.fileno(), 64*1024)
+        if data:
+            self.data.append(data)
+            return
+        self.pipe.close()
+        try:
+            os.waitpid(self.pid, 0)
+        except OSError:                 # gia' raccolto da ForkingMixIn.collect_children
+            pass
+        self.pid, self.pipe = 0, None
+        try:
+            reply = cPickle.loads(''.join(self.data))
+        except Exception:               # il processo figlio e' terminato prima della fine
+            reply = "aggiornamento interrotto"
+        self.data = []
+        if isinstance(reply, str):
+            self.error, self.failed = reply, self.reading
+            sys.stderr.write("--server: %s: %s: vengono usati i totali precedenti.\n" % (self.filename, reply))
+        else:
+            self.install(reply)
+            self.failed = None
+
+    def stale(self):
+        """perche' i totali in memoria non corrispondono al file ("" se sono aggiornati)"""
+        if self.pid:
+            return "aggiornamento in corso dalle %s" % time.strftime('%H:%M:%S', time.localtime(self.started))
+        if self.error:
+            return "errore nell'aggiornamento: %s" % self.error
+        return ""
+
+    def status(self):
+        """le righe di STATUS"""
+        return ["file: %s" % self.filename, "offset: %d" % self.offset, "groups: %d" % len(self.totals),
+                "records: %d" % sum(self.totals.columns[-1]),
+                "loaded: %s" % time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.loaded)),
+                "stale: %s" % (self.stale() or "no"),
+                "keys: %s" % ','.join([field_name(field) for field in self.keys]),
+                "sums: %s" % ','.join([field_name(field, type) for (field, type) in self.sums])]
+
+def server_key(served, field):
+    """(indice, inizio, fine) del campo -k di una richiesta nelle chiavi del server, oppure None"""
+    for (i, key) in enumerate(served.keys):
+        if opt_input_csv:
+            if key == field: return i, 0, None
+        elif key[0] <= field[0] and field[1] <= key[1]:
+            return i, field[0] - key[0], field[1] - key[0]
+    return None
+
+def query_totals(served, line):
+    """i totali di una richiesta, calcolati dai totali del server; i parametri della
+       richiesta vengono impostati nelle variabili globali (nel processo figlio)"""
+    global param_keys, param_sums, opt_pivot, opt_range, opt_cents, opt_header, opt_rollup
+    global opt_output_csv, opt_output_delim
+    import shlex
+    try:
+        opts, args = getopt.gnu_getopt(shlex.split(line), "HCRP:k:f:",
+                                       ["pivot=", "range", "nocents", "no-cents", "no_cents",
+                                        "noheader", "no-header", "no_header", "rollup",
+                                        "output_csv", "output-csv", "output_delim=", "output-delim="])
+    except (getopt.error, ValueError), err:
+        usage(1, "usage: %s" % err)
+    if args:
+        usage(1, "usage: la richiesta non ammette argomenti: %s" % ' '.join(args))
+    param_keys, param_sums, opt_pivot, opt_range = "", "", "", ""
+    opt_cents, opt_header, opt_rollup, opt_output_csv, opt_output_delim = 1, 1, "", "", ""
+    for opt, optarg in opts:
+        if opt in ('-k'):
+            param_keys = optarg
+        elif opt in ('-f'):
+            param_sums = optarg
+        elif opt in ('-P', '--pivot',):
+            opt_pivot = optarg
+        elif opt in ('-R', '--range'):
+            opt_range = 1
+        elif opt in ('-C', '--nocents', '--no-cents', '--no_cents'):
+            opt_cents = ""
+        elif opt in ('-H', '--noheader', '--no-header', '--no_header',):
+            opt_header = 0
+        elif opt in ('--rollup',):
+            opt_rollup = 1
+        elif opt in ('--output_csv', '--output-csv',):
+            opt_output_csv = 1
+        elif opt in ('--output_delim', '--output-delim',):
+            opt_output_delim = optarg
     if opt_output_delim:
-        opt_output_csv=1
+        opt_output_csv = 1
     elif opt_output_csv:
-        opt_output_delim=";"
+        opt_output_delim = ";"
+    check_params()
+
+    keys = [server_key(served, field) for field in param_keys]
+    sums = zip(param_sums, sum_types)
+    missing = [field_name(field) for (field, key) in zip(param_keys, keys) if key is None]
+    missing += [field_name(field, type) for (field, type) in sums if (field, type) not in served.sums]
+    if missing:
+        usage(1, "usage: campi non presenti nel server: %s (-k %s -f %s)." % (','.join(missing),
+              ','.join([field_name(field) for field in served.keys]),
+              ','.join([field_name(field, type) for (field, type) in served.sums])))
+
+    sum_ind = [served.sums.index(field) for field in sums]
+    totals = new_totals()
+    for (server_keys, value) in served.totals.iteritems():
+        gid = totals.group(tuple([server_keys[i][p1:p2] for (i, p1, p2) in keys]))
+        totals.add(gid, [value[j] for j in sum_ind], value[-1])
+    if opt_ebcdic:
+        ebcdic_keys(totals)
+    return totals
+
+def answer_request(served, line, out):
+    """risponde a una richiesta, nel processo figlio: OK e il report (OK STALE e il motivo, se
+       i totali non sono aggiornati), oppure ERR e il messaggio"""
+    if not line.strip():                # connessione chiusa senza richiesta
+        return
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stderr = errors = StringIO()   # i messaggi di usage()
+    try:
+        try:
+            if line.strip() == 'STATUS':
+                out.write("OK\n" + ''.join([s + '\n' for s in served.status()]))
+                return
+            totals = query_totals(served, line)
+        except SystemExit:
+            out.write("ERR\n" + errors.getvalue())
+            return
+        stale = served.stale()
+        out.write(stale and "OK STALE %s\n" % stale or "OK\n")
+        sys.stdout = out                # le funzioni di stampa scrivono su sys.stdout
+        print_totals(totals)
+    except IOError:                     # il client ha chiuso la connessione
+        pass
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+def run_server(filenames):
+    """--server: aggrega il file e risponde alle richieste sul socket opt_server"""
+    import SocketServer, socket, signal, select, errno
+    if len(filenames) != 1:
+        usage(1, "usage: --server: ci deve essere un solo file di input.")
+    filename = filenames[0]
+    if not os.path.isfile(filename):
+        usage(1, "usage: --server: '%s' non e' un file regolare." % filename)
+    if os.path.exists(opt_server):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(opt_server)
+        except socket.error:
+            os.remove(opt_server)       # il socket di un server terminato
+        else:
+            usage(1, "usage: --server: il socket '%s' e' gia' in uso." % opt_server)
+        probe.close()
+    served = ServedFile(filename)
+
+    class Server(SocketServer.ForkingMixIn, SocketServer.UnixStreamServer):
+        def process_request(self, request, client_address):
+            served.refresh()            # nel processo principale, prima del fork
+            SocketServer.ForkingMixIn.process_request(self, request, client_address)
+
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            answer_request(served, self.rfile.readline(), self.wfile)
+
+        def finish(self):
+            try:
+                SocketServer.StreamRequestHandler.finish(self)
+            except socket.error:        # il client ha chiuso la connessione
+                pass
+
+    server = Server(opt_server, Handler)
+    # SIGTERM termina il ciclo delle richieste (sys.exit durante una richiesta verrebbe
+    # intercettato da SocketServer)
+    stop = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+    sys.stderr.write("--server: %s: %d gruppi, richieste su %s\n" % (filename, len(served.totals), opt_server))
+    try:
+        while not stop:                 # come serve_forever, ma anche con la pipe dell'aggiornamento
+            try:
+                ready = select.select([server] + (served.pipe and [served.pipe] or []), [], [], 0.5)[0]
+            except select.error, err:
+                if err.args[0] != errno.EINTR: raise
+                continue
+            if served.pipe in ready:
+                served.receive()
+            if server in ready:
+                server._handle_request_noblock()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(opt_server)
+        if served.pid:                  # l'aggiornamento in corso
+            os.kill(served.pid, signal.SIGTERM)
+
+def run_query(opts):
+    """--query: invia al server le opzioni della riga di comando (tranne --query) e ne
+       stampa la risposta: il report sullo standard output, gli errori sullo standard error"""
+    import socket, pipes
+    args = []
+    for (opt, optarg) in opts:
+        if opt in ('--query',): continue
+        if opt.startswith('--') and optarg:
+            args.append('%s=%s' % (opt, optarg))
+        else:
+            args.append(opt + optarg)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(opt_query)
+        sock.sendall(' '.join(map(pipes.quote, args)) + '\n')
+        reply = sock.makefile('rb')
+        status = reply.readline()
+        if status.startswith("OK STALE "):
+            sys.stderr.write("--query: totali non aggiornati: %s" % status[9:])
+            status = "OK\n"
+        out = status == "OK\n" and sys.stdout or sys.stderr
+        while 1:
+            data = reply.read(64*1024)
+            if not data: break
+            out.write(data)
+    except socket.error, err:
+        usage(1, "usage: --query: %s: %s" % (opt_query, err))
+    sock.close()
+    if status != "OK\n":
+        sys.exit(1)
+
+
+def print_totals(totals):
+    if spill_files:
+        print_totals_spilled(totals)
+        return
+    if not totals: return
+    if opt_range:
+        print_totals_with_range(totals)
+    else:
+        print_totals_no_range(totals)
 
+def runfile(fileinp):
+    if reports:
+        run_reports(fileinp)
+        return
+    if opt_sorted:
+        print_totals_sorted(fileinp)
+        return
+
+    if stats: stats.begin('aggregate')
+    totals = new_totals()
+    if not regular_file(fileinp):
+        if opt_state:
+            usage(1, "usage: --state: il file di input deve essere un file regolare, non compresso.")
+        aggregate(fileinp, totals)          # lettura sequenziale (standard input, pipe, file compressi...)
+    else:
+        start, end = 0, os.path.getsize(fileinp.name)
+        size = end
+        if opt_state:                       # solo la parte aggiunta dall'esecuzione precedente
+            start = load_state(fileinp.name, totals)
+            end = records_end(fileinp.name, start)
+        if opt_jobs > 1:
+            aggregate_parallel(fileinp.name, start, end, totals)
+        else:
+            aggregate_file(fileinp.name, start, end, totals)
+        if opt_state:
+            if stats: stats.begin('save_state')
+            save_state(fileinp.name, end, totals)
+            if size > end:                  # l'ultima riga, incompleta: nel report ma non nello stato
+                aggregate_file(fileinp.name, end, size, totals)
+    if opt_ebcdic:
+        ebcdic_keys(totals)
+    if stats: stats.add_totals(totals)
+    print_totals(totals)
+
+
+def check_params():
+    """controlla e converte i parametri che possono essere diversi per ogni report (-k, -f, -P, -R)"""
+    global param_keys, param_sums, opt_pivot, opt_cents, sum_types, sum_fields, param_distinct
+
+    if ":" in param_keys:
+        usage(1, "usage: -k: il tipo del campo e' ammesso solo con -f.")
     try:
         param_keys=process_arg(param_keys, delim)
+        sum_types=process_types(param_sums)
         param_sums=process_arg(param_sums, delim)
     except:
         usage(1, "ERR: parametri non corretti.\n%s %s" % (sys.exc_info()[0], sys.exc_info()[1]))
@@ -488,6 +3208,22 @@ def check_arguments():
     if opt_range and (not opt_pivot):
         usage(1, "usage: -R: manca il parametro -P (pivot) .")
 
+    # campi packed e binari
+    if opt_input_csv and sum_types.count("z") < len(sum_types):
+        usage(1, "usage: --csv: --reclen, --ebcdic e i campi packed o binari sono ammessi solo a larghezza fissa.")
+    if not opt_input_csv:
+        sum_fields = [(p1, p2, value_decoder(type)) for ((p1, p2), type) in zip(param_sums, sum_types)]
+
+    # campi delle stime (-u): a larghezza fissa, vengono letti insieme ai campi da sommare
+    if param_distinct:
+        try:
+            param_distinct=process_arg(param_distinct, delim)
+        except:
+            usage(1, "usage: -u: parametri non corretti.\n%s %s" % (sys.exc_info()[0], sys.exc_info()[1]))
+        if not opt_input_csv:
+            sum_types = sum_types + ["u"]*len(param_distinct)
+            sum_fields = sum_fields + [(p1, p2, str) for (p1, p2) in param_distinct]
+
     # se non si sono campi da sommare, opt_cents non ha senso
     if opt_range or (not param_sums):
         opt_cents=""
@@ -507,18 +3243,151 @@ def check_arguments():
             usage(1, "usage: -P: in modalita' pivot non possono esserci piu' di una colonna da sommare.")
         if not opt_header:
             usage(1, "usage: -P e -H incompatibili.")
+        if opt_per_file:
+            opt_pivot += 1              # con --per-file la prima chiave e' il nome del file
+
+    # subtotali
+    if opt_rollup:
+        if opt_range:
+            usage(1, "usage: --rollup e -R incompatibili.")
+        if rollup_levels() < 1:
+            usage(1, "usage: --rollup: servono almeno due chiavi -k (oltre a quella di pivot).")
+
+
+def check_arguments():
+    global delim, opt_input_csv, opt_output_csv, opt_output_delim
+    global opt_jobs, opt_reclen, max_groups, opt_topk, topk_counters, opt_key_width
+
+    # se viene passato il parametro --opt_output_delim, significa che l'output deve essere in formato .csv
+    if opt_input_csv:
+        if not delim: delim=";"
+    elif delim:
+        opt_input_csv=1
+    if opt_input_csv and len(delim) != 1:
+        # le righe con le virgolette vengono lette dal modulo csv, che ammette un solo carattere
+        usage(1, "usage: -d: il separatore deve essere un solo carattere.")
+
+    # se viene passato il parametro --opt_output_delim, significa che l'output deve essere in formato .csv
+    if opt_output_delim:
+        opt_output_csv=1
+    elif opt_output_csv:
+        opt_output_delim=";"
+
+    # processi paralleli
+    if opt_jobs:
+        if not opt_jobs.isdigit() or int(opt_jobs) < 1:
+            usage(1, "usage: -j deve essere un numero maggiore di 0.")
+        opt_jobs = int(opt_jobs)
+    else:
+        opt_jobs = 1
+
+    # il motore numpy lavora solo sui file a larghezza fissa
+    if opt_numpy and opt_input_csv:
+        usage(1, "usage: --numpy e --csv incompatibili.")
+
+    # record di lunghezza fissa
+    if opt_reclen:
+        if not opt_reclen.isdigit() or int(opt_reclen) < 1:
+            usage(1, "usage: --reclen deve essere un numero maggiore di 0.")
+        opt_reclen = int(opt_reclen)
+    if opt_key_width:
+        if not opt_key_width.isdigit() or int(opt_key_width) < 1:
+            usage(1, "usage: --key-width deve essere un numero maggiore di 0.")
+        if not opt_sorted:
+            usage(1, "usage: --key-width e' ammesso solo con --sorted.")
+        opt_key_width = int(opt_key_width)
+    if opt_input_csv and (opt_reclen or opt_ebcdic):
+        usage(1, "usage: --csv: --reclen, --ebcdic e i campi packed o binari sono ammessi solo a larghezza fissa.")
+
+    # condizioni sui record
+    try:
+        where_fields[:] = process_where(opt_where)
+    except ValueError, err:
+        usage(1, "usage: -w: %s" % err)
+    if opt_input_csv and [kind for (field, kind, values, test) in where_fields if kind == 'range' and values[2] != "z"]:
+        usage(1, "usage: --csv: --reclen, --ebcdic e i campi packed o binari sono ammessi solo a larghezza fissa.")
+
+    # stime per gruppo (le colonne delle stime non si possono sommare come i campi -f)
+    if opt_topk:
+        if not opt_topk.isdigit() or int(opt_topk) < 1:
+            usage(1, "usage: --topk deve essere un numero maggiore di 0.")
+        opt_topk = int(opt_topk)
+        if not param_distinct:
+            usage(1, "usage: --topk: manca il parametro -u.")
+        error = topk_error
+        if opt_topk_error:
+            try:
+                error = float(opt_topk_error)
+            except ValueError:
+                error = 0
+            if not 0 < error < 1:
+                usage(1, "usage: --topk-error deve essere un numero tra 0 e 1.")
+        topk_counters = max(opt_topk, int(math.ceil(1 / error)))
+    elif opt_topk_error:
+        usage(1, "usage: --topk-error: manca il parametro --topk.")
+    if param_distinct and (opt_pivot or opt_range or opt_rollup or opt_numpy or opt_sorted or opt_max_mem or opt_state
+                           or report_specs or opt_build_cache or opt_cache):
+        usage(1, "usage: -u incompatibile con -P, -R, --rollup, --numpy, --sorted, --max_mem, --state, --report e la cache.")
+
+    # i parametri -k, -f, -P, -R: della riga di comando, oppure di ogni report
+    if report_specs:
+        if param_keys or param_sums or opt_pivot or opt_range:
+            usage(1, "usage: --report: le opzioni -k, -f, -P e -R vanno indicate in ogni report.")
+        if opt_numpy or opt_max_mem or opt_state:
+            usage(1, "usage: --report incompatibile con --numpy, --max_mem e --state.")
+        cents = opt_cents
+        for spec in report_specs:
+            reports.append(parse_report(spec, cents))
+    else:
+        check_params()
+
+    # limite di memoria
+    if opt_max_mem:
+        if not opt_max_mem.isdigit() or int(opt_max_mem) < 1:
+            usage(1, "usage: --max_mem deve essere un numero (MB) maggiore di 0.")
+        if opt_pivot or opt_range or opt_jobs > 1:
+            usage(1, "usage: --max_mem incompatibile con -P, -R e -j.")
+        max_groups = max(1, int(opt_max_mem)*1024*1024 // group_size())
+
+    # totali incrementali
+    if opt_state and opt_max_mem:
+        usage(1, "usage: --state e --max_mem incompatibili.")
+
+    # file gia' ordinato per chiave
+    if opt_sorted and (opt_pivot or opt_range or opt_jobs > 1 or opt_numpy or opt_max_mem or opt_state or reports):
+        usage(1, "usage: --sorted incompatibile con -P, -R, -j, --numpy, --max_mem, --state e --report.")
+
+    # server
+    if opt_server and (opt_pivot or opt_range or opt_rollup or reports or opt_sorted or opt_max_mem or opt_state
+                       or opt_per_file or opt_build_cache or opt_cache or param_distinct):
+        usage(1, "usage: --server incompatibile con -P, -R, --rollup, --report, --sorted, --max_mem, --state, "
+                 "--per-file, -u e la cache (-P, -R e --rollup vanno indicati nelle richieste).")
+
+    # cache a colonne
+    if opt_build_cache and opt_cache:
+        usage(1, "usage: --build-cache e --cache incompatibili.")
+    if (opt_build_cache or opt_cache) and (reports or opt_sorted or opt_state or opt_max_mem or opt_per_file):
+        usage(1, "usage: --build-cache e --cache incompatibili con --report, --sorted, --state, --max_mem e --per-file.")
      
     
 def main():
     global delim, opt_header, opt_cents, opt_totals, opt_pivot, opt_range, opt_input_csv, opt_output_csv, opt_output_delim
-    global param_keys, param_sums
+    global opt_numpy, opt_jobs, opt_reclen, opt_ebcdic, opt_max_mem, opt_state, opt_sorted, opt_key_width, opt_per_file
+    global opt_build_cache, opt_cache, opt_rollup, opt_stats, opt_progress, opt_server, opt_query
+    global param_keys, param_sums, param_distinct, opt_topk, opt_topk_error
     
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hsHCTRP:d:k:f:",
+        opts, args = getopt.getopt(sys.argv[1:], "hsHCTRP:d:k:f:j:w:u:",
                                    ["help", "totals", "csv", "delim=", "pivot=", "range", \
                                    "nocents", "no-cents", "no_cents", \
                                    "noheader", "no-header", "no_header", \
-                                   "output_csv", "output-csv", "output_delim=", "output-delim="])
+                                   "output_csv", "output-csv", "output_delim=", "output-delim=", \
+                                   "numpy", "jobs=", "reclen=", "ebcdic", \
+                                   "max_mem=", "max-mem=", "state=", "sorted", "key-width=", "key_width=", "report=", "reports=", "where=", \
+                                   "per-file", "per_file", "build-cache=", "build_cache=", "cache=", "rollup", \
+                                   "stats", "stats-file=", "stats_file=", "progress", "distinct=", "topk=", \
+                                   "topk-error=", "topk_error=", \
+                                   "server=", "query="])
     except getopt.error, err:
         usage(1, err.msg)
     for opt, optarg in opts:
@@ -528,6 +3397,12 @@ def main():
             param_keys = optarg
         elif opt in ('-f'):
             param_sums = optarg
+        elif opt in ('-u', '--distinct',):
+            param_distinct = optarg
+        elif opt in ('--topk',):
+            opt_topk = optarg
+        elif opt in ('--topk-error', '--topk_error',):
+            opt_topk_error = optarg
         elif opt in ('-d', '--delim',):
             delim = optarg
         elif opt in ('-P', '--pivot',):
@@ -546,9 +3421,81 @@ def main():
             opt_output_csv = 1
         elif opt in ('--output_delim', '--output-delim',):
             opt_output_delim = optarg
+        elif opt in ('--numpy',):
+            opt_numpy = 1
+        elif opt in ('-j', '--jobs',):
+            opt_jobs = optarg
+        elif opt in ('--reclen',):
+            opt_reclen = optarg
+        elif opt in ('--ebcdic',):
+            opt_ebcdic = 1
+        elif opt in ('--max_mem', '--max-mem',):
+            opt_max_mem = optarg
+        elif opt in ('--state',):
+            opt_state = optarg
+        elif opt in ('-w', '--where',):
+            opt_where.append(optarg)
+        elif opt in ('--sorted',):
+            opt_sorted = 1
+        elif opt in ('--key-width', '--key_width',):
+            opt_key_width = optarg
+        elif opt in ('--report',):
+            report_specs.append(optarg)
+        elif opt in ('--reports',):
+            report_specs.extend(read_reports(optarg))
+        elif opt in ('--per-file', '--per_file',):
+            opt_per_file = 1
+        elif opt in ('--build-cache', '--build_cache',):
+            opt_build_cache = optarg
+        elif opt in ('--cache',):
+            opt_cache = optarg
+        elif opt in ('--rollup',):
+            opt_rollup = 1
+        elif opt in ('--stats',):
+            opt_stats = "-"
+        elif opt in ('--stats-file', '--stats_file',):
+            opt_stats = optarg
+        elif opt in ('--progress',):
+            opt_progress = 1
+        elif opt in ('--server',):
+            opt_server = optarg
+        elif opt in ('--query',):
+            opt_query = optarg
+
+    # client del server: le opzioni vengono controllate dal server
+    if opt_query:
+        if args:
+            usage(1, "usage: --query: il file di input e' quello del server.")
+        run_query(opts)
+        return
 
+    if opt_stats:
+        stats_setup()
     check_arguments()
-    file=(len(args) >= 1 and open(args[0])) or sys.stdin
+    filenames = expand_args(args)
+    try:
+        run(filenames)
+    finally:
+        remove_spilled()            # --max_mem: anche dopo un errore
+    if stats:
+        write_stats(filenames)
+
+def run(filenames):
+    if opt_server:
+        run_server(filenames)
+        return
+    if opt_build_cache:
+        if len(filenames) != 1:
+            usage(1, "usage: --build-cache: ci deve essere un solo file di input.")
+        build_cache(filenames[0])
+        return
+    if opt_cache:
+        run_cache(filenames)
+        return
+    if len(filenames) > 1 or opt_per_file:
+        runfiles(filenames)
+        return
+    file=(filenames and open_input(filenames[0])) or open_stdin()
     #runfile(file)
     runfile(file)
 
@@ -0,0 +1,29 @@
+#! /usr/bin/env python
+
+"""make_expected.py  -- Rigenera l'output atteso dei test (data/expected/*.out)
+
+Usage: make_expected.py BASELINE
+
+BASELINE e' la versione originale di count_totals.py (il primo commit del repository:
+git show $(git rev-list --max-parents=0 HEAD):count_totals.py > baseline.py), eseguita
+su data/fixed.dat con le opzioni di ogni caso di support.baseline_cases.
+"""
+
+import os, sys, subprocess
+
+import support
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.stderr.write(__doc__ + "\n")
+        sys.exit(1)
+    baseline = sys.argv[1]
+    for (name, args) in support.baseline_cases:
+        out = subprocess.check_output([sys.executable, baseline] + args + [support.data_file('fixed.dat')])
+        open(support.data_file(os.path.join('expected', name + '.out')), 'wb').write(out)
+        print "%-16s %6d byte" % (name, len(out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""support.py  -- Funzioni comuni dei test di count_totals.py
+
+I test eseguono count_totals.py in un processo separato (run), come dalla riga di
+comando, e confrontano l'output con quello atteso:
+
+  - data/fixed.dat: record a larghezza fissa (chiavi 1.2 e 3.5, campi zoned 8.10 e
+    18.8, con i negativi nelle tre convenzioni Cobol e qualche valore con gli spazi
+    iniziali);
+  - data/expected/NOME.out: l'output della versione originale di count_totals.py
+    (baseline) con le opzioni di baseline_cases, rigenerato da make_expected.py.
+
+Gli altri formati (csv, EBCDIC, packed, binario...) vengono creati dai record di
+fixed.dat (fixed_records), e devono dare gli stessi totali.
+
+Eseguire con: python -m unittest discover -s tests
+"""
+
+import os, re, sys, subprocess, tempfile, shutil, unittest, struct, imp, itertools
+
+tests = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(tests)
+count_totals = os.path.join(root, 'count_totals.py')
+
+sys.path.insert(0, root)
+import cobolnum
+
+# le opzioni (senza il file di input) dei casi confrontati con l'output della baseline
+fixed_keys, fixed_sums = '1.2,3.5', '8.10,18.8'
+baseline_cases = [
+    ('sums',            ['-k1.2', '-f8.10,18.8']),
+    ('two_keys',        ['-k1.2,3.5', '-f8.10']),
+    ('two_keys_sums',   ['-k1.2,3.5', '-f8.10,18.8']),
+    ('pivot1',          ['-k1.2,3.5', '-P1', '-f8.10']),
+    ('pivot2',          ['-k1.2,3.5', '-P2', '-f8.10']),
+    ('pivot_count',     ['-k1.2,3.5', '-P2']),
+    ('range',           ['-k1.2,3.5', '-P1', '-R']),
+    ('range2',          ['-k1.2,3.5', '-P2', '-R']),
+    ('output_csv',      ['-k1.2', '-f8.10', '--output_csv']),
+    ('pivot_csv',       ['-k1.2,3.5', '-P2', '-f8.10', '--output_csv']),
+    ('range_csv',       ['-k1.2,3.5', '-P2', '-R', '--output_csv']),
+    ('output_delim',    ['-k1.2,3.5', '-f8.10,18.8', '--output_delim=|']),
+    ('nocents',         ['-k1.2', '-f8.10', '-C']),
+    ('count',           ['-k3.5']),
+    ('no_key',          ['-f8.10']),
+    ('noheader',        ['-k1.2', '-f8.10,18.8', '-H']),
+    ('part_of_key',     ['-k2.3', '-f18.8']),
+    ('thousands',       ['-k1.2', '-f8.10,18.8', '-s']),
+    ('thousands_nocents', ['-k3.5', '-f18.8', '-s', '-C']),
+    ('totals_col',      ['-k1.2,3.5', '-f8.10,18.8', '-T']),
+    ('pivot_totals',    ['-k1.2,3.5', '-P2', '-f8.10', '-T']),
+    ('range_totals',    ['-k1.2,3.5', '-P1', '-R', '-T']),
+    ('nocents_noheader', ['-k1.2', '-f8.10', '-C', '-H']),
+    ('pivot_nocents',   ['-k1.2,3.5', '-P2', '-f8.10', '-C']),
+    ('pivot_delim',     ['-k1.2,3.5', '-P1', '-f8.10', '--output_delim=,']),
+    ('csv_nocents_noheader', ['-k1.2', '-f8.10,18.8', '--output_csv', '-C', '-H']),
+    ('range_delim',     ['-k1.2,3.5', '-P2', '-R', '--output_delim=|']),
+    ('csv_totals_col',  ['-k1.2', '-f8.10,18.8', '-T', '--output_csv']),
+]
+
+
+def data_file(name):
+    return os.path.join(tests, 'data', name)
+
+def expected(name):
+    """l'output della baseline per il caso name di baseline_cases"""
+    return open(data_file(os.path.join('expected', name + '.out')), 'rb').read()
+
+def run(args, stdin='', env=None):
+    """esegue count_totals.py con gli argomenti args: (exit status, standard output, standard error)"""
+    if env is not None:
+        env = dict(os.environ, **env)
+    proc = subprocess.Popen([sys.executable, count_totals] + list(args), stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = proc.communicate(stdin)
+    return proc.returncode, out, err
+
+modules = itertools.count()
+
+def load_module(**settings):
+    """una copia nuova del modulo count_totals, per i test delle sue funzioni: le variabili
+       globali settings (opt_..., param_...) vengono impostate e controllate da check_arguments,
+       come dopo la lettura della riga di comando"""
+    module = imp.load_source('count_totals_%d' % modules.next(), count_totals)
+    for (name, value) in settings.items():
+        setattr(module, name, value)
+    module.check_arguments()
+    return module
+
+def fixed_records():
+    """i record di fixed.dat: (chiave1, chiave2, campo1, campo2), come stringhe"""
+    records = []
+    for line in open(data_file('fixed.dat'), 'rb'):
+        records.append((line[0:2], line[2:7], line[7:17], line[17:25]))
+    return records
+
+
+# codifiche dei valori, per i file equivalenti a fixed.dat
+def encode_zoned_ebcdic(value, width):
+    """campo zoned EBCDIC: cifre F0-F9, segno nella zona dell'ultimo byte (C o D)"""
+    digits = '%0*d' % (width, abs(value))
+    last = (value < 0 and 0xD0 or 0xC0) | int(digits[-1])
+    return digits[:-1].translate(cobolnum.ascii2ebcdic) + chr(last)
+
+def encode_packed(value, width):
+    """campo packed decimal (COMP-3) di width byte"""
+    digits = '%0*d' % (2*width - 1, abs(value)) + (value < 0 and 'd' or 'c')
+    return digits.decode('hex')
+
+def encode_binary(value, width):
+    """campo binario big-endian con segno (COMP) di width byte"""
+    return struct.pack('>q', value)[8-width:]
+
+# i record di fixed.dat in EBCDIC, di mainframe_reclen byte senza fine riga: le chiavi
+# (1.2 e 3.5), il primo campo zoned EBCDIC (8.10), il secondo packed (18.5:p) e il primo
+# anche binario (23.4:b)
+mainframe_reclen = 26
+mainframe_fields = {'8.10': '8.10', '18.8': '18.5:p'}
+binary_fields = {'8.10': '23.4:b', '18.8': '18.5:p'}
+
+def mainframe_data():
+    return ''.join(mainframe_records())
+
+def mainframe_records():
+    records = []
+    for (k1, k2, v1, v2) in fixed_records():
+        v1, v2 = cobolnum.decode_zoned(v1), cobolnum.decode_zoned(v2)
+        records.append((k1 + k2).translate(cobolnum.ascii2ebcdic) + encode_zoned_ebcdic(v1, 10) +
+                       encode_packed(v2, 5) + encode_binary(v1, 4))
+    return records
+
+# i record di fixed.dat come righe csv (;), con i campi nelle colonne di csv_columns; con
+# notes, un record ogni tre ha una quinta colonna tra virgolette che contiene un fine riga
+csv_columns = {'1.2': '1', '3.5': '2', '8.10': '3', '18.8': '4'}
+
+def csv_data(notes=False):
+    return ''.join(csv_lines(notes))
+
+def csv_lines(notes=False):
+    lines = []
+    for (i, record) in enumerate(fixed_records()):
+        if notes and i % 3 == 0:
+            lines.append('%s;%s;%s;%s;"nota\nriga %d"\n' % (record + (i,)))
+        else:
+            lines.append('%s;%s;%s;%s\n' % record)
+    return lines
+
+def translate_args(args, fields):
+    """le opzioni di un caso di baseline_cases per un file con i campi da sommare fields
+       (campo di fixed.dat -> campo del file)"""
+    ret = []
+    for arg in args:
+        if arg.startswith('-f'):
+            arg = '-f' + ','.join([fields[f] for f in arg[2:].split(',')])
+        ret.append(arg)
+    return ret
+
+def translate_csv_args(args):
+    """le opzioni di un caso di baseline_cases per il file di csv_data: i campi di -k, -f e
+       -w diventano colonne (None se un campo non ha una colonna, come 2.3 di part_of_key)"""
+    ret = []
+    for arg in args:
+        if arg[:2] in ('-k', '-f'):
+            fields = arg[2:].split(',')
+            if [f for f in fields if f not in csv_columns]: return None
+            arg = arg[:2] + ','.join([csv_columns[f] for f in fields])
+        elif arg[:2] == '-w':
+            field = re.match(r'[0-9.]+', arg[2:]).group()
+            if field not in csv_columns: return None
+            arg = '-w' + csv_columns[field] + arg[2+len(field):]
+        ret.append(arg)
+    return ret
+
+
+class CountTotalsTest(unittest.TestCase):
+
+    def check_run(self, args, stdin=''):
+        """l'output di count_totals.py, verificando che termini senza errori"""
+        status, out, err = run(args, stdin)
+        self.assertEqual(status, 0, err)
+        return out
+
+    def check_error(self, args, message, stdin=''):
+        """verifica che count_totals.py termini con un errore che contiene message"""
+        status, out, err = run(args, stdin)
+        self.assertNotEqual(status, 0)
+        self.assertIn(message, err)
+
+class TempDirTest(CountTotalsTest):
+    """test con una directory temporanea (self.tmp), cancellata alla fine"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='count_totals_test.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write(self, name, data):
+        filename = self.path(name)
+        out = open(filename, 'wb')
+        out.write(data)
+        out.close()
+        return filename
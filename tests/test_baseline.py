@@ -0,0 +1,119 @@
+"""I totali di fixed.dat, confrontati con l'output della versione originale (baseline),
+con il motore standard, con quello vettoriale (--numpy) e con piu' processi (-j)"""
+
+import unittest
+
+import support
+from support import baseline_cases, expected, data_file
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class BaselineTest(support.CountTotalsTest):
+    """il motore standard: file regolare (mmap) e standard input (riga per riga)"""
+
+    options = []
+
+    def test_file(self):
+        for (name, args) in baseline_cases:
+            out = self.check_run(self.options + args + [data_file('fixed.dat')])
+            self.assertEqual(out, expected(name), name)
+
+    def test_stdin(self):
+        data = open(data_file('fixed.dat'), 'rb').read()
+        for (name, args) in baseline_cases:
+            out = self.check_run(self.options + args, stdin=data)
+            self.assertEqual(out, expected(name), name)
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyTest(BaselineTest):
+
+    options = ['--numpy']
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyFallbackTest(support.TempDirTest):
+    """--numpy con record di lunghezza variabile: si prosegue riga per riga"""
+
+    def test_variable_length(self):
+        lines = open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+        lines[250] = lines[250][:20] + '\n'             # riga corta: campi troncati
+        lines[300] = lines[300][:-1] + '999\n'          # riga lunga
+        filename = self.write('var.dat', ''.join(lines) + lines[0][:12])  # senza fine riga
+        for (name, args) in baseline_cases:
+            self.assertEqual(self.check_run(['--numpy'] + args + [filename]),
+                             self.check_run(args + [filename]), name)
+
+    def test_single_line(self):
+        filename = self.write('one.dat', open(data_file('fixed.dat'), 'rb').readline()[:-1])
+        self.assertEqual(self.check_run(['--numpy', '-k1.2', '-f8.10', filename]),
+                         self.check_run(['-k1.2', '-f8.10', filename]))
+
+    def test_empty(self):
+        filename = self.write('empty.dat', '')
+        self.assertEqual(self.check_run(['--numpy', '-k1.2', '-f8.10', filename]), '')
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyKeysTest(unittest.TestCase):
+    """numpy_group_keys: ogni record nel gruppo con i byte della sua chiave, un gruppo per
+       chiave, sia con i codici dei byte presenti sia ordinando le chiavi (molte combinazioni)"""
+
+    def test_groups(self):
+        data = open(data_file('fixed.dat'), 'rb').read()
+        reclen = data.index('\n') + 1
+        block = numpy.frombuffer(data, dtype=numpy.uint8).reshape(len(data) // reclen, reclen)
+        for keys in ('1.2', '1.2,3.5', '2.3', '3.5,1.2', '1.7', '1.2,20.10', '8.10,18.8'):
+            module = support.load_module(param_keys=keys)
+            for max_codes in (module.numpy_max_codes, 0):
+                module.numpy_max_codes = max_codes
+                group_keys, inv = module.numpy_group_keys(numpy, block, reclen)
+                records = [''.join([line[p1:p2] for (p1, p2) in module.param_keys])
+                           for line in data.splitlines(True)]
+                groups = [row.tostring() for row in group_keys]
+                self.assertEqual([groups[g] for g in inv], records, (keys, max_codes))
+                self.assertEqual(sorted(groups), sorted(set(records)), (keys, max_codes))
+
+
+class JobsTest(BaselineTest):
+    """-j: il file diviso in parti, aggregate da processi paralleli (con lo standard input
+       viene ignorato)"""
+
+    options = ['-j3']
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyJobsTest(BaselineTest):
+
+    options = ['--numpy', '-j2']
+
+
+class JobsSplitTest(support.TempDirTest):
+    """-j con file piccoli e senza l'ultimo fine riga: le parti iniziano e finiscono su un
+       fine riga, e ogni record viene aggregato una volta sola"""
+
+    def test_more_jobs_than_lines(self):
+        lines = open(data_file('fixed.dat'), 'rb').readlines()[:3]
+        filename = self.write('three.dat', ''.join(lines))
+        for jobs in ('-j2', '-j5', '-j16'):
+            self.assertEqual(self.check_run([jobs, '-k1.2', '-f8.10', filename]),
+                             self.check_run(['-k1.2', '-f8.10', filename]), jobs)
+
+    def test_no_final_newline(self):
+        data = open(data_file('fixed.dat'), 'rb').read()[:-1]
+        filename = self.write('nonl.dat', data)
+        for jobs in ('-j2', '-j7'):
+            self.assertEqual(self.check_run([jobs, '-k1.2,3.5', '-f8.10,18.8', filename]),
+                             self.check_run(['-k1.2,3.5', '-f8.10,18.8'], stdin=data), jobs)
+
+    def test_invalid(self):
+        self.check_error(['-j0', '-k1.2', data_file('fixed.dat')], "-j deve essere un numero")
+        self.check_error(['-jx', '-k1.2', data_file('fixed.dat')], "-j deve essere un numero")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""--build-cache e --cache: i totali calcolati dalla cache a colonne devono essere quelli
+della baseline sul file; la cache vale finche' il file non cambia (dimensione e data)"""
+
+import os, unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+mtime = 1500000000      # la data di modifica del file, uguale prima e dopo la modifica
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class CacheTest(support.TempDirTest):
+
+    options = []
+    build = ['-k1.7', '-f8.10,18.8']    # le chiavi di tutti i casi sono parti di 1.7
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.data = open(data_file('fixed.dat'), 'rb').read()
+        self.filename = self.write('input.dat', self.data)
+        os.utime(self.filename, (mtime, mtime))
+        self.cache = self.path('cache')
+        self.assertEqual(self.check_run(self.options + ['--build-cache=' + self.cache] + self.build +
+                                        [self.filename]), '')
+
+    def test_baseline(self):
+        for (name, args) in baseline_cases:
+            out = self.check_run(self.options + ['--cache=' + self.cache] + args + [self.filename])
+            self.assertEqual(out, expected(name), name)
+
+    def test_without_file(self):
+        out = self.check_run(self.options + ['--cache=' + self.cache, '-k1.2,3.5', '-f8.10,18.8'])
+        self.assertEqual(out, expected('two_keys_sums'))
+
+    def test_jobs_ignored(self):
+        out = self.check_run(self.options + ['-j3', '--cache=' + self.cache, '-k1.2', '-f8.10,18.8', self.filename])
+        self.assertEqual(out, expected('sums'))
+
+    def test_changed_file(self):
+        # un file con la stessa dimensione e data di modifica: vengono usati i totali della cache
+        args = self.options + ['--cache=' + self.cache, '-k1.2,3.5', '-f8.10,18.8', self.filename]
+        # una cifra del primo campo da sommare del primo record cambiata
+        self.write('input.dat', self.data[:10] + (self.data[10] == '9' and '1' or '9') + self.data[11:])
+        os.utime(self.filename, (mtime, mtime))
+        self.assertEqual(self.check_run(args), expected('two_keys_sums'))
+        # un file cresciuto: la cache non vale piu', e viene letto il file
+        self.write('input.dat', self.data + self.data)
+        out = self.check_run(args)
+        self.assertEqual(out, self.check_run(self.options + ['-k1.2,3.5', '-f8.10,18.8', self.filename]))
+        self.assertNotEqual(out, expected('two_keys_sums'))
+
+    def test_errors(self):
+        self.check_error(self.options + ['--cache=' + self.cache, '-k1.2', '-f8.10', '-w1.2=AL', self.filename],
+                         "parametri diversi")
+        self.check_error(self.options + ['--cache=' + self.path('missing'), '-k1.2', self.filename], "--cache")
+        self.check_error(self.options + ['--cache=' + self.cache, '--sorted', '-k1.2', self.filename], "incompatibili")
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class FieldsCacheTest(support.TempDirTest):
+
+    def test_missing_fields(self):
+        cache = self.path('cache')
+        self.check_run(['--build-cache=' + cache, '-k1.2,3.5', '-f8.10', data_file('fixed.dat')])
+        self.check_error(['--cache=' + cache, '-k2.3', data_file('fixed.dat')], "campi non presenti nella cache: 2.3")
+        self.check_error(['--cache=' + cache, '-k1.2', '-f18.8', data_file('fixed.dat')], "campi non presenti")
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class WhereCacheTest(CacheTest):
+    """la cache dei soli record di -w: con --cache va indicata la stessa condizione"""
+
+    options = ['-w8.10=..100000000000']
+
+    def test_baseline(self):
+        out = self.check_run(self.options + ['--cache=' + self.cache, '-k1.2,3.5', '-f8.10', self.filename])
+        self.assertEqual(out, self.check_run(self.options + ['-k1.2,3.5', '-f8.10', self.filename]))
+
+    def test_errors(self):
+        self.check_error(['--cache=' + self.cache, '-k1.2', self.filename], "parametri diversi")
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class FormatsCacheTest(support.TempDirTest):
+    """la cache di un file csv e di un file EBCDIC (chiavi convertite, campo packed)"""
+
+    def check_cache(self, options, data, translate):
+        filename = self.write('input.dat', data)
+        cache = self.path('cache')
+        self.check_run(options + ['--build-cache=' + cache] + translate(['-k1.2,3.5', '-f8.10,18.8']) + [filename])
+        cases = dict(baseline_cases)
+        for name in ('sums', 'two_keys_sums', 'pivot2', 'range', 'count'):
+            out = self.check_run(options + ['--cache=' + cache] + translate(cases[name]) + [filename])
+            self.assertEqual(out, expected(name), name)
+
+    def test_csv(self):
+        self.check_cache(['--csv'], support.csv_data(), support.translate_csv_args)
+
+    def test_ebcdic(self):
+        self.check_cache(['--reclen=%d' % support.mainframe_reclen, '--ebcdic'], support.mainframe_data(),
+                         lambda args: translate_args(args, support.mainframe_fields))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""Decodifica dei valori numerici Cobol (cobolnum): i valori zoned confrontati con la
+conversione originale (int() e l'ultimo carattere negativo), EBCDIC, packed e binari
+con le codifiche di support, e le versioni numpy con quelle per un valore"""
+
+import unittest, random
+
+import support
+import cobolnum
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def original_decode(number):
+    """la conversione della versione originale (check_numeric_values)"""
+    try:
+        return int(number)
+    except:
+        if not number: return 0
+        return int('-' + number[:-1] + cobolnum.cobol2num[number[-1]])
+
+def zoned_values():
+    """valori zoned: cifre, negativi di tutte le convenzioni, spazi e segni espliciti"""
+    rnd = random.Random(3)
+    values = ['0', '7', '00000', '0000000123', '', ' 12', '  0', '+15', '-15', '9' * 18, '9' * 25]
+    for c in sorted(cobolnum.cobol2num):
+        values += [c, '0' + c, '123' + c, '0000000' + c]
+    for i in range(500):
+        width = rnd.randint(1, 18)
+        value = ''.join([rnd.choice('0123456789') for j in range(width)])
+        if rnd.random() < 0.5:
+            value = value[:-1] + rnd.choice(sorted(cobolnum.cobol2num))
+        values.append(value)
+    return values
+
+
+class ZonedTest(unittest.TestCase):
+
+    def test_decode_zoned(self):
+        for value in zoned_values():
+            self.assertEqual(cobolnum.decode_zoned(value), original_decode(value), repr(value))
+
+    def test_decode_zoned_column(self):
+        values = zoned_values()
+        self.assertEqual(cobolnum.decode_zoned_column(values), map(original_decode, values))
+
+    def test_conventions(self):
+        # -0 ... -9 nelle tre convenzioni
+        for chars in ('pqrstuvwxy', '}JKLMNOPQR', 'AJKLMNOPQR'):
+            self.assertEqual([cobolnum.decode_zoned('12' + c) for c in chars], range(-120, -130, -1))
+
+    def test_invalid(self):
+        # come nella versione originale: un valore non numerico e' un errore
+        for value in ('12a', 'abc', '1 2'):
+            self.assertRaises((ValueError, KeyError), cobolnum.decode_zoned, value)
+
+
+class MainframeTest(unittest.TestCase):
+
+    values = [0, 1, -1, 9, -9, 10, -10, 123456, -123456, 99999999, -99999999, 2**31 - 1, -2**31]
+
+    def test_zoned_ebcdic(self):
+        for value in self.values:
+            self.assertEqual(cobolnum.decode_zoned_ebcdic(support.encode_zoned_ebcdic(value, 12)), value)
+        # segno F (senza segno) e valori con gli spazi EBCDIC iniziali
+        self.assertEqual(cobolnum.decode_zoned_ebcdic('\xf1\xf2\xf3'), 123)
+        self.assertEqual(cobolnum.decode_zoned_ebcdic('\x40\x40\xf1\xf2\xf3'), 123)
+        self.assertEqual(cobolnum.decode_zoned_ebcdic('\xf1\xf2\xb3'), -123)
+
+    def test_packed(self):
+        for value in self.values:
+            for width in (6, 9, 10):
+                self.assertEqual(cobolnum.decode_packed(support.encode_packed(value, width)), value)
+        self.assertEqual(cobolnum.decode_packed('\x12\x3f'), 123)          # segno F
+        self.assertEqual(cobolnum.decode_packed('\x12\x3b'), -123)         # segno B
+        self.assertEqual(cobolnum.decode_packed(''), 0)
+
+    def test_binary(self):
+        for value in self.values:
+            for width in (4, 8):
+                self.assertEqual(cobolnum.decode_binary(support.encode_binary(value, width)), value)
+        self.assertEqual(cobolnum.decode_binary('\xff\xfe'), -2)
+        self.assertEqual(cobolnum.decode_binary('\x7f\xff'), 32767)
+        self.assertEqual(cobolnum.decode_binary(''), 0)
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class MatrixTest(unittest.TestCase):
+    """le versioni *_matrix, su colonne di valori della stessa larghezza"""
+
+    def matrix(self, values):
+        width = len(values[0])
+        return numpy.frombuffer(''.join(values), dtype=numpy.uint8).reshape(len(values), width)
+
+    def check(self, values, decode_matrix, decode, *args):
+        by_width = {}
+        for value in values:
+            by_width.setdefault(len(value), []).append(value)
+        for (width, column) in sorted(by_width.items()):
+            result = decode_matrix(numpy, self.matrix(column), *args)
+            self.assertEqual([int(v) for v in result], map(decode, column), width)
+
+    def test_zoned(self):
+        values = [v for v in zoned_values() if v and not v.startswith('+')]
+        self.check(values, cobolnum.decode_zoned_matrix, cobolnum.decode_zoned, cobolnum.zoned_tables(numpy))
+
+    def test_zoned_ebcdic(self):
+        values = [support.encode_zoned_ebcdic(v, w) for v in MainframeTest.values for w in (12, 20)]
+        values.append('\x40\x40\xf1\xf2\xf3' + '\xf0' * 7)
+        self.check(values, cobolnum.decode_zoned_ebcdic_matrix, cobolnum.decode_zoned_ebcdic)
+
+    def test_packed(self):
+        values = [support.encode_packed(v, w) for v in MainframeTest.values for w in (6, 9, 10)]
+        values.append('\x00\x00\x00\x00\x12\x3f')              # segno F
+        self.check(values, cobolnum.decode_packed_matrix, cobolnum.decode_packed)
+
+    def test_binary(self):
+        values = [support.encode_binary(v, w) for v in MainframeTest.values for w in (4, 8)]
+        self.check(values, cobolnum.decode_binary_matrix, cobolnum.decode_binary)
+
+    def test_empty_column(self):
+        col = numpy.zeros((3, 0), dtype=numpy.uint8)
+        self.assertEqual(list(cobolnum.decode_zoned_matrix(numpy, col, cobolnum.zoned_tables(numpy))), [0, 0, 0])
+        self.assertEqual(list(cobolnum.decode_packed_matrix(numpy, col)), [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
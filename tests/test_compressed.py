@@ -0,0 +1,135 @@
+"""File compressi (gzip, bzip2, xz), riconosciuti dai primi byte (anche sullo standard input):
+l'output deve essere quello della baseline sul file non compresso, e un file troncato deve
+dare un errore"""
+
+import gzip, bz2, subprocess, unittest
+from distutils.spawn import find_executable
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class CompressedTest(support.TempDirTest):
+
+    format = 'gz'
+
+    def compress(self, name, data):
+        """scrive data compresso nel file name (senza estensione: conta solo il contenuto)"""
+        filename = self.path(name)
+        if self.format == 'gz':
+            out = gzip.GzipFile(filename, 'wb')
+            out.write(data)
+            out.close()
+        elif self.format == 'bz2':
+            self.write(name, bz2.compress(data))
+        else:
+            proc = subprocess.Popen(['xz', '-c'], stdin=subprocess.PIPE, stdout=open(filename, 'wb'))
+            proc.communicate(data)
+        return filename
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.data = open(data_file('fixed.dat'), 'rb').read()
+        self.filename = self.compress('fixed', self.data)
+
+    def test_baseline(self):
+        for (name, args) in baseline_cases:
+            self.assertEqual(self.check_run(args + [self.filename]), expected(name), name)
+
+    def test_options(self):
+        # -j viene ignorato; --numpy, -w e --report leggono il file decompresso
+        self.assertEqual(self.check_run(['-j3', '-k1.2,3.5', '-f8.10,18.8', self.filename]), expected('two_keys_sums'))
+        args = ['-k1.2,3.5', '-f8.10', '-w1.2=AL,NY']
+        self.assertEqual(self.check_run(args + [self.filename]), self.check_run(args, stdin=self.data))
+        out = self.path('report.out')
+        self.assertEqual(self.check_run(['--report=%s -k1.2 -f8.10,18.8' % out, self.filename]), '')
+        self.assertEqual(open(out, 'rb').read(), expected('sums'))
+        if numpy is not None:
+            self.assertEqual(self.check_run(['--numpy', '-k1.2', '-f8.10,18.8', self.filename]), expected('sums'))
+
+    def test_csv(self):
+        filename = self.compress('fixed_csv', support.csv_data())
+        self.assertEqual(self.check_run(['--csv', '-k1,2', '-f3,4', filename]), expected('two_keys_sums'))
+
+    def test_ebcdic(self):
+        filename = self.compress('fixed_ebc', support.mainframe_data())
+        args = translate_args(['-k1.2,3.5', '-f8.10,18.8'], support.mainframe_fields)
+        out = self.check_run(['--reclen=%d' % support.mainframe_reclen, '--ebcdic'] + args + [filename])
+        self.assertEqual(out, expected('two_keys_sums'))
+
+    def test_many_files(self):
+        # due meta' del file, compresse e no: gli stessi totali del file intero
+        lines = self.data.splitlines(True)
+        first = self.compress('first', ''.join(lines[:123]))
+        second = self.write('second', ''.join(lines[123:]))
+        for jobs in ('-j1', '-j2'):
+            self.assertEqual(self.check_run([jobs, '-k1.2,3.5', '-f8.10,18.8', first, second]),
+                             expected('two_keys_sums'), jobs)
+
+    def test_stdin(self):
+        data = open(self.filename, 'rb').read()
+        for (name, args) in baseline_cases[:5]:
+            self.assertEqual(self.check_run(args, stdin=data), expected(name), name)
+        self.assertEqual(self.check_run(['--sorted', '-k1.2', '-f8.10,18.8'],
+                                        stdin=open(self.compress('sorted', ''.join(sorted(self.data.splitlines(True)))),
+                                                   'rb').read()), expected('sums'))
+        self.check_error(['-k1.2', '-f8.10'], "decompressione", stdin=data[:len(data) // 2])
+
+    def test_truncated(self):
+        data = open(self.filename, 'rb').read()
+        filename = self.write('truncated', data[:len(data) // 2])
+        self.check_error(['-k1.2', '-f8.10', filename], "decompressione")
+
+
+class ConcatenatedGzipTest(support.TempDirTest):
+
+    def test_concatenated(self):
+        # piu' flussi gzip nello stesso file (gzip -c a b > ab.gz)
+        data = open(data_file('fixed.dat'), 'rb').read()
+        parts = []
+        for part in (data[:1300], data[1300:]):
+            filename = self.path('part')
+            out = gzip.GzipFile(filename, 'wb')
+            out.write(part)
+            out.close()
+            parts.append(open(filename, 'rb').read())
+        filename = self.write('concatenated', ''.join(parts))
+        self.assertEqual(self.check_run(['-k1.2,3.5', '-f8.10,18.8', filename]), expected('two_keys_sums'))
+
+
+class PlainStdinTest(support.TempDirTest):
+    """lo standard input non compresso: i primi byte letti per riconoscerne il formato (che
+       possono contenere piu' righe) vengono restituiti in testa ai dati"""
+
+    def test_short_lines(self):
+        csv, records = 'a;1\nbb;2\nc;3\nBZ;4\n', 'a;1\nb;2\nc;3\nBZh4'
+        for (args, data) in ((['--csv', '-k1', '-f2'], csv), (['--csv', '-k1', '-f2', '--sorted'], csv[:9]),
+                             (['-k1.1', '--reclen=4'], records)):
+            for end in (0, 4, 9, len(data)):
+                self.assertEqual(self.check_run(args, stdin=data[:end]),
+                                 self.check_run(args + [self.write('input', data[:end])]), (args, end))
+
+    def test_numpy(self):
+        if numpy is None: return
+        data = open(data_file('fixed.dat'), 'rb').read()
+        self.assertEqual(self.check_run(['--numpy', '-k1.2', '-f8.10,18.8'], stdin=data), expected('sums'))
+
+
+class Bzip2Test(CompressedTest):
+
+    format = 'bz2'
+
+
+@unittest.skipIf(find_executable('xz') is None, "comando xz non disponibile")
+class XzTest(CompressedTest):
+
+    format = 'xz'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""--csv: i totali di un file csv con le colonne di fixed.dat, anche in mezzo a molte
+altre colonne, tra virgolette e con altri separatori e fine riga, devono essere quelli
+della baseline su fixed.dat"""
+
+import unittest
+
+import support
+from support import baseline_cases, expected
+
+
+# le colonne (da 1) dei campi di fixed.dat nel file largo
+columns = {'1.2': 5, '3.5': 21, '8.10': 40, '18.8': 58}
+width = 60
+
+def csv_cases():
+    return [(name, args) for (name, args) in baseline_cases if name != 'part_of_key']
+
+
+class CsvTest(support.TempDirTest):
+    """fast path: righe senza virgolette, divise solo fino all'ultima colonna usata"""
+
+    options = ['--csv']
+    delim = ';'
+    eol = '\n'
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.data = ''.join([self.line(self.row(i, record)) for (i, record) in enumerate(support.fixed_records())])
+        self.filename = self.write('wide.csv', self.data)
+
+    def row(self, n, record):
+        """i campi della riga n: record nelle colonne di columns, gli altri di riempimento"""
+        row = ['c%d.%d' % (n, col) for col in range(width)]
+        for (field, value) in zip(('1.2', '3.5', '8.10', '18.8'), record):
+            row[columns[field] - 1] = value
+        return row
+
+    def line(self, row):
+        return self.delim.join(row) + self.eol
+
+    def args(self, args):
+        ret = []
+        for arg in args:
+            if arg[:2] in ('-k', '-f'):
+                arg = arg[:2] + ','.join([str(columns[f]) for f in arg[2:].split(',')])
+            ret.append(arg)
+        return ret
+
+    def test_baseline(self):
+        for (name, args) in csv_cases():
+            self.assertEqual(self.check_run(self.options + self.args(args) + [self.filename]), expected(name), name)
+
+    def test_stdin(self):
+        for (name, args) in csv_cases():
+            self.assertEqual(self.check_run(self.options + self.args(args), stdin=self.data), expected(name), name)
+
+    def test_jobs(self):
+        for (name, args) in csv_cases():
+            self.assertEqual(self.check_run(['-j3'] + self.options + self.args(args) + [self.filename]),
+                             expected(name), name)
+
+
+class DelimTest(CsvTest):
+
+    options = ['-d,']
+    delim = ','
+
+    def test_multichar(self):
+        # le righe con le virgolette vengono lette dal modulo csv: un solo carattere
+        self.check_error(['-d,,', '-k1', '-f2', self.filename], "il separatore deve essere un solo carattere")
+
+
+class CrlfTest(CsvTest):
+
+    eol = '\r\n'
+
+
+class QuotedTest(CsvTest):
+    """tutte le righe tra virgolette: il file viene letto dal modulo csv"""
+
+    def line(self, row):
+        return ';'.join(['"%s"' % value for value in row]) + self.eol
+
+
+class MixedTest(CsvTest):
+    """alcune righe con un campo tra virgolette che contiene il separatore o un fine riga:
+       solo quelle righe vengono lette dal modulo csv"""
+
+    def row(self, n, record):
+        row = CsvTest.row(self, n, record)
+        if n % 7 == 0:
+            row[9] = '"a;b"'
+        elif n % 7 == 3:
+            row[width - 1] = '"fine\nriga;""x"""'     # l'ultima colonna, dopo quelle usate
+        elif n % 7 == 5:
+            row[30] = '"fine\r\nriga"'
+        return row
+
+    def test_jobs_quoted_newlines(self):
+        # con piu' processi i confini delle parti cadrebbero anche dentro le virgolette
+        args = self.options + self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        for jobs in range(2, 33):
+            self.assertEqual(self.check_run(['-j%d' % jobs] + args + [self.filename]),
+                             expected('two_keys_sums'), jobs)
+
+
+class LastFieldTest(support.TempDirTest):
+    """il fine riga viene tolto una sola volta dall'ultimo campo (che arriva al fine riga)"""
+
+    def test_one_terminator(self):
+        lines = ['x;1;A\n'] * 10 + ['x;2;K\r\n', 'x;4;"K\r"\r\n', 'x;8;K\r\r\n', 'x;16;"K\n"\n']
+        out = self.check_run(['--csv', '-k3', '-f2', '-C', '--output_delim=|'], stdin=''.join(lines))
+        self.assertEqual(out, 'key|sum1|recs\nA|10|10\nK|2|1\nK\n|16|1\nK\r|12|2\n\ntotal|40|14\n')
+
+    def test_no_final_newline(self):
+        for data in ('x;1;K', 'x;1;K\r', 'x;1;K\n', 'x;1;K\r\n'):
+            out = self.check_run(['--csv', '-k3', '-f2', '-C', '--output_delim=|'], stdin=data)
+            self.assertEqual(out, 'key|sum1|recs\nK|1|1\n\ntotal|1|1\n', repr(data))
+
+    def test_empty_lines(self):
+        out = self.check_run(['--csv', '-k1', '-f2', '-C', '--output_delim=|'], stdin='A;1\n\nA;2\r\n\r\n')
+        self.assertEqual(out, 'key|sum1|recs\nA|3|2\n\ntotal|3|2\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""-u e --topk: la stima dei valori distinti (HyperLogLog) e dei valori piu' frequenti
+(Space-Saving) per gruppo. Un valore con un peso maggiore di W/M deve essere sempre tra
+quelli stampati, ogni peso stampato deve essere sovrastimato al massimo di W/M, e -j deve
+dare le stesse stime (i valori distinti) o stime entro lo stesso errore (--topk)"""
+
+import math, random, unittest
+
+import support
+import cobolnum
+
+
+def make_records(n=30000, seed=5):
+    """(gruppo, valore, importo): in ogni gruppo HEAVY e' il 10% dei record, LARGE ha un
+       importo molto maggiore degli altri, gli altri valori sono presi tra 8000"""
+    rnd = random.Random(seed)
+    records = []
+    for i in range(n):
+        group = 'G%d' % (i % 2)
+        if i % 10 in (3, 4):
+            value, amount = 'HEAVY', rnd.randrange(1000)
+        elif i % 500 in (7, 8):
+            value, amount = 'LARGE', 9000000
+        else:
+            value, amount = 'V%04d' % rnd.randrange(8000), rnd.randrange(1000)
+        records.append((group, value, amount))
+    return records
+
+def parse_top(cell):
+    """'valore=peso ...' -> [(valore, peso)...]"""
+    return [(item, int(count)) for (item, count) in [pair.split('=') for pair in cell.split()]]
+
+
+class DistinctTest(support.TempDirTest):
+
+    options = []
+    key, value, amount = '-k1.2', '-u3.5', '-f8.10'
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.records = make_records()
+        self.data = self.encode(self.records)
+        self.filename = self.write('input.dat', self.data)
+
+    def encode(self, records):
+        return ''.join(['%s%-5s%010d\n' % r for r in records])
+
+    def run_file(self, args):
+        return self.check_run(args + [self.filename])
+
+    def run_top(self, args, jobs=None):
+        """{gruppo: (valori distinti, [(valore, peso)...])} dall'output csv (-C: pesi interi)"""
+        args = self.options + [self.key, self.value, '-C', '--output_csv'] + args
+        if jobs: args = ['-j%d' % jobs] + args
+        lines = self.run_file(args).splitlines()
+        header = lines[0].split(';')
+        rows = {}
+        for line in lines[1:]:
+            if not line: continue
+            cells = dict(zip(header, line.split(';')))
+            rows[cells['key']] = (int(cells['dist1']), parse_top(cells.get('top1', '')))
+        return rows
+
+    def weights(self, weighted):
+        """{gruppo: {valore: peso esatto}} e il totale generale ('total')"""
+        exact = {}
+        for (group, value, amount) in self.records:
+            for key in (group, 'total'):
+                counts = exact.setdefault(key, {})
+                counts[value] = counts.get(value, 0) + (amount if weighted else 1)
+        return exact
+
+    def check_bound(self, rows, weighted, topk, error):
+        exact = self.weights(weighted)
+        counters = max(topk, int(math.ceil(1 / error)))
+        for (group, (distinct, top)) in rows.items():
+            total = sum(exact[group].values())
+            bound = total / float(counters)
+            self.assertEqual(len(top), topk, (group, top))
+            for (item, count) in top:
+                self.assertTrue(exact[group][item] <= count <= exact[group][item] + bound, (group, item, count))
+            # i valori di peso maggiore di W/M tra i primi topk sono stampati
+            heavy = [item for (item, w) in exact[group].items() if w > bound]
+            printed = [item for (item, count) in top]
+            for item in sorted(heavy, key=lambda item: -exact[group][item])[:topk]:
+                self.assertIn(item, printed, (group, item, top))
+        return rows
+
+    def test_heavy_hitter(self):
+        for topk in (1, 3, 5):
+            rows = self.check_bound(self.run_top(['--topk=%d' % topk]), 0, topk, 0.01)
+            for (group, (distinct, top)) in rows.items():
+                self.assertEqual(top[0][0], 'HEAVY', (topk, group, top))
+
+    def test_weighted(self):
+        for topk in (1, 3):
+            rows = self.check_bound(self.run_top([self.amount, '--topk=%d' % topk]), 1, topk, 0.01)
+            for (group, (distinct, top)) in rows.items():
+                self.assertEqual(top[0][0], 'LARGE', (group, top))
+
+    def test_error(self):
+        for error in (0.002, 0.05, 0.2):
+            self.check_bound(self.run_top(['--topk=3', '--topk-error=%s' % error]), 0, 3, error)
+
+    def test_jobs(self):
+        for topk in (3, 5):
+            single = self.check_bound(self.run_top(['--topk=%d' % topk]), 0, topk, 0.01)
+            for jobs in (2, 4):
+                parallel = self.check_bound(self.run_top(['--topk=%d' % topk], jobs), 0, topk, 0.01)
+                self.assertEqual(sorted(parallel), sorted(single))
+                for group in single:
+                    # i valori distinti sono gli stessi (HyperLogLog si fonde senza errore)
+                    self.assertEqual(parallel[group][0], single[group][0])
+                    self.assertEqual(parallel[group][1][0], single[group][1][0])
+
+    def test_distinct(self):
+        rows = self.run_top([])
+        for (group, counts) in self.weights(0).items():
+            estimate = rows[group][0]
+            self.assertTrue(abs(estimate - len(counts)) < 0.1 * len(counts), (group, estimate, len(counts)))
+
+    def test_errors(self):
+        base = self.options + [self.key]
+        self.check_error(base + ['--topk=3', self.filename], "--topk: manca il parametro -u")
+        self.check_error(base + [self.value, '--topk=0', self.filename], "--topk deve essere un numero")
+        for error in ('0', '1', 'x', '-0.1'):
+            self.check_error(base + [self.value, '--topk=3', '--topk-error=' + error, self.filename],
+                             "--topk-error deve essere")
+        self.check_error(base + [self.value, '--topk-error=0.1', self.filename],
+                         "--topk-error: manca il parametro --topk")
+
+    def test_help(self):
+        status, out, err = support.run(['-h'])
+        self.assertEqual(status, 0, err)
+        self.assertIn('--topk-error=E', err)
+
+
+class StdinDistinctTest(DistinctTest):
+
+    """con lo standard input -j viene ignorato"""
+
+    def run_file(self, args):
+        return self.check_run(args, stdin=self.data)
+
+
+class CsvDistinctTest(DistinctTest):
+
+    options = ['--csv']
+    key, value, amount = '-k1', '-u2', '-f3'
+
+    def encode(self, records):
+        return ''.join(['%s;%s;%d\n' % r for r in records])
+
+
+class EbcdicDistinctTest(DistinctTest):
+    """record EBCDIC senza fine riga, con l'importo zoned EBCDIC"""
+
+    options = ['--reclen=17', '--ebcdic']
+
+    def encode(self, records):
+        return ''.join([('%s%-5s' % (group, value)).translate(cobolnum.ascii2ebcdic) +
+                        support.encode_zoned_ebcdic(amount, 10) for (group, value, amount) in records])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Piu' file di input e pattern glob: i totali complessivi devono essere quelli della
+baseline sul file intero; con --per-file le righe di ogni file quelle del file da solo"""
+
+import os, unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+
+class FilesTest(support.TempDirTest):
+
+    options = []
+    parts = (0, 37, 100, 101, 250, 400)     # fixed.dat diviso in 5 file (uno con una sola riga)
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.lines = self.records()
+        self.files = []
+        for (i, (start, end)) in enumerate(zip(self.parts[:-1], self.parts[1:])):
+            self.files.append(self.write('part%d.dat' % i, ''.join(self.lines[start:end])))
+
+    def records(self):
+        return open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+
+    def args(self, args):
+        return args
+
+    def test_baseline(self):
+        for (name, args) in baseline_cases:
+            args = self.args(args)
+            if args is None: continue
+            self.assertEqual(self.check_run(self.options + args + self.files), expected(name), name)
+
+    def test_glob(self):
+        # il pattern viene espanso in ordine alfabetico, anche insieme a un file indicato per nome
+        out = self.check_run(self.options + self.args(['-k1.2,3.5', '-f8.10,18.8']) + [self.path('part*.dat')])
+        self.assertEqual(out, expected('two_keys_sums'))
+        out = self.check_run(self.options + self.args(['-k1.2', '-f8.10,18.8']) +
+                             [self.path('part[0-2].dat'), self.files[3], self.path('part4*')])
+        self.assertEqual(out, expected('sums'))
+
+    def test_per_file(self):
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8', '--output_csv', '-H'])
+        rows = self.check_run(self.options + ['--per-file'] + args + self.files).splitlines()
+        expected_rows = []
+        for filename in self.files:
+            for row in self.check_run(self.options + args + [filename]).splitlines()[:-2]:
+                expected_rows.append(filename + ' ' + row)
+        self.assertEqual(rows[:-2], expected_rows)
+        self.assertEqual(rows[-1].split(';')[-1], str(len(self.lines)))
+
+    def test_per_file_pivot(self):
+        # con -P, N indica sempre la Nma chiave -k: le righe di ogni file sono quelle del file da solo
+        for pivot in (['-P1', '-f8.10'], ['-P2', '-R']):
+            args = self.args(['-k1.2,3.5'] + pivot + ['--output_csv'])
+            rows = self.check_run(self.options + ['--per-file'] + args + self.files).splitlines()
+            for filename in self.files:
+                alone = self.check_run(self.options + args + [filename]).splitlines()
+                mine = [row[len(filename) + 1:] for row in rows if row.startswith(filename + ' ')]
+                self.assertTrue(mine)
+                for row in mine:
+                    self.assertIn(row.split(';')[0], [r.split(';')[0] for r in alone])
+
+    def test_per_file_rollup(self):
+        args = self.args(['-k1.2', '-f8.10', '--rollup', '--output_csv', '-H'])
+        rows = self.check_run(self.options + ['--per-file'] + args + self.files[:2]).splitlines()
+        alone = self.check_run(self.options + self.args(['-k1.2', '-f8.10', '--output_csv', '-H']) + [self.files[0]])
+        subtotal = [row for row in rows if row.startswith(self.files[0] + ' *;')]
+        self.assertEqual(len(subtotal), 1)
+        self.assertEqual(subtotal[0].split(';')[1:], alone.splitlines()[-1].split(';')[1:])
+
+    def test_errors(self):
+        self.check_error(self.options + self.args(['-k1.2']) + [self.files[0], self.path('missing.dat')], "non esiste")
+        self.check_error(self.options + self.args(['-k1.2']) + [self.path('nothing*.dat')], "nessun file corrisponde")
+        self.check_error(self.options + self.args(['-k1.2', '--state=' + self.path('s')]) + self.files, "un solo file di input")
+        self.check_error(self.options + self.args(['-k1.2', '--per-file', '--max_mem=10']) + self.files, "--max_mem")
+
+
+class JobsFilesTest(FilesTest):
+
+    options = ['-j3']
+
+
+class CsvFilesTest(FilesTest):
+
+    options = ['--csv']
+
+    def records(self):
+        return support.csv_lines()
+
+    def args(self, args):
+        return support.translate_csv_args(args)
+
+
+class EbcdicFilesTest(FilesTest):
+
+    options = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+
+    def records(self):
+        return support.mainframe_records()
+
+    def args(self, args):
+        return translate_args(args, support.mainframe_fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
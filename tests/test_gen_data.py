@@ -0,0 +1,100 @@
+"""benchmarks/gen_data.py e bench_suite.py: i file generati sono deterministici, con le
+cardinalita' e i negativi richiesti, e il file csv ha gli stessi totali di quello a
+larghezza fissa"""
+
+import os, sys, json, subprocess, unittest
+
+import support
+from support import root
+
+benchmarks = os.path.join(root, 'benchmarks')
+sys.path.insert(0, benchmarks)
+import gen_data
+from cobolnum import cobol2num
+
+
+def generate(records, cards, num_sums=2, width=10, neg_ratio=0.1, seed=1, delim=None):
+    import StringIO
+    out = StringIO.StringIO()
+    gen_data.generate(out, records, cards, num_sums, width, neg_ratio, seed, delim)
+    return out.getvalue()
+
+
+class GenDataTest(support.TempDirTest):
+
+    def test_deterministic(self):
+        self.assertEqual(generate(2000, [5, 7]), generate(2000, [5, 7]))
+        self.assertNotEqual(generate(2000, [5, 7]), generate(2000, [5, 7], seed=2))
+        # il programma scrive lo stesso file della funzione, e le opzioni di count_totals.py
+        filename = self.path('gen.dat')
+        proc = subprocess.Popen([sys.executable, os.path.join(benchmarks, 'gen_data.py'), '-n2000', '-k5,7',
+                                 '-o', filename], stderr=subprocess.PIPE)
+        err = proc.communicate()[1]
+        self.assertEqual(proc.returncode, 0, err)
+        self.assertEqual(open(filename, 'rb').read(), generate(2000, [5, 7]))
+        self.assertEqual(err, '-k1.2,3.2 -f5.10,15.10\n')
+
+    def test_layout(self):
+        data = generate(5000, [3, 120, 11], num_sums=3, width=8)
+        keys, sums = gen_data.layout([3, 120, 11], 3, 8)
+        self.assertEqual((keys, sums), ('1.2,3.4,7.3', '10.8,18.8,26.8'))
+        lines = data.splitlines()
+        self.assertEqual(len(lines), 5000)
+        self.assertEqual(set(map(len, lines)), set([33]))
+        # le cardinalita' delle chiavi
+        for (field, card) in zip(keys.split(','), (3, 120, 11)):
+            pos, length = map(int, field.split('.'))
+            self.assertEqual(len(set([line[pos-1:pos-1+length] for line in lines])), card, field)
+
+    def test_negatives(self):
+        def negatives(data):
+            return [line[-1] for line in data.splitlines() if not line[-1].isdigit()]
+        self.assertEqual(negatives(generate(3000, [4], num_sums=1, neg_ratio=0)), [])
+        self.assertEqual(len(negatives(generate(3000, [4], num_sums=1, neg_ratio=1))), 3000)
+        found = negatives(generate(20000, [4], num_sums=1, neg_ratio=0.25))
+        self.assertTrue(4500 < len(found) < 5500, len(found))
+        # i caratteri negativi di tutte le convenzioni di cobolnum
+        self.assertEqual(set(found), set([c for c in cobol2num if not c.isdigit() and c != ' ']))
+
+    def test_csv_totals(self):
+        # il file csv ha gli stessi valori: i totali sono quelli del file a larghezza fissa
+        cards = [6, 9]
+        fixed = self.write('gen.dat', generate(3000, cards, num_sums=2, width=12, neg_ratio=0.3))
+        csv = self.write('gen.csv', generate(3000, cards, num_sums=2, width=12, neg_ratio=0.3, delim=','))
+        fixed_keys, fixed_sums = gen_data.layout(cards, 2, 12)
+        csv_keys, csv_sums = gen_data.layout(cards, 2, 12, ',')
+        # (opzioni, campi da sommare): con -P un solo campo, con -R nessuno
+        for (args, num) in (([], 2), (['-T', '--output_csv'], 2), (['-P2'], 1), (['-P2', '-R'], 0)):
+            fsum = num and ['-f' + ','.join(fixed_sums.split(',')[:num])] or []
+            csum = num and ['-f' + ','.join(csv_sums.split(',')[:num])] or []
+            self.assertEqual(self.check_run(['-k' + fixed_keys] + fsum + args + [fixed]),
+                             self.check_run(['-d,', '-k' + csv_keys] + csum + args + [csv]), args)
+
+class BenchSuiteTest(support.TempDirTest):
+
+    def test_report(self):
+        report = self.path('report.json')
+        proc = subprocess.Popen([sys.executable, os.path.join(benchmarks, 'bench_suite.py'), '-s300,1000',
+                                 '-k4,5', '-d', self.path('data'), '-o', report,
+                                 'totali', 'csv', 'pivot', 'csv_pivot', 'range'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        self.assertEqual(proc.returncode, 0, err)
+        results = json.load(open(report))['results']
+        self.assertEqual([(r['scenario'], r['records']) for r in results],
+                         [(name, records) for records in (300, 1000)
+                          for name in ('totali', 'pivot', 'range', 'csv', 'csv_pivot')])
+        for r in results:
+            self.assertNotIn('error', r)
+            self.assertTrue(r['records_per_sec'] > 0 and r['peak_rss_kb'] > 0, r)
+        # a parita' di scala i file fixed e csv danno lo stesso output
+        md5 = dict([((r['scenario'], r['records']), r['output_md5']) for r in results])
+        for records in (300, 1000):
+            self.assertEqual(md5['totali', records], md5['csv', records])
+            self.assertEqual(md5['pivot', records], md5['csv_pivot', records])
+        # i file generati restano nella directory (-d)
+        self.assertEqual(len(os.listdir(self.path('data'))), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
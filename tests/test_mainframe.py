@@ -0,0 +1,109 @@
+"""File dal mainframe: record di lunghezza fissa senza fine riga (--reclen), EBCDIC
+(--ebcdic), campi packed (COMP-3) e binari (COMP). I file vengono creati dai record di
+fixed.dat, e l'output deve essere quello della baseline su fixed.dat"""
+
+import unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ReclenTest(support.TempDirTest):
+    """fixed.dat senza i fine riga, con --reclen"""
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        data = open(data_file('fixed.dat'), 'rb').read().replace('\n', '')
+        self.filename = self.write('fixed.rec', data)
+
+    def test_baseline(self):
+        for (name, args) in baseline_cases:
+            out = self.check_run(self.options + ['--reclen=25'] + args + [self.filename])
+            self.assertEqual(out, expected(name), name)
+
+    def test_stdin(self):
+        data = open(self.filename, 'rb').read()
+        out = self.check_run(self.options + ['--reclen=25', '-k1.2,3.5', '-f8.10,18.8'], stdin=data)
+        self.assertEqual(out, expected('two_keys_sums'))
+
+    def test_incomplete_record(self):
+        # un ultimo record incompleto viene aggregato con i campi troncati, come una riga corta
+        data = open(self.filename, 'rb').read() + 'AL00012'
+        filename = self.write('incomplete.rec', data)
+        lines = open(data_file('fixed.dat'), 'rb').read() + 'AL00012'
+        self.assertEqual(self.check_run(self.options + ['--reclen=25', '-k1.2,3.5', '-f8.10', filename]),
+                         self.check_run(['-k1.2,3.5', '-f8.10'], stdin=lines))
+
+
+class EbcdicTest(support.TempDirTest):
+    """il file EBCDIC di support.mainframe_data: zoned EBCDIC, packed e binario"""
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.filename = self.write('fixed.ebc', support.mainframe_data())
+        self.mainframe = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+
+    def test_zoned_packed(self):
+        for (name, args) in baseline_cases:
+            args = translate_args(args, support.mainframe_fields)
+            out = self.check_run(self.options + self.mainframe + args + [self.filename])
+            self.assertEqual(out, expected(name), name)
+
+    def test_binary(self):
+        for (name, args) in baseline_cases:
+            args = translate_args(args, support.binary_fields)
+            out = self.check_run(self.options + self.mainframe + args + [self.filename])
+            self.assertEqual(out, expected(name), name)
+
+    def test_stdin(self):
+        data = open(self.filename, 'rb').read()
+        out = self.check_run(self.options + self.mainframe + ['-k1.2,3.5', '-f23.4:b,18.5:p3'], stdin=data)
+        self.assertEqual(out, expected('two_keys_sums'))
+
+
+class JobsReclenTest(ReclenTest):
+
+    options = ['-j3']
+
+
+class JobsEbcdicTest(EbcdicTest):
+
+    options = ['-j3']
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyReclenTest(ReclenTest):
+
+    options = ['--numpy']
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyEbcdicTest(EbcdicTest):
+
+    options = ['--numpy']
+
+
+class ErrorsTest(support.CountTotalsTest):
+
+    def test_invalid_type(self):
+        self.check_error(['-k1.2', '-f8.10:x', data_file('fixed.dat')], "tipo di campo non valido")
+
+    def test_csv(self):
+        self.check_error(['--csv', '-k1', '-f2:p', data_file('fixed.dat')], "solo a larghezza fissa")
+        self.check_error(['--csv', '--ebcdic', '-k1', data_file('fixed.dat')], "solo a larghezza fissa")
+
+    def test_reclen(self):
+        self.check_error(['--reclen=0', '-k1.2', data_file('fixed.dat')], "--reclen deve essere un numero")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""--max_mem: i totali scaricati su disco in run ordinati e fusi durante la stampa devono
+dare lo stesso output dei totali in memoria; i run vengono cancellati alla fine, anche
+dopo un errore o un'interruzione (Ctrl-C)"""
+
+import os, sys, json, time, random, signal, subprocess, unittest
+
+import support
+from support import data_file
+
+
+def many_keys(records=30000, seed=5):
+    """record con chiavi (1.8) quasi tutte diverse, e un campo zoned (9.6)"""
+    rnd = random.Random(seed)
+    lines = []
+    for i in xrange(records):
+        value = '%06d' % rnd.randint(0, 999999)
+        if rnd.random() < 0.2: value = value[:-1] + 'p'
+        lines.append('%08d%s\n' % (rnd.randint(0, 10**8 - 1), value))
+    return ''.join(lines)
+
+
+class SpillTest(support.TempDirTest):
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.spill = self.path('spill')
+        os.mkdir(self.spill)
+        self.env = {'TMPDIR': self.spill}
+
+    def run_spill(self, args, stdin=''):
+        """l'output con --max_mem=1 (e il numero dei run), verificando che i run siano stati cancellati"""
+        stats = self.path('stats.json')
+        status, out, err = support.run(['--max_mem=1', '--stats-file=' + stats] + args, stdin, self.env)
+        self.assertEqual(status, 0, err)
+        self.assertEqual(os.listdir(self.spill), [])
+        return out, json.load(open(stats))['spilled_runs']
+
+    def test_same_output(self):
+        filename = self.write('keys.dat', many_keys())
+        for args in (['-k1.8', '-f9.6'], ['-k1.8', '-f9.6', '--output_csv'], ['-k1.4,5.4', '-f9.6', '-C'],
+                     ['-k1.8'], ['-k1.3,5.4', '-f9.6', '--rollup']):
+            out, runs = self.run_spill(args + [filename])
+            self.assertTrue(runs > 1, args)
+            self.assertEqual(out, self.check_run(args + [filename]), args)
+
+    def test_stdin_and_csv(self):
+        data = many_keys()
+        out, runs = self.run_spill(['-k1.8', '-f9.6'], stdin=data)
+        self.assertTrue(runs > 1)
+        self.assertEqual(out, self.check_run(['-k1.8', '-f9.6'], stdin=data))
+        csv = ''.join(['%s;%s\n' % (line[:8], line[8:]) for line in data.splitlines()])
+        out, runs = self.run_spill(['--csv', '-k1', '-f2'], stdin=csv)
+        self.assertTrue(runs > 1)
+        self.assertEqual(out, self.check_run(['--csv', '-k1', '-f2'], stdin=csv))
+
+    def test_ebcdic(self):
+        # l'ordine delle righe e' quello delle chiavi convertite in ASCII, anche tra run diversi
+        data = many_keys()
+        ebcdic = ''.join([line[:8].translate(support.cobolnum.ascii2ebcdic) +
+                          support.encode_packed(support.cobolnum.decode_zoned(line[8:14]), 4)
+                          for line in data.splitlines()])
+        filename = self.write('keys.ebc', ebcdic)
+        out, runs = self.run_spill(['--reclen=12', '--ebcdic', '-k1.8', '-f9.4:p', filename])
+        self.assertTrue(runs > 1)
+        self.assertEqual(out, self.check_run(['-k1.8', '-f9.6'], stdin=data))
+
+    def test_baseline(self):
+        # pochi gruppi: nessun run, stesso output della baseline
+        out, runs = self.run_spill(['-k1.2,3.5', '-f8.10,18.8', data_file('fixed.dat')])
+        self.assertEqual(runs, 0)
+        self.assertEqual(out, support.expected('two_keys_sums'))
+
+    def test_error_removes_runs(self):
+        # un valore non numerico dopo i primi run: l'elaborazione termina con un errore
+        data = many_keys() + '99999999abcdef\n'
+        status, out, err = support.run(['--max_mem=1', '-k1.8', '-f9.6'], data, self.env)
+        self.assertNotEqual(status, 0)
+        self.assertEqual(os.listdir(self.spill), [])
+
+    def test_interrupt_removes_runs(self):
+        # Ctrl-C mentre il programma aspetta altri dati dallo standard input, con i run gia' scritti
+        env = dict(os.environ, **self.env)
+        proc = subprocess.Popen([sys.executable, support.count_totals, '--max_mem=1', '-k1.8', '-f9.6'],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        proc.stdin.write(many_keys())
+        proc.stdin.flush()
+        deadline = time.time() + 30
+        while not os.listdir(self.spill) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(os.listdir(self.spill))
+        proc.send_signal(signal.SIGINT)
+        proc.communicate()
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertEqual(os.listdir(self.spill), [])
+
+    def test_incompatible(self):
+        for args in (['-P1'], ['-P1', '-R'], ['-j2']):
+            self.check_error(['--max_mem=1', '-k1.2,3.5'] + args + [data_file('fixed.dat')],
+                             "--max_mem incompatibile")
+
+
+if __name__ == '__main__':
+    unittest.main()
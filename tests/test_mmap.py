@@ -0,0 +1,69 @@
+"""Lettura dei file regolari tramite mmap (aggregate_file): finestre piccole, righe piu'
+lunghe della finestra, righe corte e chiavi non contigue, confrontate con la lettura
+riga per riga"""
+
+import unittest
+
+import support
+from support import data_file
+
+
+class WindowTest(support.TempDirTest):
+
+    def totals(self, module, filename, start=0, end=None):
+        import os
+        totals = module.new_totals()
+        if end is None: end = os.path.getsize(filename)
+        module.aggregate_file(filename, start, end, totals)
+        return sorted(totals.items())
+
+    def line_totals(self, module, data):
+        totals = module.new_totals()
+        module.aggregate_lines(data.splitlines(True), totals)
+        return sorted(totals.items())
+
+    def test_small_windows(self):
+        module = support.load_module(param_keys='1.2,3.5', param_sums='8.10,18.8')
+        data = open(data_file('fixed.dat'), 'rb').read()
+        expected = self.line_totals(module, data)
+        for window in (26, 100, 4096, 5000):
+            module.mmap_window = window
+            self.assertEqual(self.totals(module, data_file('fixed.dat')), expected, window)
+
+    def test_long_line(self):
+        # una riga piu' lunga della finestra: la finestra viene raddoppiata
+        module = support.load_module(param_keys='1.2', param_sums='8.10')
+        lines = open(data_file('fixed.dat'), 'rb').readlines()
+        lines[100] = lines[100][:-1] + 'x' * 10000 + '\n'
+        filename = self.write('long.dat', ''.join(lines))
+        module.mmap_window = 4096
+        self.assertEqual(self.totals(module, filename), self.line_totals(module, ''.join(lines)))
+
+    def test_range(self):
+        # un intervallo di byte: solo i record compresi (come per le parti di -j)
+        module = support.load_module(param_keys='1.2', param_sums='18.8')
+        data = open(data_file('fixed.dat'), 'rb').read()
+        start, end = 26*10, 26*300
+        module.mmap_window = 1000
+        self.assertEqual(self.totals(module, data_file('fixed.dat'), start, end),
+                         self.line_totals(module, data[start:end]))
+
+
+class ShortLinesTest(support.TempDirTest):
+    """righe piu' corte dei campi (troncati al fine riga), righe vuote, \\r\\n e chiavi non
+       contigue: il file regolare (mmap) deve dare lo stesso output dello standard input"""
+
+    def test_short_lines(self):
+        lines = open(data_file('fixed.dat'), 'rb').readlines()
+        lines[5] = lines[5][:4] + '\n'
+        lines[6] = '\n'
+        lines[7] = lines[7][:12] + '\n'
+        lines[8] = lines[8][:-1] + '\r\n'
+        data = ''.join(lines) + lines[9][:-1]
+        filename = self.write('short.dat', data)
+        for args in (['-k1.2,3.5', '-f8.10,18.8'], ['-k1.2,8.3', '-f18.8'], ['-k3.5,1.2'], ['-f8.10']):
+            self.assertEqual(self.check_run(args + [filename]), self.check_run(args, stdin=data), args)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tabelle pivot (-P) e range (-R) con molte colonne: ogni cella deve essere il totale
+della coppia di chiavi (lo stesso della tabella senza pivot), le colonne in ordine, e
+min/max quelli delle chiavi del file"""
+
+import random, unittest
+
+import support
+
+
+def pivot_data(records=4000, columns=600, seed=8):
+    """record con la chiave di riga (1.3), la chiave di pivot (4.5, molti valori) e un valore zoned (9.8)"""
+    rnd = random.Random(seed)
+    lines = []
+    for i in xrange(records):
+        value = '%08d' % rnd.randint(0, 99999999)
+        if rnd.random() < 0.3: value = value[:-1] + 'pqrstuvwxy'[int(value[-1])]
+        lines.append('R%02d%05d%s\n' % (rnd.randint(0, 29), rnd.randint(0, columns - 1) * 7, value))
+    return ''.join(lines)
+
+def csv_table(out):
+    """le righe di un output --output_csv: [celle...]"""
+    return [line.split(';') for line in out.splitlines() if line]
+
+
+class PivotTest(support.TempDirTest):
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.data = pivot_data()
+        self.filename = self.write('pivot.dat', self.data)
+
+    def totals(self, args):
+        """i totali della tabella senza pivot: (chiave1, chiave2) -> [sum1, recs]"""
+        rows = csv_table(self.check_run(['-k1.3,4.5', '--output_csv'] + args + [self.filename]))
+        return dict([((row[0].split()[0], row[0].split()[1]), row[1:]) for row in rows[1:-1]])
+
+    def test_pivot(self):
+        totals = self.totals(['-f9.8'])
+        for (n, row_key, col_key) in ((2, 0, 1), (1, 1, 0)):
+            table = csv_table(self.check_run(self.options + ['-k1.3,4.5', '-P%d' % n, '-f9.8', '--output_csv', self.filename]))
+            header = table[0]
+            columns = header[1:-2]
+            self.assertEqual(columns, sorted(set([k[col_key] for k in totals])))
+            self.assertEqual(len(table) - 2, len(set([k[row_key] for k in totals])))
+            for row in table[1:-1]:
+                recs = 0
+                for (column, cell) in zip(columns, row[1:-2]):
+                    keys = [None, None]
+                    keys[row_key], keys[col_key] = row[0], column
+                    if tuple(keys) in totals:
+                        self.assertEqual(cell, totals[tuple(keys)][0])
+                        recs += int(totals[tuple(keys)][1])
+                    else:
+                        self.assertEqual(cell, 'None')
+                self.assertEqual(int(row[-1]), recs)
+            self.assertEqual(table[-1][-1], '4000')
+
+    def test_pivot_count(self):
+        # senza -f le celle sono il numero dei record
+        totals = self.totals([])
+        table = csv_table(self.check_run(self.options + ['-k1.3,4.5', '-P2', '--output_csv', self.filename]))
+        columns = table[0][1:-1]
+        for row in table[1:-1]:
+            for (column, cell) in zip(columns, row[1:-1]):
+                self.assertEqual(cell, totals.get((row[0], column), ['None'])[-1])
+
+    def test_range(self):
+        keys = [(line[:3], line[3:8]) for line in self.data.splitlines()]
+        for (n, row_key, range_key) in ((1, 1, 0), (2, 0, 1)):
+            table = csv_table(self.check_run(self.options + ['-k1.3,4.5', '-P%d' % n, '-R', '--output_csv', self.filename]))
+            self.assertEqual(table[0], ['key', 'min', 'max', 'recs'])
+            expected = {}
+            for k in keys:
+                low, high, recs = expected.get(k[row_key], (k[range_key], k[range_key], 0))
+                expected[k[row_key]] = (min(low, k[range_key]), max(high, k[range_key]), recs + 1)
+            # (la tabella range non ha la riga dei totali)
+            self.assertEqual([row[0] for row in table[1:]], sorted(expected))
+            for row in table[1:]:
+                self.assertEqual((row[1], row[2], int(row[3])), expected[row[0]])
+
+    def test_stdin_and_csv(self):
+        # lo standard input e lo stesso file in formato csv danno la stessa tabella
+        args = ['-k1.3,4.5', '-P2', '-f9.8']
+        out = self.check_run(self.options + args + [self.filename])
+        self.assertEqual(self.check_run(self.options + args, stdin=self.data), out)
+        csv = ''.join(['%s;%s;%s\n' % (line[:3], line[3:8], line[8:]) for line in self.data.splitlines()])
+        self.assertEqual(self.check_run(['--csv', '-k1,2', '-P2', '-f3'], stdin=csv), out)
+        self.assertEqual(self.check_run(['--csv', '-k1,2', '-P1', '-R'], stdin=csv),
+                         self.check_run(self.options + ['-k1.3,4.5', '-P1', '-R', self.filename]))
+
+
+class JobsPivotTest(PivotTest):
+
+    options = ['-j3']
+
+
+if __name__ == '__main__':
+    unittest.main()
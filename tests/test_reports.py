@@ -0,0 +1,117 @@
+"""--report e --reports: tutti i report calcolati con una sola lettura del file, ognuno
+nel suo file di output, devono essere uguali all'output della baseline con le stesse opzioni"""
+
+import os, unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+# i casi di baseline_cases con le sole opzioni -k, -f, -P e -R (le altre valgono per tutti i report)
+report_options = ('-k', '-f', '-P', '-R')
+report_cases = [(name, args) for (name, args) in baseline_cases
+                if [a for a in args if a[:2] in report_options] == args]
+
+
+class ReportsTest(support.TempDirTest):
+
+    options = []
+
+    def input_args(self):
+        return [data_file('fixed.dat')]
+
+    def fields(self, args):
+        return args
+
+    def check_reports(self, cases, extra=[]):
+        """esegue tutti i report di cases con --report, e confronta ogni file di output con la baseline"""
+        cases = [(name, case) for (name, case) in cases if self.fields(case) is not None]
+        args = []
+        for (name, case) in cases:
+            args.append('--report=%s %s' % (self.path(name + '.out'), ' '.join(self.fields(case))))
+        self.assertEqual(self.check_run(self.options + extra + args + self.input_args()), '')
+        for (name, case) in cases:
+            self.assertEqual(open(self.path(name + '.out'), 'rb').read(), expected(name), name)
+
+    def test_all(self):
+        self.check_reports(report_cases)
+
+    def test_print_options(self):
+        # le opzioni di stampa valgono per tutti i report
+        self.check_reports([('output_csv', ['-k1.2', '-f8.10']), ('pivot_csv', ['-k1.2,3.5', '-P2', '-f8.10']),
+                            ('range_csv', ['-k1.2,3.5', '-P2', '-R'])], ['--output_csv'])
+        self.check_reports([('nocents', ['-k1.2', '-f8.10'])], ['-C'])
+
+    def test_reports_file(self):
+        lines = ['# i report della notte', '']
+        cases = [(name, case) for (name, case) in report_cases if self.fields(case) is not None]
+        for (name, case) in cases:
+            lines.append('%s %s' % (self.path(name + '.out'), ' '.join(self.fields(case))))
+        reports = self.write('nightly.txt', '\n'.join(lines) + '\n')
+        self.assertEqual(self.check_run(self.options + ['--reports=' + reports] + self.input_args()), '')
+        for (name, case) in cases:
+            self.assertEqual(open(self.path(name + '.out'), 'rb').read(), expected(name), name)
+
+    def test_stdout(self):
+        out = self.check_run(self.options + ['--report=- ' + ' '.join(self.fields(['-k1.2', '-f8.10,18.8']))] +
+                             self.input_args())
+        self.assertEqual(out, expected('sums'))
+
+
+class StdinReportsTest(ReportsTest):
+
+    def input_args(self):
+        return []
+
+    def check_run(self, args):
+        return support.CountTotalsTest.check_run(self, args, open(data_file('fixed.dat'), 'rb').read())
+
+
+class JobsReportsTest(ReportsTest):
+
+    options = ['-j3']
+
+
+class CsvReportsTest(ReportsTest):
+
+    options = ['--csv']
+
+    def setUp(self):
+        ReportsTest.setUp(self)
+        self.filename = self.write('fixed.csv', support.csv_data())
+
+    def input_args(self):
+        return [self.filename]
+
+    def fields(self, args):
+        return support.translate_csv_args(args)
+
+
+class EbcdicReportsTest(ReportsTest):
+
+    def setUp(self):
+        ReportsTest.setUp(self)
+        self.filename = self.write('fixed.ebc', support.mainframe_data())
+        self.options = self.options + ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+
+    def input_args(self):
+        return [self.filename]
+
+    def fields(self, args):
+        return translate_args(args, support.mainframe_fields)
+
+
+class ErrorsTest(support.TempDirTest):
+
+    def test_errors(self):
+        fixed = data_file('fixed.dat')
+        self.check_error(['--report=- -k1.2', '-k1.2', fixed], "le opzioni -k, -f, -P e -R vanno indicate in ogni report")
+        self.check_error(['--report=- -k1.2', '--numpy', fixed], "--report incompatibile")
+        self.check_error(['--report=- -k1.2', '--state=' + self.path('s'), fixed], "--report incompatibile")
+        self.check_error(['--report=a b -k1.2', fixed], "un solo file di output")
+        self.check_error(['--report=%s -k1.2' % self.path('no/such/dir.out'), fixed], "--report")
+        self.check_error(['--reports=' + self.path('missing.txt'), fixed], "--reports")
+        self.check_error(['--report=- -k1.2 -x', fixed], "--report")
+
+
+if __name__ == '__main__':
+    unittest.main()
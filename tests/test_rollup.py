@@ -0,0 +1,136 @@
+"""--rollup: le righe di dettaglio devono essere quelle senza --rollup, e i subtotali di
+ogni prefisso della chiave le righe calcolate con le sole chiavi del prefisso"""
+
+import unittest
+
+import support
+from support import data_file, translate_args
+
+
+def without_subtotals(out):
+    return ''.join([line for line in out.splitlines(True) if ' *' not in line])
+
+def subtotals(out, stars):
+    """le righe dei subtotali di out (--output_csv) con stars campi '*' nella chiave,
+       senza i campi '*'"""
+    rows = []
+    for line in out.splitlines(True):
+        if ';' not in line: continue
+        key, rest = line.split(';', 1)
+        if key.split().count('*') == stars:
+            rows.append(key[:-2*stars] + ';' + rest)
+    return ''.join(rows)
+
+def detail(out):
+    """le righe di dettaglio di out (--output_csv), senza l'header e i totali generali"""
+    return ''.join(out.splitlines(True)[1:-2])
+
+
+class RollupTest(support.TempDirTest):
+
+    options = []
+    keys = ['1.2', '3.3', '6.2']
+    sums = ['8.10', '18.8']
+    outputs = ([], ['-T'], ['-C', '-s'], ['--output_csv'], ['--output_delim=|'], ['-H'])
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.files = [self.write('input.dat', self.records())]
+
+    def records(self):
+        return open(data_file('fixed.dat'), 'rb').read()
+
+    def run_keys(self, keys, args=[], sums=None):
+        sums = sums or self.sums
+        return self.check_run(self.options + ['-k' + ','.join(keys), '-f' + ','.join(sums)] + args + self.files)
+
+    def test_detail_rows(self):
+        for n in range(2, len(self.keys) + 1):
+            for args in self.outputs:
+                self.assertEqual(without_subtotals(self.run_keys(self.keys[:n], ['--rollup'] + args)),
+                                 self.run_keys(self.keys[:n], args), (n, args))
+
+    def test_pivot(self):
+        for args in ([], ['-T'], ['--output_csv']):
+            args = ['-P2'] + args
+            out = self.run_keys(self.keys, ['--rollup'] + args, self.sums[:1])
+            self.assertEqual(without_subtotals(out), self.run_keys(self.keys, args, self.sums[:1]), args)
+            self.assertNotEqual(out, without_subtotals(out))
+
+    def test_subtotals(self):
+        out = self.run_keys(self.keys, ['--rollup', '--output_csv'])
+        for n in range(1, len(self.keys)):
+            prefix = self.run_keys(self.keys[:n], ['--output_csv'])
+            self.assertEqual(subtotals(out, len(self.keys) - n), detail(prefix), n)
+        # i totali generali non cambiano
+        self.assertEqual(out.splitlines()[-1], prefix.splitlines()[-1])
+
+    def test_errors(self):
+        self.check_error(self.options + ['--rollup', '-k' + self.keys[0]] + self.files, "almeno due chiavi")
+        self.check_error(self.options + ['--rollup', '-P1', '-k' + ','.join(self.keys[:2])] + self.files,
+                         "almeno due chiavi")
+        self.check_error(self.options + ['--rollup', '-P1', '-R', '-k' + ','.join(self.keys)] + self.files,
+                         "--rollup e -R incompatibili")
+
+
+class StdinRollupTest(RollupTest):
+
+    def run_keys(self, keys, args=[], sums=None):
+        sums = sums or self.sums
+        return self.check_run(self.options + ['-k' + ','.join(keys), '-f' + ','.join(sums)] + args,
+                              stdin=self.records())
+
+
+class JobsRollupTest(RollupTest):
+
+    options = ['-j3']
+
+
+class PerFileRollupTest(RollupTest):
+    """con --per-file il nome del file e' il primo livello dei subtotali"""
+
+    options = ['--per-file']
+
+    def test_errors(self):
+        self.check_error(self.options + ['--rollup', '-P1', '-k' + self.keys[0]] + self.files, "almeno due chiavi")
+        self.check_error(self.options + ['--rollup', '-P1', '-R', '-k' + ','.join(self.keys)] + self.files,
+                         "--rollup e -R incompatibili")
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        lines = self.records().splitlines(True)
+        self.files = [self.write('part1.dat', ''.join(lines[:150])), self.write('part2.dat', ''.join(lines[150:]))]
+
+    def test_file_subtotals(self):
+        out = self.run_keys(self.keys, ['--rollup', '--output_csv'])
+        for (i, filename) in enumerate(self.files):
+            rows = [line for line in out.splitlines() if line.startswith(filename + ' * * *;')]
+            self.assertEqual(len(rows), 1)
+            total = self.check_run(['-k' + self.keys[0], '-f' + ','.join(self.sums), '--output_csv', filename])
+            self.assertEqual(rows[0].split(';')[1:], total.splitlines()[-1].split(';')[1:])
+
+
+class CsvRollupTest(RollupTest):
+
+    options = ['--csv']
+    keys = ['1', '2']
+    sums = ['3', '4']
+
+    def records(self):
+        return support.csv_data()
+
+    def test_pivot(self):
+        self.check_error(self.options + ['--rollup', '-P2', '-k1,2', '-f3'] + self.files, "almeno due chiavi")
+
+
+class EbcdicRollupTest(RollupTest):
+
+    options = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+    sums = ['8.10', '18.5:p']
+
+    def records(self):
+        return support.mainframe_data()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+"""--server e --query: i report delle richieste devono essere quelli della baseline; quando
+il file cambia i totali vengono aggiornati da un processo figlio, senza bloccare le altre
+richieste, e fino ad allora (o se l'aggiornamento non riesce) le risposte lo segnalano"""
+
+import os, sys, time, socket, subprocess, unittest
+
+import support
+from support import baseline_cases, expected, data_file
+
+
+# le opzioni ammesse nelle richieste (-s e -T sono opzioni di stampa della riga di comando)
+request_options = ('-k', '-f', '-P', '-R', '-C', '-H', '--output_csv', '--output_delim')
+
+def server_cases():
+    return [(name, args) for (name, args) in baseline_cases
+            if [arg for arg in args if arg.startswith(request_options)] == args]
+
+stale = "--query: totali non aggiornati"
+
+
+class ServerTest(support.TempDirTest):
+
+    options = []
+    server_args = ['-k1.7', '-f8.10,18.8']
+    fields = {'8.10': '8.10', '18.8': '18.8'}
+    missing = '40.2'                    # un campo che non e' una chiave del server
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.lines = self.records()
+        self.filename = self.write('input.dat', ''.join(self.lines))
+        self.socket = self.path('server.sock')
+        self.errors = self.path('server.err')
+        stderr = open(self.errors, 'wb')
+        self.server = subprocess.Popen([sys.executable, support.count_totals, '--server=' + self.socket] +
+                                       self.options + self.server_args + [self.filename], stderr=stderr)
+        stderr.close()
+        self.wait(lambda: os.path.exists(self.socket) and self.request('STATUS'))
+
+    def tearDown(self):
+        if self.server.poll() is None:
+            self.server.terminate()
+        self.server.wait()
+        support.TempDirTest.tearDown(self)
+
+    def records(self):
+        return open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+
+    def args(self, args):
+        """le opzioni di un caso di baseline_cases per questo file (None: non applicabile)"""
+        return support.translate_args(args, self.fields)
+
+    def wait(self, ready, timeout=30):
+        """aspetta che ready() sia vero"""
+        end = time.time() + timeout
+        while time.time() < end:
+            self.assertEqual(self.server.poll(), None, open(self.errors).read())
+            ret = ready()
+            if ret: return ret
+            time.sleep(0.05)
+        self.fail("timeout")
+
+    def request(self, line):
+        """la risposta del server alla richiesta line (come socat)"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket)
+        except socket.error:
+            return None
+        sock.sendall(line + '\n')
+        reply = sock.makefile('rb').read()
+        sock.close()
+        return reply
+
+    def status(self):
+        return dict([line.split(': ', 1) for line in self.request('STATUS').splitlines()[1:]])
+
+    def query(self, args):
+        """--query: (exit status, report, standard error)"""
+        return support.run(['--query=' + self.socket] + args)
+
+    def fresh_query(self, args):
+        """il report della richiesta, appena i totali sono aggiornati"""
+        def ready():
+            status, out, err = self.query(args)
+            self.assertEqual(status, 0, err)
+            return stale not in err and out
+        return self.wait(ready)
+
+    def full_run(self, args):
+        return self.check_run(self.options + args + [self.filename])
+
+    def test_baseline(self):
+        for (name, args) in server_cases():
+            args = self.args(args)
+            if args is None: continue
+            status, out, err = self.query(args)
+            self.assertEqual((status, err), (0, ''), name)
+            self.assertEqual(out, expected(name), name)
+
+    def test_rollup(self):
+        for args in (['--rollup'], ['--rollup', '--output_csv'], ['--rollup', '-C', '-H']):
+            args = self.args(['-k1.2,3.5'] + args)
+            self.assertEqual(self.query(args)[1], self.full_run(args), args)
+
+    def test_status(self):
+        reply = self.request('STATUS')
+        self.assertTrue(reply.startswith('OK\n'), reply)
+        status = self.status()
+        self.assertEqual(status['stale'], 'no')
+        self.assertEqual(int(status['offset']), len(''.join(self.lines)))
+        self.assertEqual(int(status['records']), len(self.lines))
+
+    def test_errors(self):
+        status, out, err = self.query(self.args(['-k1.2', '-f8.10']) + ['-P3'])
+        self.assertNotEqual(status, 0)
+        self.assertIn("-P: il valore deve essere", err)
+        reply = self.request('-k' + self.missing)
+        self.assertTrue(reply.startswith('ERR\n'), reply)
+        self.assertIn("campi non presenti nel server", reply)
+        self.check_error(['--query=' + self.path('none.sock'), '-k1.2'], "--query:")
+        self.check_error(['--server=' + self.socket] + self.options + self.server_args + [self.filename],
+                         "e' gia' in uso")
+        self.check_error(['--server=' + self.path('other.sock'), '--per-file'] + self.options + self.server_args +
+                         [self.filename], "--server incompatibile")
+        self.check_error(['--server=' + self.path('other.sock')] + self.options + self.server_args +
+                         [self.filename, self.filename], "un solo file di input")
+
+    def test_append(self):
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        for end in (100, 250):
+            self.write('input.dat', ''.join(self.lines + self.lines[:end]))
+            self.assertEqual(self.fresh_query(args), self.full_run(args))
+        self.assertEqual(int(self.status()['offset']), len(''.join(self.lines + self.lines[:250])))
+
+    def test_rewritten(self):
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        self.write('input.dat', ''.join(self.lines[200:] + self.lines[:50]))
+        self.assertEqual(self.fresh_query(args), self.full_run(args))
+        self.write('input.dat', ''.join(self.lines))
+        self.assertEqual(self.fresh_query(args), expected('two_keys_sums'))
+
+    def test_refresh_in_background(self):
+        # un file grande: le richieste durante la lettura ricevono subito i totali precedenti
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        self.write('input.dat', ''.join(self.lines) * 300)
+        status, out, err = self.query(args)
+        self.assertEqual((status, out), (0, expected('two_keys_sums')))
+        self.assertIn(stale + ": aggiornamento in corso", err)
+        self.assertTrue(self.status()['stale'].startswith('aggiornamento in corso'))
+        self.assertTrue(self.request(' '.join(args)).startswith('OK STALE aggiornamento in corso'))
+        self.assertEqual(self.fresh_query(args), self.full_run(args))
+        self.assertEqual(self.status()['stale'], 'no')
+
+    def test_read_error(self):
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        os.remove(self.filename)
+        status, out, err = self.query(args)
+        self.assertEqual((status, out), (0, expected('two_keys_sums')))
+        self.assertIn(stale + ": errore nell'aggiornamento", err)
+        self.assertIn("No such file", self.status()['stale'])
+        # la lettura non riesce nel processo figlio
+        os.mkdir(self.filename)
+        self.request('STATUS')
+        self.wait(lambda: "Is a directory" in self.status()['stale'])
+        status, out, err = self.query(args)
+        self.assertEqual((status, out), (0, expected('two_keys_sums')))
+        self.assertIn("Is a directory", err)
+        self.assertIn("vengono usati i totali precedenti", open(self.errors).read())
+        os.rmdir(self.filename)
+        self.write('input.dat', ''.join(self.lines[:100]))
+        self.assertEqual(self.fresh_query(args), self.full_run(args))
+
+
+class JobsServerTest(ServerTest):
+
+    options = ['-j3']
+
+
+class CsvServerTest(ServerTest):
+
+    options = ['--csv']
+    server_args = ['-k1,2', '-f3,4']
+    missing = '3'
+
+    def records(self):
+        return support.csv_lines()
+
+    def args(self, args):
+        return support.translate_csv_args(args)
+
+
+class QuotedCsvServerTest(CsvServerTest):
+    """un campo tra virgolette con un fine riga in un record ogni tre"""
+
+    def records(self):
+        return support.csv_lines(notes=True)
+
+    def test_incomplete_record(self):
+        # il record interrotto dopo il fine riga tra virgolette non viene aggregato
+        args = self.args(['-k1.2,3.5', '-f8.10,18.8'])
+        data = ''.join(self.lines)
+        self.write('input.dat', data + self.lines[0][:-8])
+        self.assertEqual(self.fresh_query(args), expected('two_keys_sums'))
+        self.assertEqual(int(self.status()['offset']), len(data))
+        self.write('input.dat', data + self.lines[0])
+        self.assertEqual(self.fresh_query(args), self.full_run(args))
+        self.assertEqual(int(self.status()['records']), len(self.lines) + 1)
+
+
+class EbcdicServerTest(ServerTest):
+    """record EBCDIC senza fine riga, con il secondo campo packed"""
+
+    options = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+    server_args = ['-k1.7', '-f8.10,18.5:p']
+    fields = support.mainframe_fields
+
+    def records(self):
+        return support.mainframe_records()
+
+
+if __name__ == '__main__':
+    unittest.main()
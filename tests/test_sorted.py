@@ -0,0 +1,101 @@
+"""--sorted: con un file ordinato per chiave l'output deve essere quello senza --sorted
+(e quello della baseline), con la colonna delle chiavi larga quanto i campi -k (o --key-width),
+e le prime righe devono essere stampate mentre il file viene letto; con un file non ordinato,
+un errore dopo le righe dei gruppi gia' completi"""
+
+import sys, select, subprocess, unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+# i casi della baseline senza pivot, con la chiave all'inizio del record: fixed.dat
+# ordinato per righe e' ordinato anche per chiave
+sorted_cases = [(name, args) for (name, args) in baseline_cases
+                if not [a for a in args if a[:2] == '-P'] and
+                [a for a in args if a[:2] == '-k'] in ([], ['-k1.2'], ['-k1.2,3.5'])]
+
+
+class SortedTest(support.TempDirTest):
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.lines = sorted(open(data_file('fixed.dat'), 'rb').read().splitlines(True))
+        self.filename = self.write('sorted.dat', ''.join(self.lines))
+
+    def run_sorted(self, args, stdin=''):
+        return self.check_run(['--sorted'] + args, stdin=stdin)
+
+    def test_baseline(self):
+        self.assertTrue(len(sorted_cases) > 5)
+        for (name, args) in sorted_cases:
+            self.assertEqual(self.run_sorted(args + [self.filename]), expected(name), name)
+            self.assertEqual(self.run_sorted(args, stdin=''.join(self.lines)), expected(name), name)
+
+    def test_short_lines(self):
+        # righe corte: chiavi piu' corte dei campi -k, la colonna e' larga quanto i campi
+        lines = list(self.lines)
+        lines[0], lines[1] = lines[0][:1] + '\n', lines[1][:4] + '\n'
+        filename = self.write('short.dat', ''.join(sorted(lines)))
+        for args in (['-k1.2,3.5', '-f8.10'], ['-k1.2,3.5', '-f8.10', '--rollup'], ['-k1.2,3.5', '--output_csv']):
+            self.assertEqual(self.run_sorted(args + [filename]), self.check_run(args + [filename]), args)
+
+    def test_csv_key_width(self):
+        # con --csv la colonna e' larga quanto la prima chiave (almeno 'total'), o --key-width
+        data = 'a;1\nbb;3\nlongerkey;2\n'
+        out = self.run_sorted(['--csv', '-k1', '-f2'], stdin=data)
+        self.assertEqual([len(line) for line in out.splitlines() if line],
+                         [len('total') + 28] * 3 + [len('longerkey') + 28, len('total') + 28])
+        out = self.run_sorted(['--csv', '-k1', '-f2', '--key-width=9'], stdin=data)
+        self.assertEqual(out, self.check_run(['--csv', '-k1', '-f2'], stdin=data))
+        csv = ''.join(sorted(support.csv_lines()))
+        self.assertEqual(self.run_sorted(['--csv', '-k1,2', '-f3,4'], stdin=csv), expected('two_keys_sums'))
+
+    def test_ebcdic(self):
+        # con --ebcdic l'ordine e' quello dei byte EBCDIC del file
+        filename = self.write('sorted.ebc', ''.join(sorted(support.mainframe_records())))
+        args = translate_args(['-k1.2,3.5', '-f8.10,18.8'], support.mainframe_fields)
+        mainframe = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+        self.assertEqual(self.run_sorted(mainframe + args + [filename]),
+                         self.check_run(mainframe + args + [filename]))
+
+    def test_where(self):
+        args = ['-k1.2,3.5', '-f8.10', '-w1.2=AL,NY']
+        self.assertEqual(self.run_sorted(args + [self.filename]), self.check_run(args + [self.filename]))
+
+    def test_streaming(self):
+        # le righe dei primi gruppi vengono stampate prima della fine dell'input
+        proc = subprocess.Popen([sys.executable, support.count_totals, '--sorted', '-k1.5', '-f6.5'],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        proc.stdin.write(''.join(['%05d%05d\n' % (i, i) for i in range(2000)]))
+        proc.stdin.flush()
+        ready = select.select([proc.stdout], [], [], 30)[0]
+        self.assertTrue(ready)
+        self.assertEqual(proc.stdout.readline().split(), ['key', 'sum1', 'recs'])
+        self.assertEqual(proc.stdout.readline().split(), ['00000', '0.00', '1'])
+        out = proc.communicate()[0]
+        self.assertEqual(proc.returncode, 0)
+        self.assertEqual(out.splitlines()[-1].split(), ['total', '%.2f' % (sum(range(2000)) / 100.0), '2000'])
+
+    def test_not_sorted(self):
+        # le righe dei gruppi completi prima della chiave fuori ordine, senza i totali generali
+        lines = list(self.lines)
+        lines[300], lines[10] = lines[10], lines[300]
+        filename = self.write('unsorted.dat', ''.join(lines))
+        for (args, stdin, key) in ((['-k1.2', '-f8.10', filename], '', 'AL'),
+                                   (['-k1.2', '-f8.10'], ''.join(lines), 'AL'),
+                                   (['--csv', '-k1', '-f2'], 'b;1\nc;2\na;3\n', 'b')):
+            status, out, err = support.run(['--sorted'] + args, stdin)
+            self.assertNotEqual(status, 0)
+            self.assertEqual([line.split()[0] for line in out.splitlines()[:2]], ['key', key])
+            self.assertNotIn('\ntotal', out)
+            self.assertIn("non e' ordinato per chiave", err)
+
+    def test_incompatible(self):
+        for option in ('-P1', '-P1 -R', '-j2', '--numpy', '--max_mem=10', '--state=' + self.path('s')):
+            self.check_error(['--sorted', '-k1.2,3.5'] + option.split() + [self.filename], "--sorted incompatibile")
+        self.check_error(['--key-width=10', '-k1.2,3.5', self.filename], "solo con --sorted")
+        self.check_error(['--sorted', '--key-width=0', '-k1.2,3.5', self.filename], "maggiore di 0")
+
+
+if __name__ == '__main__':
+    unittest.main()
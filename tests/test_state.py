@@ -0,0 +1,174 @@
+"""--state: i totali incrementali di un file che cresce in coda devono essere quelli del
+file letto tutto; un file riscritto (nei blocchi dell'impronta), sostituito o troncato viene
+riletto dall'inizio, e un'ultima riga incompleta viene stampata ma non salvata nello stato"""
+
+import os, json, marshal, unittest
+
+import support
+from support import expected, data_file
+
+
+class StateTest(support.TempDirTest):
+
+    options = []
+    args = ['-k1.2,3.5', '-f8.10,18.8']
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.lines = self.records()
+        self.filename = self.path('log.dat')
+        self.state = self.path('log.state')
+
+    def records(self):
+        return open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+
+    def changed(self, record):
+        """il record con una cifra del primo campo da sommare cambiata"""
+        return record[:10] + (record[10] == '9' and '1' or '9') + record[11:]
+
+    def run_state(self, data=None):
+        """scrive data nel file (se indicato) ed esegue count_totals.py con --state: (output,
+           standard error, byte letti)"""
+        if data is not None:
+            self.write('log.dat', data)
+        stats = self.path('stats.json')
+        status, out, err = support.run(self.options + ['--state=' + self.state, '--stats-file=' + stats] +
+                                       self.args + [self.filename])
+        self.assertEqual(status, 0, err)
+        return out, err, json.load(open(stats))['bytes']
+
+    def full_run(self, data):
+        return self.check_run(self.options + self.args, stdin=data)
+
+    def test_append(self):
+        data = ''.join(self.lines[:150])
+        out, err, read = self.run_state(data)
+        self.assertEqual((out, read), (self.full_run(data), len(data)))
+        for end in (151, 300, 400):
+            data = ''.join(self.lines[:end])
+            out, err, read = self.run_state(data)
+            self.assertEqual(out, self.full_run(data))
+            self.assertEqual(err, '')
+        self.assertEqual(read, len(''.join(self.lines[300:])))   # solo le righe aggiunte
+        self.assertEqual(out, expected('two_keys_sums'))
+        out, err, read = self.run_state(data)
+        self.assertEqual((out, read), (expected('two_keys_sums'), 0))
+
+    def test_rewritten_middle(self):
+        # un valore cambiato in mezzo alla parte gia' elaborata, con la stessa dimensione
+        self.run_state(''.join(self.lines))
+        lines = list(self.lines)
+        lines[200] = self.changed(lines[200])
+        data = ''.join(lines) + lines[0]
+        out, err, read = self.run_state(data)
+        self.assertIn("riletto dall'inizio", err)
+        self.assertEqual((out, read), (self.full_run(data), len(data)))
+
+    def test_rewritten_end(self):
+        # un file piu' grande del blocco dell'impronta, cambiato alla fine della parte elaborata
+        lines = self.lines * 20
+        self.run_state(''.join(lines))
+        lines[-10] = self.changed(lines[-10])
+        data = ''.join(lines + self.lines[:10])
+        out, err, read = self.run_state(data)
+        self.assertIn("riletto dall'inizio", err)
+        self.assertEqual((out, read), (self.full_run(data), len(data)))
+
+    def test_replaced(self):
+        # un altro file con lo stesso nome (rotazione dei log), che inizia con gli stessi byte
+        data = ''.join(self.lines)
+        self.run_state(data)
+        os.rename(self.write('new.dat', data + data), self.filename)
+        out, err, read = self.run_state()
+        self.assertIn("riletto dall'inizio", err)
+        self.assertEqual((out, read), (self.full_run(data + data), len(data + data)))
+
+    def test_large_append(self):
+        # con un file grande vengono letti solo i byte aggiunti (e i blocchi dell'impronta)
+        data = ''.join(self.lines) * 20
+        self.run_state(data)
+        out, err, read = self.run_state(data + ''.join(self.lines[:50]))
+        self.assertEqual((out, err), (self.full_run(data + ''.join(self.lines[:50])), ''))
+        self.assertEqual(read, len(''.join(self.lines[:50])))
+
+    def test_truncated(self):
+        self.run_state(''.join(self.lines))
+        data = ''.join(self.lines[:100])
+        out, err, read = self.run_state(data)
+        self.assertIn("riletto dall'inizio", err)
+        self.assertEqual((out, read), (self.full_run(data), len(data)))
+
+    def test_incomplete_last_line(self):
+        # la riga senza fine riga e' nel report (come senza --state), ma non nello stato
+        last = self.lines[300]
+        data = ''.join(self.lines[:300]) + last[:-3]
+        out, err, read = self.run_state(data)
+        self.assertEqual(out, self.full_run(data))
+        data = ''.join(self.lines[:300]) + last + ''.join(self.lines[301:])
+        out, err, read = self.run_state(data)
+        self.assertEqual((out, err), (expected('two_keys_sums'), ''))
+        self.assertEqual(read, len(''.join(self.lines[300:])))  # la riga completata e le successive
+
+    def test_old_version(self):
+        # uno stato della versione con l'md5 di tutta la parte elaborata: il file viene riletto
+        data = ''.join(self.lines)
+        out = open(self.state, 'wb')
+        marshal.dump({'version': 1, 'offset': len(data), 'fingerprint': '', 'totals': []}, out)
+        out.close()
+        out, err, read = self.run_state(data)
+        self.assertIn("versione precedente", err)
+        self.assertEqual((out, read), (expected('two_keys_sums'), len(data)))
+        self.assertEqual(self.run_state()[1:], ('', 0))
+
+    def test_params(self):
+        self.run_state(''.join(self.lines))
+        self.check_error(self.options + ['--state=' + self.state] + self.args[:1] + [self.filename],
+                         "parametri diversi")
+
+    def test_not_regular(self):
+        self.check_error(self.options + ['--state=' + self.state] + self.args, "file regolare",
+                         stdin=''.join(self.lines))
+
+
+class JobsStateTest(StateTest):
+
+    options = ['-j3']
+
+
+class CsvStateTest(StateTest):
+
+    options = ['--csv']
+    args = ['-k1,2', '-f3,4']
+
+    def records(self):
+        return support.csv_lines()
+
+
+class QuotedStateTest(CsvStateTest):
+    """un campo tra virgolette con un fine riga in un record ogni tre: la parte salvata nello
+       stato finisce sempre alla fine di un record, anche se l'ultimo e' interrotto dopo il
+       fine riga tra virgolette"""
+
+    def records(self):
+        return support.csv_lines(notes=True)
+
+
+class EbcdicStateTest(StateTest):
+    """record EBCDIC senza fine riga: l'ultimo record incompleto e' stampato ma non salvato"""
+
+    options = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+    args = support.translate_args(['-k1.2,3.5', '-f8.10,18.8'], support.mainframe_fields)
+
+    def records(self):
+        return support.mainframe_records()
+
+    def changed(self, record):
+        return record[:10] + (record[10] == '\xf9' and '\xf1' or '\xf9') + record[11:]
+
+    def full_run(self, data):
+        filename = self.write('full.dat', data)
+        return self.check_run(self.options + self.args + [filename])
+
+
+if __name__ == '__main__':
+    unittest.main()
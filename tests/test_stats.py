@@ -0,0 +1,168 @@
+"""--stats e --progress: l'output resta quello della baseline, e il riepilogo JSON conta gli
+stessi record, byte, gruppi e valori (negativi e vuoti) con tutti i motori e formati"""
+
+import json, unittest
+
+import support
+from support import baseline_cases, expected, data_file, translate_args
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class StatsTest(support.TempDirTest):
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.records = support.fixed_records()
+        # l'ultima riga, senza fine riga, finisce prima del secondo campo: un valore vuoto
+        self.records[-1] = self.records[-1][:3] + ('',)
+        self.data = self.encode(self.records)
+        self.filename = self.write('input.dat', self.data)
+        self.summary = self.path('stats.json')
+
+    def encode(self, records):
+        return '\n'.join([''.join(r) for r in records])
+
+    def baseline_data(self):
+        return open(data_file('fixed.dat'), 'rb').read()
+
+    def args(self, args):
+        return args
+
+    def run_stats(self, args, stdin=None):
+        """(output, riepilogo di --stats-file)"""
+        args = self.options + ['--stats-file=' + self.summary] + self.args(args)
+        if stdin is None:
+            out = self.check_run(args + [self.filename])
+        else:
+            out = self.check_run(args, stdin=stdin)
+        return out, json.load(open(self.summary))
+
+    def expected_counts(self, sums):
+        """(valori, negativi, vuoti) dei campi sums ('8.10', '18.8') di fixed.dat"""
+        index = {'8.10': 2, '18.8': 3}
+        values = [r[index[f]] for r in self.records for f in sums]
+        negatives = [v for v in values if v.strip() and not v[-1].isdigit()]
+        return len(values), len(negatives), len([v for v in values if not v.strip()])
+
+    def check_summary(self, summary, sums=('8.10', '18.8'), groups=7):
+        self.assertEqual(summary['records'], len(self.records))
+        self.assertEqual(summary['bytes'], len(self.data))
+        self.assertEqual(summary['groups'], groups)
+        counts = summary['numeric_fields']
+        self.assertEqual((counts['values'], counts['negative'], counts['empty']), self.expected_counts(sums))
+        self.assertTrue(counts['negative'] > 50 and counts['empty'] == 1, counts)
+        self.assertTrue(summary['records_per_sec'] > 0 and summary['peak_rss_kb'] > 0)
+
+    def test_baseline(self):
+        # i totali e l'output non cambiano (fixed.dat, senza il valore vuoto)
+        self.records = support.fixed_records()
+        self.filename = self.write('input.dat', self.baseline_data())
+        for (name, args) in baseline_cases:
+            if name == 'part_of_key' and self.options: continue
+            out, summary = self.run_stats(args)
+            self.assertEqual(out, expected(name), name)
+            self.assertEqual(summary['records'], len(self.records), name)
+
+    def test_counts(self):
+        out, summary = self.run_stats(['-k1.2', '-f8.10,18.8'])
+        self.check_summary(summary)
+        self.assertEqual([p['phase'] for p in summary['phases']], ['aggregate', 'massage', 'print'])
+
+    def test_stdin(self):
+        out, summary = self.run_stats(['-k1.2', '-f8.10,18.8'], stdin=self.data)
+        self.check_summary(summary)
+        self.assertEqual(summary['input'], ['-'])
+
+    def test_jobs(self):
+        out, summary = self.run_stats(['-j3', '-k1.2', '-f18.8'])
+        self.check_summary(summary, ('18.8',))
+
+    def test_reports(self):
+        # un campo usato da piu' report viene decodificato (e contato) una volta sola
+        report = self.path('report.out')
+        out, summary = self.run_stats(['--report', ' '.join([report] + self.args(['-k1.2', '-f8.10,18.8'])),
+                                       '--report', ' '.join([report + '2'] + self.args(['-k3.5', '-f18.8']))])
+        self.check_summary(summary, groups=7 + len(set([r[1] for r in self.records])))
+
+    def test_stderr(self):
+        status, out, err = support.run(self.options + ['--stats'] + self.args(['-k1.2', '-f8.10,18.8']) +
+                                       [self.filename])
+        self.assertEqual(status, 0, err)
+        self.check_summary(json.loads(err))
+
+    def test_progress(self):
+        # con -j il processo principale scrive una riga per ogni parte completata
+        status, out, err = support.run(self.options + ['--progress', '-j3'] + self.args(['-k1.2', '-f8.10']) +
+                                       [self.filename])
+        self.assertEqual(status, 0, err)
+        lines = err.splitlines()
+        self.assertEqual(len(lines), 3, err)
+        self.assertIn('(100%), ', lines[-1])
+        self.assertIn(', %d record, ' % len(self.records), lines[-1])
+
+    def test_stats_file_error(self):
+        self.check_error(['--stats-file=' + self.path('missing/stats.json'), '-k1.2', self.filename],
+                         "--stats-file")
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyStatsTest(StatsTest):
+
+    options = ['--numpy']
+
+    def test_reports(self):
+        pass                            # --report e' incompatibile con --numpy
+
+
+class CsvStatsTest(StatsTest):
+
+    options = ['--csv']
+
+    def encode(self, records):
+        return '\n'.join([';'.join(r) for r in records])
+
+    def baseline_data(self):
+        return support.csv_data()
+
+    def args(self, args):
+        return support.translate_csv_args(args)
+
+
+class EbcdicStatsTest(StatsTest):
+    """EBCDIC, con il secondo campo packed: i negativi e i vuoti sono contati solo sui campi zoned
+       (i record sono tutti completi: nessun valore vuoto)"""
+
+    options = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+
+    def setUp(self):
+        StatsTest.setUp(self)
+        self.data = support.mainframe_data()
+        self.filename = self.write('input.dat', self.data)
+        self.records = support.fixed_records()
+
+    def baseline_data(self):
+        return support.mainframe_data()
+
+    def args(self, args):
+        return translate_args(args, support.mainframe_fields)
+
+    def expected_counts(self, sums):
+        values, negatives, empty = StatsTest.expected_counts(self, [f for f in sums if f == '8.10'])
+        return values + len(self.records) * sums.count('18.8'), negatives, empty
+
+    def check_summary(self, summary, sums=('8.10', '18.8'), groups=7):
+        self.assertEqual(summary['records'], len(self.records))
+        self.assertEqual(summary['bytes'], len(self.data))
+        self.assertEqual(summary['groups'], groups)
+        counts = summary['numeric_fields']
+        self.assertEqual((counts['values'], counts['negative'], counts['empty']), self.expected_counts(sums))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Totals: i totali in array per colonna, con le chiavi in forma compatta (i byte dei campi
+-k contigui, oppure le chiavi separate da \\0), confrontati con l'output della baseline"""
+
+import unittest
+
+import support
+from support import baseline_cases, expected, data_file
+
+
+class TotalsTest(unittest.TestCase):
+
+    def test_span_keys(self):
+        # -k3.5,1.2: i byte 1-7 del record, con le chiavi non in ordine di posizione
+        ct = support.load_module(param_keys='3.5,1.2', param_sums='8.10')
+        totals = ct.new_totals()
+        self.assertEqual(ct.key_span(), (0, 7))
+        for keys in [('CDEFG', 'AB'), ('CD', 'AB'), ('', 'A'), ('AAAAA', 'ZZ')]:
+            totals.add(totals.group(keys), [10])
+            self.assertEqual(totals.unpack(totals.pack(keys)), keys)
+        totals.add(totals.group(('CD', 'AB')), [5], 2)
+        self.assertEqual(totals[('CD', 'AB')], [15, 3])
+        self.assertEqual([k for (k, v) in totals.sorted_items()],
+                         sorted([('CDEFG', 'AB'), ('CD', 'AB'), ('', 'A'), ('AAAAA', 'ZZ')]))
+        self.assertEqual(totals.key_width, len('CDEFG AB'))
+
+    def test_joined_keys(self):
+        # chiavi non contigue (e con --csv): le chiavi separate da \0, o una tuple se lo contengono
+        ct = support.load_module(param_keys='1.2,8.3', param_sums='18.8')
+        totals = ct.new_totals()
+        keys = [('a', 'b'), ('a\0', 'b'), ('a', '\0b'), ('', ''), ('ab', '')]
+        for k in keys:
+            totals.add(totals.group(k), [1])
+        self.assertEqual(len(totals), len(keys))
+        self.assertEqual(sorted(totals), sorted(keys))
+        self.assertEqual([k for (k, v) in totals.sorted_items()], sorted(keys))
+        self.assertEqual(ct.join_keys(['a', 'b']), 'a\0b')
+        self.assertEqual(ct.join_keys(['a\0', 'b']), ('a\0', 'b'))
+        self.assertEqual(ct.join_keys([]), ())
+
+    def test_overflow(self):
+        # oltre i 64 bit la colonna diventa una lista di interi, e i totali restano esatti
+        ct = support.load_module(param_keys='1.2', param_sums='3.5,8.10')
+        totals = ct.new_totals()
+        gid = totals.group(('a',))
+        for i in range(3):
+            totals.add(gid, [2**62, 1])
+        totals.add(totals.group(('b',)), [-2**63, 2**63])
+        self.assertEqual(totals[('a',)], [3 * 2**62, 3, 3])
+        self.assertEqual(totals[('b',)], [-2**63, 2**63, 1])
+        totals.add(totals.group(('c',)), [1, 1])
+        self.assertEqual(totals[('c',)], [1, 1, 1])
+
+    def test_merge(self):
+        ct = support.load_module(param_keys='1.2,3.5', param_sums='8.10')
+        totals, other = ct.new_totals(), ct.new_totals()
+        totals.add(totals.group(('01', 'AAAAA')), [5])
+        other.add(other.group(('01', 'AAAAA')), [7], 2)
+        other.add(other.group(('02', 'B')), [1])
+        totals.merge(other)
+        self.assertEqual(sorted(totals.items()), [(('01', 'AAAAA'), [12, 3]), (('02', 'B'), [1, 1])])
+        # con il prefisso (--per-file) le chiavi hanno un campo in piu'
+        per_file = ct.new_totals(keyed=0)
+        per_file.merge(other, ('f1',))
+        per_file.merge(other, ('f2',))
+        self.assertEqual(sorted(per_file)[:2], [('f1', '01', 'AAAAA'), ('f1', '02', 'B')])
+        self.assertEqual(per_file[('f2', '02', 'B')], [1, 1])
+
+    def test_rename(self):
+        ct = support.load_module(param_keys='1.2,3.5', param_sums='8.10')
+        totals = ct.new_totals()
+        totals.add(totals.group(('ab', 'cdefg')), [1])
+        totals.rename(lambda keys: tuple([k.upper() for k in keys]))
+        self.assertEqual(totals.items(), [(('AB', 'CDEFG'), [1, 1])])
+
+
+class KeyOrderTest(support.TempDirTest):
+    """le chiavi in ogni ordine e con le righe corte: lo stesso output della baseline,
+       con il file mappato (mmap) e con lo standard input"""
+
+    def test_reversed_keys(self):
+        # -k3.5,1.2 e' la tabella di -k1.2,3.5 con le colonne della chiave scambiate
+        data = open(data_file('fixed.dat'), 'rb').read()
+        expected_rows = {}
+        for line in expected('two_keys_sums').splitlines():
+            if line[:2] in ('ke', 'to', '') or not line.strip(): continue
+            expected_rows[(line[3:8], line[:2])] = line[8:]
+        for args in (['-k3.5,1.2', '-f8.10,18.8', data_file('fixed.dat')], ['-k3.5,1.2', '-f8.10,18.8']):
+            out = self.check_run(args, stdin=data)
+            rows = [line for line in out.splitlines()[1:] if line.strip() and not line.startswith('total')]
+            self.assertEqual(len(rows), len(expected_rows))
+            self.assertEqual(rows, sorted(rows))
+            for row in rows:
+                self.assertEqual(row[8:], expected_rows[(row[:5], row[6:8])])
+
+    def test_short_lines(self):
+        lines = open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+        lines[10], lines[20], lines[30] = lines[10][:4] + '\n', lines[20][:1] + '\n', '\n'
+        filename = self.write('short.dat', ''.join(lines))
+        for args in (['-k1.2,3.5', '-f8.10'], ['-k3.5,1.2', '-f8.10'], ['-k1.2,8.3', '-f18.8']):
+            self.assertEqual(self.check_run(args + [filename]), self.check_run(args, stdin=''.join(lines)), args)
+
+    def test_csv(self):
+        # lo stesso file in formato csv: gli stessi totali della baseline a larghezza fissa
+        filename = self.write('fixed.csv', support.csv_data())
+        for (name, args) in baseline_cases:
+            args = support.translate_csv_args(args)
+            if args is None: continue
+            self.assertEqual(self.check_run(['--csv'] + args + [filename]), expected(name), name)
+
+    def test_overflow(self):
+        # somme oltre i 64 bit: esatte, come con gli interi della baseline
+        # (le somme vengono stampate come numeri float: 27*10**18 e' esatto)
+        data = ''.join(['A%019d\n' % (9 * 10**18) for i in range(3)]) + 'B%019d\n' % 5
+        out = self.check_run(['-k1.1', '-f2.19', '-C'], stdin=data)
+        rows = dict([line.split()[:2] for line in out.splitlines() if line.strip()])
+        self.assertEqual(rows['A'], '%d' % (27 * 10**18))
+        self.assertEqual(rows['B'], '5')
+
+
+if __name__ == '__main__':
+    unittest.main()
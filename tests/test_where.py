@@ -0,0 +1,112 @@
+"""--where (-w): l'output con le condizioni deve essere quello della baseline sui soli
+record che le soddisfano (selezionati qui in Python), con ogni motore e formato"""
+
+import unittest
+
+import support
+from support import data_file, translate_args, cobolnum
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def zoned(v):
+    return cobolnum.decode_zoned(v)
+
+# le condizioni (sui campi di fixed.dat) e la verifica equivalente sui record (k1, k2, v1, v2)
+where_cases = [
+    (['1.2=AL,NY'],                 lambda r: r[0] in ('AL', 'NY')),
+    (['1.2^=A'],                    lambda r: r[0].startswith('A')),
+    (['3.5^=00,31'],                lambda r: r[1][:2] in ('00', '31')),
+    (['3.5^=0,314'],                lambda r: r[1].startswith(('0', '314'))),
+    (['8.10=0..'],                  lambda r: zoned(r[2]) >= 0),
+    (['8.10=..-1'],                 lambda r: zoned(r[2]) <= -1),
+    (['18.8=-500000..500000'],      lambda r: -500000 <= zoned(r[3]) <= 500000),
+    (['1.2=AL,AR,CA', '8.10=0..', '3.5^=0'],
+                                    lambda r: r[0] in ('AL', 'AR', 'CA') and zoned(r[2]) >= 0 and r[1][0] == '0'),
+    (['1.2=ALX'],                   lambda r: False),
+]
+where_args = ['-k1.2,3.5', '-f8.10,18.8']
+
+
+class WhereTest(support.TempDirTest):
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.lines = open(data_file('fixed.dat'), 'rb').read().splitlines(True)
+        self.records = support.fixed_records()
+
+    def selected(self, test):
+        """le righe di fixed.dat che soddisfano test, come un file"""
+        return ''.join([line for (line, r) in zip(self.lines, self.records) if test(r)])
+
+    def where(self, conds):
+        return ['-w' + c for c in conds]
+
+    def test_file(self):
+        for (conds, test) in where_cases:
+            out = self.check_run(self.options + where_args + self.where(conds) + [data_file('fixed.dat')])
+            self.assertEqual(out, self.check_run(where_args, stdin=self.selected(test)), conds)
+
+    def test_stdin(self):
+        data = ''.join(self.lines)
+        for (conds, test) in where_cases:
+            out = self.check_run(self.options + where_args + self.where(conds), stdin=data)
+            self.assertEqual(out, self.check_run(where_args, stdin=self.selected(test)), conds)
+
+    def test_long_option(self):
+        out = self.check_run(self.options + where_args + ['--where=1.2=AL,NY', data_file('fixed.dat')])
+        self.assertEqual(out, self.check_run(where_args, stdin=self.selected(where_cases[0][1])))
+
+
+class JobsWhereTest(WhereTest):
+
+    options = ['-j3']
+
+
+@unittest.skipIf(numpy is None, "numpy non disponibile")
+class NumpyWhereTest(WhereTest):
+
+    options = ['--numpy']
+
+
+class CsvWhereTest(support.TempDirTest):
+
+    def test_csv(self):
+        lines = support.csv_lines()
+        for (conds, test) in where_cases:
+            conds = support.translate_csv_args(['-w' + c for c in conds])
+            selected = ''.join([line for (line, r) in zip(lines, support.fixed_records()) if test(r)])
+            out = self.check_run(['--csv', '-k1,2', '-f3,4'] + conds, stdin=''.join(lines))
+            self.assertEqual(out, self.check_run(['--csv', '-k1,2', '-f3,4'], stdin=selected), conds)
+
+
+class EbcdicWhereTest(support.TempDirTest):
+    """i valori delle condizioni vengono convertiti in EBCDIC, i range decodificati con il tipo del campo"""
+
+    def test_ebcdic(self):
+        records = support.mainframe_records()
+        filename = self.write('fixed.ebc', ''.join(records))
+        mainframe = ['--reclen=%d' % support.mainframe_reclen, '--ebcdic']
+        args = translate_args(where_args, support.mainframe_fields)
+        for (conds, test) in where_cases:
+            conds = [c.replace('18.8=', '18.5:p=') for c in conds]
+            selected = self.write('selected.ebc', ''.join([rec for (rec, r) in zip(records, support.fixed_records()) if test(r)]))
+            out = self.check_run(mainframe + args + ['-w' + c for c in conds] + [filename])
+            self.assertEqual(out, self.check_run(mainframe + args + [selected]), conds)
+
+
+class ErrorsTest(support.CountTotalsTest):
+
+    def test_errors(self):
+        fixed = data_file('fixed.dat')
+        self.check_error(['-k1.2', '-w1.2', fixed], "condizione non valida")
+        self.check_error(['-k1.2', '-w1.2:p=AL', fixed], "il tipo del campo")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""La stampa dei report: le righe vengono scritte man mano, con i formati delle colonne
+preparati una volta sola. Con molte righe l'output allineato e quello csv devono avere
+gli stessi valori, e le colonne la stessa larghezza in tutte le righe (le combinazioni
+delle opzioni di stampa sono confrontate con la baseline in test_baseline)"""
+
+import random, unittest
+
+import support
+
+
+def many_rows(records=30000, seed=10):
+    """record con chiavi (1.6) quasi tutte diverse e due campi zoned (7.9, 16.5)"""
+    rnd = random.Random(seed)
+    lines = []
+    for i in xrange(records):
+        v1, v2 = '%09d' % rnd.randint(0, 10**9 - 1), '%05d' % rnd.randint(0, 99999)
+        if rnd.random() < 0.2: v1 = v1[:-1] + 'pqrstuvwxy'[int(v1[-1])]
+        lines.append('K%05d%s%s\n' % (rnd.randint(0, 99999), v1, v2))
+    return ''.join(lines)
+
+
+class WriterTest(support.TempDirTest):
+
+    options = []
+
+    def setUp(self):
+        support.TempDirTest.setUp(self)
+        self.filename = self.write('rows.dat', many_rows())
+
+    def test_aligned_and_csv(self):
+        for args in (['-k1.6', '-f7.9,16.5'], ['-k1.6', '-f7.9', '-C'], ['-k1.2,3.4', '-f16.5']):
+            text = self.check_run(self.options + args + [self.filename]).splitlines()
+            csv = self.check_run(self.options + args + ['--output_csv', self.filename]).splitlines()
+            self.assertEqual(len(text), len(csv))
+            self.assertEqual(text[0].split(), csv[0].split(';'))
+            # l'header e le righe di dettaglio hanno la stessa larghezza (la riga dei totali
+            # puo' essere piu' larga, come nella baseline)
+            self.assertEqual(set([len(line) for line in text[:-2]]), set([len(text[0])]))
+            fmt = '-C' in args and '%.0f' or '%.2f'
+            for (line, row) in zip(text[1:], csv[1:]):
+                cells = row.split(';')
+                if not line:
+                    self.assertEqual(cells, [''])
+                    continue
+                self.assertEqual(line[:len(cells[0])], cells[0])
+                if cells[0] == 'total':
+                    # il csv stampa i float con str(): 12 cifre significative
+                    for (a, b) in zip(line.split()[1:], cells[1:]):
+                        self.assertAlmostEqual(float(a) / float(b), 1, places=10)
+                    continue
+                expected = [fmt % float(c) for c in cells[1:-1]] + [cells[-1]]
+                self.assertEqual(line[len(cells[0]):].split(), expected)
+
+    def test_stdin(self):
+        args = ['-k1.6', '-f7.9,16.5']
+        data = open(self.filename, 'rb').read()
+        self.assertEqual(self.check_run(self.options + args, stdin=data),
+                         self.check_run(self.options + args + [self.filename]))
+
+    def test_wide_values(self):
+        # valori piu' larghi della colonna minima (13): la larghezza e' quella dell'header,
+        # come nella baseline, e le colonne si allargano riga per riga
+        data = ''.join(['A%018d\n' % (10**17 * 3), 'B%018d\n' % 5, 'C%018d\n' % (10**16)])
+        out = self.check_run(self.options + ['-k1.1', '-f2.18'], stdin=data)
+        lines = out.splitlines()
+        self.assertEqual(lines[1].split(), ['A', '3000000000000000.00', '1'])
+        self.assertEqual(lines[2], 'B     %13s %13s' % ('0.05', '1'))
+
+
+class JobsWriterTest(WriterTest):
+
+    options = ['-j2']
+
+
+if __name__ == '__main__':
+    unittest.main()